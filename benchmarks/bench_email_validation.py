@@ -0,0 +1,84 @@
+"""
+Бенчмарк валидации email: старые функции против email_validation
+
+Запуск: python benchmarks/bench_email_validation.py [количество_адресов]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_validation import extract_emails, validate_emails
+
+
+def legacy_validate_email(email: str) -> bool:
+    """Прежняя ContactsParser.validate_email"""
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email.strip()) is not None
+
+
+def legacy_validate_column(values):
+    """Прежняя проверка колонки CSV"""
+    emails = []
+    for value in values:
+        email = value.strip()
+        if email and legacy_validate_email(email):
+            emails.append(email.lower())
+    return emails
+
+
+def legacy_extract_lines(lines):
+    """Прежний разбор простого текста"""
+    emails = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.lower().startswith(('email', 'e-mail')):
+            continue
+        for email in re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', line):
+            email = email.lower().strip()
+            if legacy_validate_email(email):
+                emails.append(email)
+    return emails
+
+
+def make_values(count: int):
+    """Колонка со смесью валидных и мусорных значений"""
+    rnd = random.Random(42)
+    values = []
+    for i in range(count):
+        if i % 10 == 0:
+            values.append(f"not-an-email-{i}")
+        else:
+            values.append(f" User.{i}+tag@Example{rnd.randint(0, 999)}.com ")
+    return values
+
+
+def bench(name: str, func, arg, count: int):
+    start = time.perf_counter()
+    result = func(arg)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed * 1000:8.1f} мс  {count / elapsed:12,.0f} строк/с  ({len(result)} валидных)")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    values = make_values(count)
+    lines = [f"Контакт {value}, отдел продаж" for value in values]
+
+    print(f"Строк: {count}\n")
+    old = bench("legacy: колонка", legacy_validate_column, values, count)
+    new = bench("email_validation: колонка", validate_emails, values, count)
+    assert old == new, "Результаты валидации колонки различаются"
+
+    old = bench("legacy: текст", legacy_extract_lines, lines, count)
+    new = bench("email_validation: текст", lambda items: extract_emails('\n'.join(items)), lines, count)
+    assert old == new, "Результаты извлечения из текста различаются"
+
+
+if __name__ == "__main__":
+    main()
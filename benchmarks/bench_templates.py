@@ -0,0 +1,62 @@
+"""
+Бенчмарк рендера шаблонов: CompiledTemplate против замены через str.replace
+
+Запуск: python benchmarks/bench_templates.py [количество_рендеров]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_templates import CompiledTemplate
+
+BODY = (
+    "<html><body><p>Привет, {name}!</p>"
+    "<p>Компания {company} получает специальную скидку 20%.</p>"
+    "<p>Письмо отправлено на {email}. Отписаться: {unsubscribe}</p>"
+    "<style>p { margin: 0 }</style></body></html>"
+)
+
+
+def naive_render(body: str, contact: dict) -> str:
+    """Прямолинейная подстановка: str.replace для каждой переменной"""
+    for key in ('name', 'email', 'company'):
+        body = body.replace('{' + key + '}', str(contact.get(key) or ''))
+    return body
+
+
+def make_contacts(count: int):
+    return [
+        {'email': f"user{i}@example.com", 'name': f"Пользователь {i}", 'company': f"ООО Компания {i % 100}"}
+        for i in range(count)
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    contacts = make_contacts(count)
+
+    start = time.perf_counter()
+    template = CompiledTemplate(BODY, html_escape=True)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for contact in contacts:
+        template.render(contact)
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for contact in contacts:
+        naive_render(BODY, contact)
+    naive = time.perf_counter() - start
+
+    print(f"Рендеров: {count}\n")
+    print(f"компиляция шаблона        {compile_time * 1e6:8.1f} мкс")
+    print(f"CompiledTemplate.render   {compiled * 1e6 / count:8.2f} мкс/письмо  ({compiled:.3f} с всего)")
+    print(f"str.replace               {naive * 1e6 / count:8.2f} мкс/письмо  ({naive:.3f} с всего)")
+
+
+if __name__ == "__main__":
+    main()
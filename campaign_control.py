@@ -0,0 +1,98 @@
+"""
+Управление выполняющимися рассылками: пауза, продолжение, отмена
+
+Рассылка регистрируется в реестре процесса по campaign_id. Сессии
+отправки проверяют состояние между письмами (checkpoint): на паузе ждут,
+после отмены завершаются, не начиная новых писем, поэтому уже начатые
+письма доходят до конца и попадают в журнал доставки.
+
+Команды из чата пишутся в campaigns.control: воркер в другом процессе
+подхватывает их опросом БД (см. campaign_runner).
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Команды управления (значения колонки campaigns.control)
+PAUSE = 'pause'
+RESUME = 'resume'
+CANCEL = 'cancel'
+
+
+class CampaignCancelled(Exception):
+    """Рассылка отменена пользователем"""
+
+
+class CampaignControl:
+    """Состояние одной выполняющейся рассылки"""
+
+    def __init__(self, campaign_id: str):
+        self.campaign_id = campaign_id
+        self.cancelled = False
+        self._running = asyncio.Event()
+        self._running.set()
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def add_listener(self, listener: Callable[[], None]):
+        """Вызывается при каждом изменении состояния (синхронно)"""
+        self._listeners.append(listener)
+
+    def apply(self, command: Optional[str]):
+        """Применить команду; None и повтор с тем же эффектом игнорируются"""
+        if self.cancelled:
+            return
+
+        if command == CANCEL:
+            self.cancelled = True
+            # Ждущие на паузе сессии должны проснуться и завершиться
+            self._running.set()
+        elif command == PAUSE and not self.paused:
+            self._running.clear()
+        elif command == RESUME and self.paused:
+            self._running.set()
+        else:
+            return
+
+        logger.info(f"Campaign {self.campaign_id}: {command}")
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Campaign control listener error: {e}")
+
+    async def checkpoint(self) -> bool:
+        """
+        Точка проверки между письмами: на паузе ждет продолжения
+
+        Returns:
+            False если рассылка отменена - новых писем не начинать
+        """
+        if self.paused:
+            await self._running.wait()
+        return not self.cancelled
+
+
+# Рассылки, выполняющиеся в этом процессе
+_controls: Dict[str, CampaignControl] = {}
+
+
+def register_campaign(campaign_id: str) -> CampaignControl:
+    control = CampaignControl(campaign_id)
+    _controls[campaign_id] = control
+    return control
+
+
+def unregister_campaign(campaign_id: str):
+    _controls.pop(campaign_id, None)
+
+
+def get_campaign_control(campaign_id: str) -> Optional[CampaignControl]:
+    """Управление рассылкой, если она выполняется в этом процессе"""
+    return _controls.get(campaign_id)
@@ -0,0 +1,266 @@
+"""
+Выполнение рассылки
+Используется воркером очереди (email_worker.py)
+"""
+
+import asyncio
+import json
+import logging
+from typing import Optional, Tuple
+from aiogram import Bot
+
+import email_bot_config as config
+from campaign_control import CampaignCancelled, CampaignControl, register_campaign, unregister_campaign
+from email_bot_database import AsyncEmailBotDatabase
+from email_sender import EmailSender, MultiAccountSender
+from email_message import AttachmentFile
+from email_bot_handlers import get_campaign_control_keyboard, get_main_keyboard
+from progress_reporter import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
+db = AsyncEmailBotDatabase()
+
+
+async def run_campaign(bot: Bot, telegram_id: int, campaign_id: str) -> Tuple[str, Optional[str]]:
+    """
+    Запуск рассылки: отправка писем и отчеты пользователю в чат
+
+    Результат по каждому получателю пишется в журнал sent_emails через
+    буфер БД (пачками), поэтому прерванная рассылка при повторном
+    запуске продолжается с первого неотправленного адреса.
+
+    Пауза и отмена - кнопками под сообщением прогресса (campaign_control):
+    при отмене начатые письма завершаются, и в журнале остается точное
+    число отправленных.
+
+    Ошибки рассылки сообщаются пользователю здесь же и не выбрасываются.
+
+    Returns:
+        Tuple[str, Optional[str]]: (итоговый статус рассылки - completed,
+        cancelled или failed; текст ошибки)
+    """
+    def on_result(email, success, error_msg):
+        db.buffer_delivery_result(campaign_id, email, 'sent' if success else 'failed', error_msg or None)
+
+    # Несуществующие ящики попадают в стоп-лист пользователя после рассылки
+    bounced = []
+
+    def on_hard_bounce(email, error_msg):
+        bounced.append(email)
+
+    sender = None
+    control = register_campaign(campaign_id)
+    watcher = None
+
+    try:
+        # Получаем данные кампании
+        campaign = await db.get_campaign(campaign_id, telegram_id)
+
+        if not campaign:
+            await bot.send_message(telegram_id, "❌ Ошибка: кампания не найдена", reply_markup=get_main_keyboard())
+            return 'failed', "campaign not found"
+
+        # Получаем SMTP, шаблон, контакты
+        smtp_config = await db.get_smtp_config(campaign['smtp_config_id'])
+        template = await db.get_template(campaign['template_id'])
+        contact_list = await db.get_contact_list(campaign['contact_list_id'])
+
+        # Рассылка с нескольких SMTP аккаунтов (удаленные аккаунты пропускаем)
+        smtp_configs = []
+        if campaign.get('smtp_config_ids'):
+            for config_id in json.loads(campaign['smtp_config_ids']):
+                cfg = await db.get_smtp_config(config_id)
+                if cfg and cfg['user_telegram_id'] == telegram_id:
+                    smtp_configs.append(cfg)
+            smtp_config = smtp_config or (smtp_configs[0] if smtp_configs else None)
+
+        if not all([smtp_config, template, contact_list]):
+            await bot.send_message(telegram_id, "❌ Ошибка: не все данные найдены", reply_markup=get_main_keyboard())
+            await db.update_campaign_status(campaign_id, 'failed', 0, 0)
+            return 'failed', "campaign data not found"
+
+        # Продолжение прерванной рассылки: пропускаем уже обработанные адреса
+        # Контакты с атрибутами из колонок файла - для персонализации шаблона
+        # читаются из БД страницами по мере отправки, а не целым списком
+        unsent = await db.count_unsent_contacts(contact_list['id'], campaign_id)
+        previous = await db.get_delivery_counts(campaign_id)
+        offset = previous['sent'] + previous['failed']
+        suppressed = [0]
+
+        async def iter_recipients():
+            after_id = 0
+            while True:
+                page, after_id = await db.get_unsent_contacts_page(
+                    contact_list['id'], campaign_id, after_id, config.CAMPAIGN_FETCH_BATCH
+                )
+                if not page:
+                    return
+                # Адреса из стоп-листа (отписки, несуществующие ящики) не отправляем
+                page, dropped = await db.filter_suppressed(telegram_id, page)
+                suppressed[0] += dropped
+                for contact in page:
+                    yield contact
+
+        # Обновляем статус
+        await db.update_campaign_status(campaign_id, 'running')
+
+        # Инициализируем EmailSender (или отправку с нескольких аккаунтов)
+        # Суточные лимиты аккаунтов считаются в той же БД
+        if len(smtp_configs) > 1:
+            sender = MultiAccountSender(smtp_configs, db=db)
+        else:
+            sender = EmailSender(smtp_config, db)
+
+        # Вложения шаблона (кодируются в base64 один раз, в письма - потоково)
+        attachments = [
+            AttachmentFile(a['path'], a['filename'], a['content_type'], a['content_id'])
+            for a in await db.get_template_attachments(template['id'])
+        ]
+
+        # Прогресс - одно сообщение, обновляемое в фоне: отправка писем его не ждет
+        sent_count = [previous['sent']]
+        failed_count = [previous['failed']]
+        processed = [0]
+
+        def render_progress():
+            total = unsent - suppressed[0]
+            header = "▶️ Продолжение рассылки" if offset else "📧 Рассылка"
+            if control.cancelled:
+                header = "⛔ Рассылка отменена"
+            elif control.paused:
+                header = "⏸ Рассылка на паузе"
+            return (
+                f"{header}\n\n"
+                f"📨 Прогресс: {offset + processed[0]}/{offset + total}\n"
+                f"✅ Отправлено: {sent_count[0]}\n"
+                f"❌ Ошибок: {failed_count[0]}"
+            )
+
+        progress = ProgressReporter(
+            bot, telegram_id, render_progress,
+            reply_markup=get_campaign_control_keyboard(campaign_id)
+        )
+
+        def on_control():
+            progress.reply_markup = get_campaign_control_keyboard(campaign_id, control.paused)
+            progress.update()
+
+        control.add_listener(on_control)
+
+        async def progress_callback(current, total, email, success):
+            processed[0] = current
+            if success:
+                sent_count[0] += 1
+            else:
+                failed_count[0] += 1
+            progress.update()
+
+        await progress.start()
+        watcher = asyncio.create_task(_watch_control(campaign_id, control))
+
+        # Отправляем письма
+        try:
+            await sender.send_bulk_emails(
+                recipients=iter_recipients(),
+                subject=template['subject'],
+                body=template['body'],
+                body_text=template['body_text'],
+                attachments=attachments,
+                callback=progress_callback,
+                on_result=on_result,
+                on_hard_bounce=on_hard_bounce,
+                control=control
+            )
+        finally:
+            if suppressed[0]:
+                logger.info(f"Campaign {campaign_id}: {suppressed[0]} recipients suppressed")
+            # Гарантированный сброс буфера (в т.ч. при отмене задачи)
+            await db.flush_delivery_results()
+            if bounced:
+                await db.add_suppressions(telegram_id, bounced, reason='bounce')
+            if watcher is not None:
+                watcher.cancel()
+            await progress.finish()
+
+        # Итоги по журналу (включая предыдущие запуски)
+        counts = await db.get_delivery_counts(campaign_id)
+        sent, failed = counts['sent'], counts['failed']
+
+        # Обновляем статус кампании
+        await db.update_campaign_status(campaign_id, 'completed', sent, failed)
+
+        # Итоговое сообщение
+        await bot.send_message(
+            telegram_id,
+            f"✅ РАССЫЛКА ЗАВЕРШЕНА!\n\n"
+            f"📨 Всего писем: {sent + failed}\n"
+            f"✅ Отправлено: {sent}\n"
+            f"❌ Ошибок: {failed}\n"
+            f"🚫 Пропущено (стоп-лист): {suppressed[0]}\n\n"
+            f"{format_account_stats(sender)}"
+            f"Проверьте историю: 📊 История",
+            reply_markup=get_main_keyboard()
+        )
+        return 'completed', None
+
+    except CampaignCancelled as e:
+        logger.info(f"Campaign {campaign_id}: {e}")
+        counts = await db.get_delivery_counts(campaign_id)
+        await db.update_campaign_status(campaign_id, 'cancelled', counts['sent'], counts['failed'])
+        await bot.send_message(
+            telegram_id,
+            f"⛔ РАССЫЛКА ОТМЕНЕНА\n\n"
+            f"✅ Отправлено: {counts['sent']}\n"
+            f"❌ Ошибок: {counts['failed']}\n\n"
+            f"{format_account_stats(sender)}"
+            f"Остальным получателям письма не отправлялись",
+            reply_markup=get_main_keyboard()
+        )
+        return 'cancelled', None
+
+    except Exception as e:
+        logger.error(f"Campaign error: {e}", exc_info=True)
+        counts = await db.get_delivery_counts(campaign_id)
+        await db.update_campaign_status(campaign_id, 'failed', counts['sent'], counts['failed'])
+        await bot.send_message(
+            telegram_id,
+            f"❌ ОШИБКА РАССЫЛКИ\n\n{str(e)}\n\n"
+            f"{format_account_stats(sender)}"
+            f"Рассылку можно продолжить с места остановки: 📊 История",
+            reply_markup=get_main_keyboard()
+        )
+        return 'failed', str(e)
+
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        unregister_campaign(campaign_id)
+        await db.set_campaign_control(campaign_id, None)
+
+
+async def _watch_control(campaign_id: str, control: CampaignControl):
+    """
+    Опрос команд управления из БД (кнопки в чате могут обрабатываться
+    другим процессом, чем этот воркер)
+    """
+    while True:
+        try:
+            control.apply(await db.get_campaign_control(campaign_id))
+        except Exception as e:
+            logger.warning(f"Campaign {campaign_id} control poll failed: {e}")
+        await asyncio.sleep(config.CAMPAIGN_CONTROL_POLL_INTERVAL)
+
+
+def format_account_stats(sender) -> str:
+    """Статистика по SMTP аккаунтам для отчета (только при отправке с нескольких)"""
+    if not isinstance(sender, MultiAccountSender):
+        return ""
+
+    lines = ["📤 По аккаунтам:"]
+    for stats in sender.stats():
+        line = f"• {stats['name']}: ✅ {stats['sent']} ❌ {stats['failed']}"
+        if stats['error']:
+            line += f"\n  ⚠️ отключен: {stats['error']}"
+        lines.append(line)
+    return '\n'.join(lines) + "\n\n"
@@ -0,0 +1,140 @@
+"""
+Дедупликация контактов
+
+Адреса сравниваются по нормализованному ключу (регистр, опционально
+точки и +теги Gmail). Вместо множества строк хранятся 8-байтные
+дайджесты blake2b в открытой хеш-таблице на array('Q'): ~16 байт на
+адрес, поэтому проверка миллионов адресов укладывается в десятки МБ.
+Вероятность ложного совпадения дайджестов для 10 млн адресов ~ 3e-6.
+"""
+
+import hashlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Union
+
+# Домены Gmail: точки в имени игнорируются, +тег - псевдоним
+GMAIL_DOMAINS = ('gmail.com', 'googlemail.com')
+
+
+def normalize_for_dedup(email: str, gmail_canonical: bool = False) -> str:
+    """
+    Ключ адреса для сравнения дубликатов
+
+    Args:
+        email: Email адрес
+        gmail_canonical: Склеивать варианты Gmail (i.v.a.n+news@gmail.com = ivan@gmail.com)
+    """
+    email = email.strip().lower()
+    if gmail_canonical:
+        local, sep, domain = email.rpartition('@')
+        if sep and domain in GMAIL_DOMAINS:
+            local = local.split('+', 1)[0].replace('.', '')
+            email = f"{local}@gmail.com"
+    return email
+
+
+def email_digest(key: str) -> int:
+    """8-байтный дайджест ключа (0 зарезервирован под пустую ячейку)"""
+    digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest or 1
+
+
+class DigestSet:
+    """Множество дайджестов адресов: открытая адресация, линейное пробирование"""
+
+    def __init__(self, capacity: int = 1024):
+        size = 1 << max(capacity * 2 - 1, 1).bit_length()
+        self._table = array('Q', bytes(8 * size))
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, key: str) -> bool:
+        return self.contains_digest(email_digest(key))
+
+    def add(self, key: str) -> bool:
+        """Добавить ключ. Returns: True если его еще не было"""
+        return self.add_digest(email_digest(key))
+
+    def contains_digest(self, digest: int) -> bool:
+        table = self._table
+        return table[self._slot(table, digest)] == digest
+
+    def add_digest(self, digest: int) -> bool:
+        table = self._table
+        mask = len(table) - 1
+        slot = digest & mask
+        while True:
+            value = table[slot]
+            if value == digest:
+                return False
+            if value == 0:
+                break
+            slot = (slot + 1) & mask
+
+        table[slot] = digest
+        self._len += 1
+        # Держим заполнение не выше 50%
+        if self._len * 2 > len(self._table):
+            self._grow()
+        return True
+
+    @staticmethod
+    def _slot(table: array, digest: int) -> int:
+        mask = len(table) - 1
+        slot = digest & mask
+        while True:
+            value = table[slot]
+            if value == 0 or value == digest:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        # Новая таблица заполняется целиком до подмены: читатели из других
+        # потоков видят либо старую, либо уже готовую таблицу
+        table = array('Q', bytes(16 * len(self._table)))
+        for digest in self._table:
+            if digest:
+                table[self._slot(table, digest)] = digest
+        self._table = table
+
+
+class Deduplicator:
+    """
+    Потоковая дедупликация с сохранением порядка
+
+    Пропускает только первое вхождение каждого адреса. Если передан индекс
+    уже сохраненных контактов (existing), считает пересечения с ним и при
+    exclude_existing отбрасывает такие адреса.
+    """
+
+    def __init__(self, gmail_canonical: bool = False, existing: DigestSet = None,
+                 exclude_existing: bool = False):
+        self.gmail_canonical = gmail_canonical
+        self.existing = existing
+        self.exclude_existing = exclude_existing
+        self.seen = DigestSet()
+        self.duplicates = 0
+        self.overlap = 0
+
+    def filter(self, contacts: Iterable[Union[str, Dict]]) -> Iterator[Union[str, Dict]]:
+        """Контакты - email строками или словарями {'email': ..., <атрибуты>}"""
+        for contact in contacts:
+            email = contact if isinstance(contact, str) else contact['email']
+            digest = email_digest(normalize_for_dedup(email, self.gmail_canonical))
+            if not self.seen.add_digest(digest):
+                self.duplicates += 1
+                continue
+
+            if self.existing is not None and self.existing.contains_digest(digest):
+                self.overlap += 1
+                if self.exclude_existing:
+                    continue
+
+            yield contact
+
+
+def dedup_emails(emails: Iterable[str], gmail_canonical: bool = False) -> List[str]:
+    """Уникальные адреса в исходном порядке"""
+    return list(Deduplicator(gmail_canonical).filter(emails))
@@ -2,14 +2,82 @@
 Парсер контактов из CSV/XLSX файлов
 """
 
+import asyncio
+import collections
 import logging
 import csv
 import io
+import itertools
+import multiprocessing
+import os
 import re
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, List, Dict, Iterable, Iterator, Optional, TextIO, Tuple, Union
+
+import email_bot_config as config
+from contacts_dedup import dedup_emails
+from email_validation import extract_emails, is_valid_email, normalize_email, validate_emails
 
 logger = logging.getLogger(__name__)
 
+# Заголовки колонки с email в CSV/XLSX
+EMAIL_COLUMN_NAMES = ['email', 'e-mail', 'mail', 'emails']
+
+# Синонимы заголовков колонок -> переменные шаблона
+ATTRIBUTE_ALIASES = {
+    'имя': 'name',
+    'first_name': 'name',
+    'firstname': 'name',
+    'full_name': 'name',
+    'фио': 'name',
+    'компания': 'company',
+    'организация': 'company',
+    'organization': 'company',
+}
+
+
+def contact_email(contact: Union[str, Dict]) -> str:
+    """Email контакта (адрес строкой или словарь с атрибутами)"""
+    return contact if isinstance(contact, str) else contact['email']
+
+
+class ContactsImportCancelled(Exception):
+    """Импорт контактов отменен пользователем"""
+
+
+_parse_pool = None
+
+
+def get_parse_processes() -> int:
+    """Количество процессов для разбора файлов"""
+    return config.PARSE_PROCESSES or os.cpu_count() or 1
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Общий пул процессов для разбора и валидации контактов
+
+    Процессы запускаются через forkserver (spawn, где его нет), а не fork:
+    у бота уже работают потоки БД, и копия процесса могла бы унаследовать
+    захваченную ими блокировку.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=get_parse_processes(),
+            mp_context=multiprocessing.get_context(method)
+        )
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    """Остановка пула процессов (при завершении бота)"""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
+
 
 class ContactsParser:
     """Парсинг контактов из различных форматов"""
@@ -17,8 +85,7 @@ class ContactsParser:
     @staticmethod
     def validate_email(email: str) -> bool:
         """Проверка валидности email"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email.strip()) is not None
+        return is_valid_email(email)
 
     @staticmethod
     def parse_csv_text(text: str) -> List[str]:
@@ -33,143 +100,350 @@ class ContactsParser:
         Returns:
             List[str]: Список email адресов
         """
-        emails = []
-        lines = text.strip().split('\n')
+        emails = ContactsParser.iter_csv_emails(io.StringIO(text.strip()))
 
-        # Проверяем первую строку - возможно это CSV с заголовками
-        first_line = lines[0].strip()
+        # Убираем дубликаты (с сохранением порядка)
+        emails = dedup_emails(emails, config.DEDUP_GMAIL_CANONICAL)
+        logger.info(f"Parsed {len(emails)} unique emails")
+        return emails
+
+    @staticmethod
+    def iter_csv_emails(stream: TextIO) -> Iterator[str]:
+        """
+        Потоковый парсинг CSV/текста: строка за строкой, без загрузки в память
+
+        Если в первой строке есть запятые/точки с запятой - это CSV
+        (колонка email ищется по заголовку). Если CSV не дал ни одного
+        адреса, файл перечитывается как простой текст.
+
+        Args:
+            stream: Текстовый поток с поддержкой seek (файл или StringIO)
+        """
+        found = False
+        for mode, values in ContactsParser.iter_stream_chunks(stream):
+            for contact in ContactsParser.validate_chunk(mode, values):
+                found = True
+                yield contact_email(contact)
+
+        # Если CSV не сработал или это простой список
+        if not found:
+            stream.seek(0)
+            for mode, values in ContactsParser.iter_stream_chunks(stream, force_text=True):
+                yield from ContactsParser.validate_chunk(mode, values)
+
+    @staticmethod
+    def iter_stream_chunks(stream: TextIO, chunk_size: int = 10000,
+                           force_text: bool = False) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Чтение CSV/текста пачками сырых значений (без валидации)
+
+        Yields:
+            ('cell', [значения колонки email]) для CSV,
+            ('record', [{'email': ..., <атрибуты>}]) для CSV с дополнительными колонками или
+            ('text', [строки]) для простого текста
+        """
+        first_line = stream.readline().strip()
+        stream.seek(0)
 
         # Проверяем наличие запятых/точек с запятой
-        if ',' in first_line or ';' in first_line:
+        if not force_text and (',' in first_line or ';' in first_line):
             # Это CSV файл
             delimiter = ',' if ',' in first_line else ';'
 
             try:
-                reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
+                reader = csv.reader(stream, delimiter=delimiter)
+                header = next(reader, [])
 
                 # Ищем колонку с email
-                email_column = None
-                for field in reader.fieldnames or []:
-                    field_lower = field.lower().strip()
-                    if field_lower in ['email', 'e-mail', 'mail', 'emails']:
-                        email_column = field
+                email_idx = None
+                for idx, field in enumerate(header):
+                    if field.lower().strip() in EMAIL_COLUMN_NAMES:
+                        email_idx = idx
                         break
 
-                if not email_column:
+                if email_idx is None:
                     # Если нет заголовка email, берем первую колонку
-                    email_column = reader.fieldnames[0] if reader.fieldnames else None
-
-                if email_column:
-                    for row in reader:
-                        email = row.get(email_column, '').strip()
-                        if email and ContactsParser.validate_email(email):
-                            emails.append(email.lower())
+                    email_idx = 0
+                    keys = None
+                else:
+                    # Остальные колонки с заголовками - атрибуты контакта ({name}, {company}...)
+                    keys = ContactsParser.attribute_keys(header, email_idx)
+
+                if keys:
+                    values = (ContactsParser.make_record(keys, row) for row in reader if len(row) > email_idx)
+                    for chunk in iter_chunks(values, chunk_size):
+                        yield 'record', chunk
+                else:
+                    values = (row[email_idx] for row in reader if len(row) > email_idx)
+                    for chunk in iter_chunks(values, chunk_size):
+                        yield 'cell', chunk
+                return
 
             except Exception as e:
                 logger.error(f"CSV parsing error: {e}")
                 # Fallback - парсим как простой текст
-                pass
+                stream.seek(0)
 
-        # Если CSV не сработал или это простой список
-        if not emails:
-            for line in lines:
-                line = line.strip()
-                if not line or line.lower().startswith(('email', 'e-mail')):
-                    continue
-
-                # Извлекаем все email из строки
-                found_emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', line)
-                for email in found_emails:
-                    email = email.lower().strip()
-                    if ContactsParser.validate_email(email):
-                        emails.append(email)
-
-        # Убираем дубликаты
-        emails = list(set(emails))
-        logger.info(f"Parsed {len(emails)} unique emails")
-        return emails
+        for chunk in iter_chunks(stream, chunk_size):
+            yield 'text', chunk
 
     @staticmethod
-    async def parse_csv_file(file_bytes: bytes, filename: str) -> List[str]:
+    def iter_xlsx_chunks(source, chunk_size: int = 10000) -> Iterator[Tuple[str, List[str]]]:
         """
-        Парсинг CSV/XLSX файла
+        Потоковое чтение XLSX (openpyxl в режиме read_only, строка за строкой)
 
         Args:
-            file_bytes: Содержимое файла
-            filename: Имя файла (для определения типа)
+            source: Путь к файлу или файловый объект
 
-        Returns:
-            List[str]: Список email адресов
+        Yields:
+            ('cell', [значения колонки email]) или
+            ('record', [{'email': ..., <атрибуты>}]), если есть другие колонки
         """
-        emails = []
+        try:
+            import openpyxl
+        except ImportError:
+            logger.warning("openpyxl not installed, cannot parse XLSX files")
+            raise Exception("Установите библиотеку для работы с XLSX: pip install openpyxl")
 
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
         try:
-            # Определяем формат по расширению
-            file_ext = filename.lower().split('.')[-1]
+            sheet = workbook.active
+            rows = sheet.iter_rows(values_only=True)
+
+            # Пытаемся найти колонку с email
+            header = next(rows, None) or ()
+            email_col = None
+            for col_idx, value in enumerate(header):
+                if value and str(value).lower().strip() in EMAIL_COLUMN_NAMES:
+                    email_col = col_idx
+                    break
+
+            if email_col is None:
+                # Если не нашли заголовок, берем первую колонку (первая строка - тоже данные)
+                email_col = 0
+                rows = itertools.chain([header], rows)
+                keys = None
+            else:
+                keys = ContactsParser.attribute_keys(header, email_col)
+
+            if keys:
+                values = (ContactsParser.make_record(keys, row) for row in rows if row and len(row) > email_col)
+                for chunk in iter_chunks(values, chunk_size):
+                    yield 'record', chunk
+            else:
+                values = (str(row[email_col] or '') for row in rows if row and len(row) > email_col)
+                for chunk in iter_chunks(values, chunk_size):
+                    yield 'cell', chunk
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def attribute_keys(header, email_idx: int) -> Optional[List[Optional[str]]]:
+        """
+        Имена атрибутов по заголовку таблицы ('Имя' -> 'name', 'Company' -> 'company')
+
+        Returns:
+            Ключ для каждой колонки ('email' для колонки адреса, None - колонка
+            без заголовка) или None, если кроме email колонок с заголовками нет
+        """
+        keys = []
+        for idx, field in enumerate(header):
+            if idx == email_idx:
+                keys.append('email')
+                continue
+            key = re.sub(r'[\s-]+', '_', str(field or '').strip().lower())
+            key = ATTRIBUTE_ALIASES.get(key, key)
+            keys.append(key if key.isidentifier() and key != 'email' else None)
+
+        return keys if any(key and key != 'email' for key in keys) else None
+
+    @staticmethod
+    def make_record(keys: List[Optional[str]], row) -> Dict:
+        """Строка таблицы -> {'email': ..., <атрибуты>}"""
+        record = {}
+        for key, value in zip(keys, row):
+            if key is None or value is None or value == '':
+                continue
+            if not isinstance(value, (str, int, float)):
+                value = str(value)
+            record[key] = value
+        record.setdefault('email', '')
+        return record
+
+    @staticmethod
+    def iter_file_chunks(path: str, filename: str, chunk_size: int = 10000,
+                         force_text: bool = False) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Потоковое чтение файла с диска (CSV/TXT/XLSX) пачками сырых значений
+
+        Память не зависит от размера файла: текст декодируется
+        инкрементально, XLSX читается в режиме read_only.
+        """
+        file_ext = filename.lower().split('.')[-1]
 
-            if file_ext in ['csv', 'txt']:
-                # CSV файл
-                text = file_bytes.decode('utf-8', errors='ignore')
-                emails = ContactsParser.parse_csv_text(text)
+        if file_ext in ['csv', 'txt']:
+            with open(path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+                yield from ContactsParser.iter_stream_chunks(f, chunk_size, force_text)
 
-            elif file_ext in ['xlsx', 'xls']:
-                # Excel файл - требует openpyxl
+        elif file_ext in ['xlsx', 'xls']:
+            yield from ContactsParser.iter_xlsx_chunks(path, chunk_size)
+
+        else:
+            raise Exception(f"Неподдерживаемый формат файла: {file_ext}")
+
+    @staticmethod
+    def validate_chunk(mode: str, values: List) -> List[Union[str, Dict]]:
+        """
+        Валидация пачки сырых значений (выполняется в процессе-воркере)
+
+        Args:
+            mode: 'cell' - каждое значение целиком email,
+                  'record' - словари контактов с атрибутами,
+                  'text' - email извлекаются из строк текста
+
+        Returns:
+            Email адреса; для 'record' - словари контактов с нормализованным email
+        """
+        if mode == 'cell':
+            return validate_emails(values)
+
+        if mode == 'record':
+            contacts = []
+            for record in values:
+                email = normalize_email(str(record['email']))
+                if email:
+                    record['email'] = email
+                    contacts.append(record)
+            return contacts
+
+        # Заголовки отбрасываем, остальное сканируем одним проходом
+        lines = []
+        for line in values:
+            line = line.strip()
+            if line and not line.lower().startswith(('email', 'e-mail')):
+                lines.append(line)
+        return extract_emails('\n'.join(lines))
+
+    @staticmethod
+    def count_file_rows(path: str, filename: str) -> Optional[int]:
+        """Быстрая оценка числа строк файла (для прогресса импорта)"""
+        file_ext = filename.lower().split('.')[-1]
+
+        if file_ext in ['csv', 'txt']:
+            rows = 0
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    rows += block.count(b'\n')
+            return rows
+
+        if file_ext in ['xlsx', 'xls']:
+            try:
+                import openpyxl
+                workbook = openpyxl.load_workbook(path, read_only=True)
                 try:
-                    import openpyxl
-                    workbook = openpyxl.load_workbook(io.BytesIO(file_bytes))
-                    sheet = workbook.active
-
-                    # Пытаемся найти колонку с email
-                    email_col = None
-                    header_row = 1
-
-                    for col_idx, cell in enumerate(sheet[header_row], 1):
-                        if cell.value and str(cell.value).lower().strip() in ['email', 'e-mail', 'mail']:
-                            email_col = col_idx
-                            break
-
-                    # Если не нашли заголовок, берем первую колонку
-                    if not email_col:
-                        email_col = 1
-                        header_row = 0  # Нет заголовка
-
-                    # Читаем emails
-                    for row in sheet.iter_rows(min_row=header_row + 1, values_only=True):
-                        if row and len(row) >= email_col:
-                            email = str(row[email_col - 1] or '').strip()
-                            if email and ContactsParser.validate_email(email):
-                                emails.append(email.lower())
-
-                    # Убираем дубликаты
-                    emails = list(set(emails))
-
-                except ImportError:
-                    logger.warning("openpyxl not installed, cannot parse XLSX files")
-                    raise Exception("Установите библиотеку для работы с XLSX: pip install openpyxl")
+                    return workbook.active.max_row
+                finally:
+                    workbook.close()
+            except Exception:
+                return None
 
-            else:
-                raise Exception(f"Неподдерживаемый формат файла: {file_ext}")
+        return None
+
+    @staticmethod
+    async def import_file(path: str, filename: str, on_chunk: Callable[[List[Union[str, Dict]]], Awaitable],
+                          on_progress: Callable[[int, Optional[int]], Awaitable] = None,
+                          cancel_event: asyncio.Event = None) -> int:
+        """
+        Параллельный импорт файла: чтение в потоке, валидация пачек в пуле процессов
+
+        Пачки валидируются на всех ядрах одновременно, но передаются в
+        on_chunk в исходном порядке. Event loop при этом не блокируется.
+
+        Args:
+            path: Путь к файлу
+            filename: Имя файла (для определения типа)
+            on_chunk: await on_chunk(contacts) для каждой пачки валидных контактов
+                      (email строками или словарями с атрибутами из колонок файла)
+            on_progress: await on_progress(обработано_строк, всего_строк_или_None)
+            cancel_event: Если установлен - импорт прерывается (ContactsImportCancelled)
+
+        Returns:
+            int: Количество найденных адресов (с дубликатами)
+        """
+        loop = asyncio.get_running_loop()
+        pool = get_parse_pool()
+        chunk_size = config.PARSE_CHUNK_SIZE
+
+        total_rows = await loop.run_in_executor(None, ContactsParser.count_file_rows, path, filename)
+
+        async def run(force_text: bool) -> int:
+            chunks = ContactsParser.iter_file_chunks(path, filename, chunk_size, force_text)
+            in_flight = collections.deque()
+            max_in_flight = get_parse_processes() * 2
+            processed_rows = 0
+            found = 0
+
+            async def collect_one():
+                nonlocal processed_rows, found
+                rows, future = in_flight.popleft()
+                emails = await future
+                processed_rows += rows
+                found += len(emails)
+                if emails:
+                    await on_chunk(emails)
+                if on_progress:
+                    await on_progress(processed_rows, total_rows)
+
+            try:
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ContactsImportCancelled()
+
+                    # Чтение файла - в потоке, чтобы не блокировать event loop
+                    item = await loop.run_in_executor(None, next, chunks, None)
+                    if item is None:
+                        break
+
+                    mode, values = item
+                    future = loop.run_in_executor(pool, ContactsParser.validate_chunk, mode, values)
+                    in_flight.append((len(values), future))
 
-            logger.info(f"Parsed {len(emails)} emails from {filename}")
-            return emails
+                    if len(in_flight) >= max_in_flight:
+                        await collect_one()
 
-        except Exception as e:
-            logger.error(f"File parsing error: {e}")
-            raise
+                while in_flight:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ContactsImportCancelled()
+                    await collect_one()
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
+                chunks.close()
+
+            return found
+
+        found = await run(force_text=False)
+        if not found and filename.lower().split('.')[-1] in ['csv', 'txt']:
+            # CSV не дал адресов - перечитываем как простой текст
+            found = await run(force_text=True)
+
+        logger.info(f"Imported {found} emails from {filename}")
+        return found
 
     @staticmethod
-    def format_contacts_preview(emails: List[str], max_show: int = 5) -> str:
+    def format_contacts_preview(emails: List[str], max_show: int = 5, total: int = None) -> str:
         """
         Форматирование предпросмотра контактов
 
         Args:
-            emails: Список email
+            emails: Список email (для больших списков - только первые адреса)
             max_show: Сколько показывать
+            total: Общее количество контактов (по умолчанию len(emails))
 
         Returns:
             str: Форматированная строка
         """
-        total = len(emails)
+        total = len(emails) if total is None else total
         preview = emails[:max_show]
 
         text = f"📧 Всего контактов: {total}\n\n"
@@ -181,3 +455,13 @@ class ContactsParser:
             text += f"\n... и еще {total - max_show} контактов"
 
         return text
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[List]:
+    """Разбивка потока на списки по size элементов"""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -7,13 +7,16 @@ Email Sender Bot - Главный файл
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 
 # Импорты наших модулей
 import email_bot_config as config
 from email_bot_handlers import router
-# from email_bot_admin import admin_router  # TODO: Создать админ-панель
+from email_bot_admin import admin_router
+from email_bot_database import AsyncEmailBotDatabase
+from fsm_storage import SQLiteStorage
+from email_worker import worker_loop
+from contacts_parser import shutdown_parse_pool
 
 # Загрузка .env
 load_dotenv()
@@ -40,16 +43,28 @@ async def main():
 
     # Инициализация бота
     bot = Bot(token=config.TELEGRAM_BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    # Состояния диалогов в БД: переживают перезапуск, общие для нескольких процессов бота
+    storage = SQLiteStorage()
+    storage.start_cleanup()
+    dp = Dispatcher(storage=storage)
 
     # Подключаем роутеры
     dp.include_router(router)
-    # dp.include_router(admin_router)  # TODO
+    # Админ-команды: каждая проверяет права (is_admin) сама
+    dp.include_router(admin_router)
+
+    # Воркер рассылок в этом же процессе (иначе запускайте email_worker.py отдельно)
+    worker_task = None
+    if config.CAMPAIGN_WORKER_EMBEDDED:
+        worker_task = asyncio.create_task(worker_loop(bot, AsyncEmailBotDatabase()))
 
     try:
         logger.info("Bot is running. Press Ctrl+C to stop.")
         await dp.start_polling(bot)
     finally:
+        if worker_task:
+            worker_task.cancel()
+        shutdown_parse_pool()
         await bot.session.close()
 
 
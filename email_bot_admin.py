@@ -8,19 +8,20 @@ from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, C
 from aiogram.filters import Command
 from datetime import datetime
 
-from email_bot_database import EmailBotDatabase
+from email_bot_database import AsyncEmailBotDatabase
+from email_validation import extract_emails
 import email_bot_config as config
 
 logger = logging.getLogger(__name__)
 admin_router = Router()
 
 # Инициализация БД
-db = EmailBotDatabase()
+db = AsyncEmailBotDatabase()
 
 
-def is_admin(telegram_id: int) -> bool:
+async def is_admin(telegram_id: int) -> bool:
     """Проверка прав администратора"""
-    return telegram_id == config.ADMIN_TELEGRAM_ID or db.is_admin(telegram_id)
+    return telegram_id == config.ADMIN_TELEGRAM_ID or await db.is_admin(telegram_id)
 
 
 # ========== АДМИН КОМАНДЫ ==========
@@ -28,7 +29,7 @@ def is_admin(telegram_id: int) -> bool:
 @admin_router.message(Command('admin'))
 async def cmd_admin_menu(message: Message):
     """Меню администратора"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         await message.answer("❌ Недостаточно прав")
         return
 
@@ -44,18 +45,20 @@ async def cmd_admin_menu(message: Message):
         "• /admin_stats - общая статистика\n"
         "• /stats - быстрая команда\n\n"
         "🛠 Управление:\n"
-        "• /admin_make <id> - дать права админа"
+        "• /admin_make <id> - дать права админа\n"
+        "• /admin_suppress <emails> - глобальный стоп-лист\n"
+        "• /admin_unsuppress <emails> - убрать из стоп-листа"
     )
 
 
 @admin_router.message(Command('admin_users'))
 async def cmd_admin_users(message: Message):
     """Список всех пользователей"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         await message.answer("❌ Недостаточно прав")
         return
 
-    users = db.get_all_users()
+    users = await db.get_all_users()
 
     if not users:
         await message.answer("👥 Нет пользователей")
@@ -93,7 +96,7 @@ async def cmd_admin_users(message: Message):
 @admin_router.message(Command('admin_user'))
 async def cmd_admin_user(message: Message):
     """Информация о конкретном пользователе"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         await message.answer("❌ Недостаточно прав")
         return
 
@@ -109,16 +112,16 @@ async def cmd_admin_user(message: Message):
         await message.answer("❌ Неверный ID")
         return
 
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if not user:
         await message.answer(f"❌ Пользователь {user_id} не найден")
         return
 
     # Получаем данные
-    smtp_configs = db.get_smtp_configs(user_id)
-    templates = db.get_templates(user_id)
-    campaigns = db.get_campaigns(user_id, limit=5)
-    transactions = db.get_transactions(user_id, limit=5)
+    smtp_configs = await db.get_smtp_configs(user_id)
+    templates = await db.get_templates(user_id)
+    campaigns = await db.get_campaigns(user_id, limit=5)
+    transactions = await db.get_transactions(user_id, limit=5)
 
     # Подписка
     if user['subscription_until']:
@@ -154,7 +157,7 @@ async def cmd_admin_user(message: Message):
 @admin_router.message(Command('admin_sub'))
 async def cmd_admin_subscribe(message: Message):
     """Продлить подписку пользователю"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         await message.answer("❌ Недостаточно прав")
         return
 
@@ -181,16 +184,16 @@ async def cmd_admin_subscribe(message: Message):
         return
 
     # Проверяем существует ли пользователь
-    if not db.is_user_registered(user_id):
+    if not await db.is_user_registered(user_id):
         await message.answer(f"❌ Пользователь {user_id} не найден")
         return
 
     # Продлеваем подписку
-    new_until = db.extend_subscription(user_id, months=months)
+    new_until = await db.extend_subscription(user_id, months=months)
 
     # Добавляем транзакцию
     amount = config.SUBSCRIPTION_PRICE * months
-    db.add_transaction(
+    await db.add_transaction(
         telegram_id=user_id,
         amount=amount,
         transaction_type='subscription',
@@ -210,11 +213,11 @@ async def cmd_admin_subscribe(message: Message):
 @admin_router.message(Command('admin_stats'))
 async def cmd_admin_stats(message: Message):
     """Общая статистика"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         await message.answer("❌ Недостаточно прав")
         return
 
-    stats = db.get_stats()
+    stats = await db.get_stats()
 
     await message.answer(
         f"📊 СТАТИСТИКА БОТА\n\n"
@@ -229,7 +232,7 @@ async def cmd_admin_stats(message: Message):
 @admin_router.message(Command('admin_make'))
 async def cmd_admin_make(message: Message):
     """Дать права администратора"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         await message.answer("❌ Недостаточно прав")
         return
 
@@ -244,11 +247,11 @@ async def cmd_admin_make(message: Message):
         await message.answer("❌ Неверный ID")
         return
 
-    if not db.is_user_registered(user_id):
+    if not await db.is_user_registered(user_id):
         await message.answer(f"❌ Пользователь {user_id} не найден")
         return
 
-    db.make_admin(user_id)
+    await db.make_admin(user_id)
 
     await message.answer(
         f"✅ ПРАВА АДМИНА ВЫДАНЫ!\n\n"
@@ -257,12 +260,48 @@ async def cmd_admin_make(message: Message):
     )
 
 
+@admin_router.message(Command('admin_suppress'))
+async def cmd_admin_suppress(message: Message):
+    """Добавить адреса в глобальный стоп-лист (для всех пользователей)"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("❌ Недостаточно прав")
+        return
+
+    emails = extract_emails(message.text)
+    if not emails:
+        total = await db.count_suppressions(0)
+        await message.answer(
+            f"❌ Использование: `/admin_suppress <email1> <email2> ...`\n\n"
+            f"🚫 В глобальном стоп-листе: {total}"
+        )
+        return
+
+    added = await db.add_suppressions(0, emails, reason='manual')
+    await message.answer(f"✅ Добавлено в глобальный стоп-лист: {added} из {len(emails)}")
+
+
+@admin_router.message(Command('admin_unsuppress'))
+async def cmd_admin_unsuppress(message: Message):
+    """Удалить адреса из глобального стоп-листа"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("❌ Недостаточно прав")
+        return
+
+    emails = extract_emails(message.text)
+    if not emails:
+        await message.answer("❌ Использование: `/admin_unsuppress <email1> <email2> ...`")
+        return
+
+    removed = await db.remove_suppressions(0, emails)
+    await message.answer(f"✅ Удалено из глобального стоп-листа: {removed}")
+
+
 # ========== БЫСТРЫЕ КОМАНДЫ ==========
 
 @admin_router.message(Command('sub'))
 async def cmd_sub_shortcut(message: Message):
     """Быстрое продление подписки (алиас для /admin_sub)"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         return
     await cmd_admin_subscribe(message)
 
@@ -270,6 +309,6 @@ async def cmd_sub_shortcut(message: Message):
 @admin_router.message(Command('stats'))
 async def cmd_stats_shortcut(message: Message):
     """Быстрая статистика"""
-    if not is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id):
         return
     await cmd_admin_stats(message)
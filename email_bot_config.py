@@ -16,6 +16,12 @@ ADMIN_TELEGRAM_ID = int(os.getenv("ADMIN_TELEGRAM_ID", "0"))
 # Database path
 DATABASE_PATH = os.getenv("DATABASE_PATH", "email_bot.db")
 
+# SQLite (WAL, долгоживущие соединения)
+SQLITE_BUSY_TIMEOUT = 10  # секунды ожидания блокировки записи
+SQLITE_CACHE_SIZE_KB = 20000  # кэш страниц на соединение
+SQLITE_CACHED_STATEMENTS = 256  # кэш подготовленных запросов на соединение
+DB_THREADS = 4  # потоки для асинхронного доступа к БД (AsyncEmailBotDatabase)
+
 # Стоимость подписки
 SUBSCRIPTION_PRICE = 1000  # руб/мес
 SUBSCRIPTION_DAYS = 30
@@ -23,3 +29,54 @@ SUBSCRIPTION_DAYS = 30
 # Настройки рассылки
 EMAIL_SEND_DELAY = 1.0  # секунды между письмами
 MAX_EMAILS_PER_BATCH = 1000  # максимум писем за раз
+CONTACTS_IMPORT_CHUNK_SIZE = 5000  # контактов в одной транзакции при импорте файла
+DEDUP_GMAIL_CANONICAL = False  # считать i.v.a.n+tag@gmail.com дубликатом ivan@gmail.com
+DEDUP_EXCLUDE_EXISTING = False  # не добавлять адреса, уже сохраненные в других списках
+ATTACHMENTS_DIR = os.getenv("ATTACHMENTS_DIR", "attachments")  # файлы вложений шаблонов
+MAX_ATTACHMENT_SIZE_MB = 10  # максимальный размер одного вложения
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "0"))  # процессы для разбора файлов (0 - по числу ядер)
+PARSE_CHUNK_SIZE = 20000  # строк файла в одной задаче валидации
+IMPORT_PROGRESS_INTERVAL = 2.0  # секунды между обновлениями прогресса импорта
+SMTP_MAX_MESSAGES_PER_CONNECTION = 100  # ротация SMTP соединения после N писем
+CAMPAIGN_FETCH_BATCH = 1000  # контактов рассылки в одном запросе к БД (и в очереди отправки)
+
+# Лимиты скорости отправки по умолчанию (дополняются лимитами провайдера и SMTP конфига)
+DEFAULT_RATE_LIMITS = {'per_second': 1.0 / EMAIL_SEND_DELAY}
+
+# Рассылка с нескольких SMTP аккаунтов: аккаунт, которому по лимиту
+# ждать дольше N секунд, отдает оставшиеся письма другим аккаунтам
+ACCOUNT_FAILOVER_WAIT = 60
+
+# Повтор писем с временной ошибкой (4xx, обрыв соединения, таймаут)
+SEND_RETRY_ATTEMPTS = 3  # повторов на одно письмо
+SEND_RETRY_BASE_DELAY = 60  # секунды до первого повтора, дальше - вдвое больше
+SEND_RETRY_MAX_DELAY = 900  # верхняя граница задержки (greylisting - обычно до 15 минут)
+
+# Воркер рассылок (очередь campaign_jobs)
+CAMPAIGN_WORKER_EMBEDDED = os.getenv("CAMPAIGN_WORKER_EMBEDDED", "1") == "1"  # воркер внутри процесса бота
+CAMPAIGN_WORKER_CONCURRENCY = int(os.getenv("CAMPAIGN_WORKER_CONCURRENCY", "5"))  # рассылок одновременно
+WORKER_POLL_INTERVAL = 5  # секунды между проверками пустой очереди
+WORKER_HEARTBEAT_INTERVAL = 30  # секунды
+WORKER_STALE_TIMEOUT = 120  # задача без heartbeat дольше - воркер упал
+WORKER_MAX_ATTEMPTS = 3  # сколько раз продолжать прерванную рассылку автоматически
+
+# Отложенные рассылки
+BOT_TIMEZONE = os.getenv("BOT_TIMEZONE", "Europe/Moscow")  # часовой пояс для ввода времени
+SCHEDULER_RELOAD_INTERVAL = 60  # секунды между загрузками отложенных задач из БД
+CAMPAIGN_START_SPREAD = 300  # окно (сек), в котором разносятся старты, назначенные на одно время
+CAMPAIGN_START_STEP = 15  # сдвиг (сек) каждой следующей рассылки в этом окне
+MAX_SCHEDULE_DAYS = 30  # насколько вперед можно запланировать рассылку
+
+# Прогресс рассылки в Telegram (одно сообщение, редактируется в фоне)
+CAMPAIGN_PROGRESS_INTERVAL = 3.0  # секунды между редактированиями сообщения
+TELEGRAM_CHAT_MIN_INTERVAL = 1.0  # секунды между запросами в один чат (лимит Telegram)
+CAMPAIGN_CONTROL_POLL_INTERVAL = 2.0  # секунды между проверками паузы/отмены в БД (воркер)
+
+# Состояния диалогов (FSM) в SQLite - общие для нескольких процессов бота
+FSM_CACHE_SIZE = 10000  # состояний в LRU кэше процесса
+FSM_STATE_TTL_HOURS = 24  # незаконченный диалог удаляется через N часов без действий
+FSM_CLEANUP_INTERVAL = 3600  # секунды между удалениями брошенных диалогов
+
+# Буфер записи результатов доставки (sent_emails)
+DELIVERY_FLUSH_ROWS = 200  # сброс при накоплении N строк
+DELIVERY_FLUSH_INTERVAL_MS = 1000  # или не реже чем раз в T миллисекунд
@@ -3,27 +3,107 @@
 Подписка: 1000 ₽/мес без лимитов
 """
 
+import asyncio
+import functools
 import logging
 import sqlite3
+import threading
+import time
 import uuid
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import json
+import random
+
+import email_bot_config as config
+from contacts_dedup import DigestSet, email_digest, normalize_for_dedup
+from email_templates import html_to_text, is_html_body
 
 logger = logging.getLogger(__name__)
 
 
+def _format_timestamp(value: datetime) -> str:
+    """datetime (UTC) в формате CURRENT_TIMESTAMP SQLite: 'YYYY-MM-DD HH:MM:SS'"""
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
 class EmailBotDatabase:
     """База данных для multi-user email рассылки"""
 
+    # Кэш индексов стоп-листа, общий для экземпляров в процессе:
+    # (db_path, telegram_id) -> [DigestSet, последний id, число строк]
+    _suppression_indexes = {}
+    _suppression_lock = threading.Lock()
+
     def __init__(self, db_path: str = '/opt/email-sender-bot/email_bot.db'):
         self.db_path = db_path
+
+        # Буфер результатов доставки (write-behind, см. buffer_delivery_result)
+        self._delivery_buffer = []
+        self._delivery_buffered_at = 0.0
+        self._delivery_lock = threading.Lock()
+        self._delivery_ready = threading.Condition(self._delivery_lock)
+        # Запись в БД - вне _delivery_lock, по одной пачке за раз
+        self._delivery_write_lock = threading.Lock()
+        self._delivery_writer = None
+
+        # Долгоживущие соединения: по одному на поток
+        self._local = threading.local()
+
         self._init_db()
 
+    def _open_connection(self) -> sqlite3.Connection:
+        """Новое соединение с настроенными PRAGMA"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.SQLITE_BUSY_TIMEOUT,
+            cached_statements=config.SQLITE_CACHED_STATEMENTS,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        # WAL: запись результатов рассылки не блокирует чтение в хендлерах
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{int(config.SQLITE_CACHE_SIZE_KB)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    @contextmanager
+    def _connect(self):
+        """
+        Соединение текущего потока (создается один раз и переиспользуется)
+
+        Как и контекстный менеджер sqlite3.Connection: commit при успехе,
+        rollback при исключении. Кэш подготовленных запросов живет вместе
+        с соединением, поэтому повторные запросы не компилируются заново.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        else:
+            if conn.in_transaction:
+                conn.commit()
+
+    def close(self):
+        """Закрыть соединение текущего потока"""
+        self.flush_delivery_results()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def _init_db(self):
         """Инициализирует БД и создает таблицы"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
 
             # Таблица пользователей
             conn.execute('''
@@ -53,6 +133,7 @@ class EmailBotDatabase:
                     from_email TEXT NOT NULL,
                     from_name TEXT,
                     is_default BOOLEAN DEFAULT 0,
+                    rate_limits TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_telegram_id) REFERENCES users(telegram_id)
                 )
@@ -71,6 +152,24 @@ class EmailBotDatabase:
                 )
             ''')
 
+            # Контакты списков (по строке на адрес, доп. колонки CSV - в attributes)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS contacts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    list_id INTEGER NOT NULL,
+                    email TEXT NOT NULL,
+                    attributes TEXT,
+                    FOREIGN KEY (list_id) REFERENCES contact_lists(id)
+                )
+            ''')
+            conn.execute(
+                'CREATE UNIQUE INDEX IF NOT EXISTS idx_contacts_list_email ON contacts(list_id, email)'
+            )
+            # Порядок контактов внутри списка (rowid входит в индекс)
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_contacts_list ON contacts(list_id)'
+            )
+
             # Таблица шаблонов писем
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS email_templates (
@@ -84,6 +183,24 @@ class EmailBotDatabase:
                 )
             ''')
 
+            # Вложения шаблонов (файлы на диске, см. email_message.AttachmentFile)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS template_attachments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    template_id INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    content_type TEXT,
+                    content_id TEXT,
+                    size INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (template_id) REFERENCES email_templates(id)
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_template_attachments_template ON template_attachments(template_id)'
+            )
+
             # Таблица рассылок (кампаний)
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS campaigns (
@@ -120,6 +237,66 @@ class EmailBotDatabase:
                 )
             ''')
 
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_sent_emails_campaign ON sent_emails(campaign_id, recipient_email)'
+            )
+
+            # Очередь задач на выполнение рассылок (для воркеров)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS campaign_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id TEXT NOT NULL,
+                    user_telegram_id INTEGER NOT NULL,
+                    status TEXT DEFAULT 'queued',
+                    attempts INTEGER DEFAULT 0,
+                    worker_id TEXT,
+                    error_message TEXT,
+                    heartbeat_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (campaign_id) REFERENCES campaigns(id)
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_campaign_jobs_status ON campaign_jobs(status, id)'
+            )
+
+            # Стоп-лист: отписки и несуществующие ящики (user_telegram_id = 0 - глобальный)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS suppressions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_telegram_id INTEGER NOT NULL DEFAULT 0,
+                    email TEXT NOT NULL,
+                    reason TEXT DEFAULT 'manual',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute(
+                'CREATE UNIQUE INDEX IF NOT EXISTS idx_suppressions_user_email ON suppressions(user_telegram_id, email)'
+            )
+
+            # Отправлено писем за сутки по SMTP аккаунту (общий суточный лимит процессов)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS send_usage (
+                    account_key TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    sent INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (account_key, day)
+                )
+            ''')
+
+            # Состояния диалогов (FSM aiogram), общие для всех процессов бота
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fsm_states (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT,
+                    version INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)')
+
             # Таблица транзакций (подписки)
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS transactions (
@@ -134,15 +311,56 @@ class EmailBotDatabase:
                 )
             ''')
 
+            # Миграции для БД, созданных предыдущими версиями
+            self._add_column(conn, 'smtp_configs', 'rate_limits', 'TEXT')
+            self._add_column(conn, 'email_templates', 'body_text', 'TEXT')
+            self._add_column(conn, 'campaigns', 'smtp_config_ids', 'TEXT')
+            self._add_column(conn, 'campaigns', 'control', 'TEXT')
+            self._add_column(conn, 'campaigns', 'scheduled_at', 'TIMESTAMP')
+            self._add_column(conn, 'campaign_jobs', 'run_at', 'TIMESTAMP')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_campaign_jobs_run_at ON campaign_jobs(status, run_at)'
+            )
+
+            # Списки пользователя (ORDER BY created_at DESC) - поиском по индексу, без сортировки
+            for table in ('campaigns', 'smtp_configs', 'email_templates', 'contact_lists'):
+                conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_{table}_user_created ON {table}(user_telegram_id, created_at)'
+                )
+            self._migrate_contact_blobs(conn)
+
             conn.commit()
             logger.info("Email Bot Database initialized")
 
+    @staticmethod
+    def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+        """Добавляет колонку в существующую таблицу, если ее еще нет"""
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            logger.info(f"Added column {table}.{column}")
+
+    def _migrate_contact_blobs(self, conn: sqlite3.Connection):
+        """Перенос контактов из JSON колонки contact_lists.contacts в таблицу contacts"""
+        rows = conn.execute(
+            "SELECT id, contacts FROM contact_lists WHERE contacts != '[]'"
+        ).fetchall()
+        for row in rows:
+            emails = json.loads(row['contacts'])
+            # total_count старой записи уже учитывает эти контакты, а
+            # _insert_contacts прибавляет вставленные - считаем заново
+            conn.execute('UPDATE contact_lists SET total_count = 0 WHERE id = ?', (row['id'],))
+            self._insert_contacts(conn, row['id'], emails)
+            conn.execute("UPDATE contact_lists SET contacts = '[]' WHERE id = ?", (row['id'],))
+        if rows:
+            logger.info(f"Migrated {len(rows)} contact lists to contacts table")
+
     # ========== USERS ==========
 
     def register_user(self, telegram_id: int, username: str = None,
                      first_name: str = None, last_name: str = None):
         """Регистрация нового пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 INSERT OR IGNORE INTO users (telegram_id, username, first_name, last_name)
                 VALUES (?, ?, ?, ?)
@@ -152,7 +370,7 @@ class EmailBotDatabase:
 
     def is_user_registered(self, telegram_id: int) -> bool:
         """Проверка регистрации пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT 1 FROM users WHERE telegram_id = ?',
                 (telegram_id,)
@@ -161,8 +379,7 @@ class EmailBotDatabase:
 
     def get_user(self, telegram_id: int) -> Optional[Dict]:
         """Получить данные пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT * FROM users WHERE telegram_id = ?',
                 (telegram_id,)
@@ -193,7 +410,7 @@ class EmailBotDatabase:
         else:
             new_until = datetime.now() + timedelta(days=30 * months)
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 UPDATE users
                 SET subscription_until = ?, updated_at = CURRENT_TIMESTAMP
@@ -210,7 +427,7 @@ class EmailBotDatabase:
                        smtp_port: int, smtp_user: str, smtp_password: str,
                        from_email: str, from_name: str = None) -> int:
         """Добавить SMTP конфигурацию"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             # Если это первая конфигурация - делаем ее default
             cursor = conn.execute(
                 'SELECT COUNT(*) FROM smtp_configs WHERE user_telegram_id = ?',
@@ -230,8 +447,7 @@ class EmailBotDatabase:
 
     def get_smtp_configs(self, telegram_id: int) -> List[Dict]:
         """Получить все SMTP конфигурации пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT * FROM smtp_configs WHERE user_telegram_id = ? ORDER BY created_at DESC',
                 (telegram_id,)
@@ -240,8 +456,7 @@ class EmailBotDatabase:
 
     def get_smtp_config(self, config_id: int) -> Optional[Dict]:
         """Получить SMTP конфигурацию по ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT * FROM smtp_configs WHERE id = ?',
                 (config_id,)
@@ -249,30 +464,94 @@ class EmailBotDatabase:
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    def set_smtp_rate_limits(self, config_id: int, rate_limits: Optional[Dict[str, float]]):
+        """
+        Задать лимиты скорости для SMTP конфигурации
+
+        rate_limits: {'per_second': 1, 'per_minute': 20, 'per_hour': 300, 'per_day': 500}
+        или None - использовать лимиты провайдера
+        """
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE smtp_configs SET rate_limits = ? WHERE id = ?',
+                (json.dumps(rate_limits) if rate_limits else None, config_id)
+            )
+            conn.commit()
+
     def delete_smtp_config(self, config_id: int):
         """Удалить SMTP конфигурацию"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('DELETE FROM smtp_configs WHERE id = ?', (config_id,))
             conn.commit()
 
     # ========== CONTACT LISTS ==========
 
-    def add_contact_list(self, telegram_id: int, name: str, contacts: List[str]) -> int:
-        """Добавить список контактов"""
-        contacts_json = json.dumps(contacts)
-        with sqlite3.connect(self.db_path) as conn:
+    def add_contact_list(self, telegram_id: int, name: str,
+                         contacts: Iterable[Union[str, Dict]] = ()) -> int:
+        """
+        Добавить список контактов
+
+        Args:
+            contacts: email адреса или словари {'email': ..., 'name': ..., ...};
+                      остальные ключи словаря сохраняются как атрибуты контакта
+        """
+        with self._connect() as conn:
             cursor = conn.execute('''
                 INSERT INTO contact_lists
                 (user_telegram_id, name, contacts, total_count)
-                VALUES (?, ?, ?, ?)
-            ''', (telegram_id, name, contacts_json, len(contacts)))
+                VALUES (?, ?, '[]', 0)
+            ''', (telegram_id, name))
+            list_id = cursor.lastrowid
+            self._insert_contacts(conn, list_id, contacts)
             conn.commit()
-            return cursor.lastrowid
+            return list_id
+
+    def add_contacts(self, list_id: int, contacts: Iterable[Union[str, Dict]]) -> int:
+        """
+        Дописать контакты в список (одной транзакцией)
+
+        Дубликаты внутри списка пропускаются. Возвращает новый размер списка.
+        """
+        with self._connect() as conn:
+            total = self._insert_contacts(conn, list_id, contacts)
+            conn.commit()
+            return total
+
+    def delete_contact_list(self, list_id: int):
+        """Удалить список контактов"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM contacts WHERE list_id = ?', (list_id,))
+            conn.execute('DELETE FROM contact_lists WHERE id = ?', (list_id,))
+            conn.commit()
+
+    @staticmethod
+    def _insert_contacts(conn: sqlite3.Connection, list_id: int,
+                         contacts: Iterable[Union[str, Dict]]) -> int:
+        """INSERT OR IGNORE контактов и обновление total_count"""
+        def rows():
+            for contact in contacts:
+                if isinstance(contact, dict):
+                    attributes = {k: v for k, v in contact.items() if k != 'email' and v not in (None, '')}
+                    yield (list_id, contact['email'],
+                           json.dumps(attributes, ensure_ascii=False) if attributes else None)
+                else:
+                    yield (list_id, contact, None)
+
+        # Дубликаты (INSERT OR IGNORE) не попадают в total_changes
+        changes_before = conn.total_changes
+        conn.executemany(
+            'INSERT OR IGNORE INTO contacts (list_id, email, attributes) VALUES (?, ?, ?)',
+            rows()
+        )
+        inserted = conn.total_changes - changes_before
+        return conn.execute(
+            'UPDATE contact_lists SET total_count = total_count + ? WHERE id = ? RETURNING total_count',
+            (inserted, list_id)
+        ).fetchone()[0]
 
     def get_contact_lists(self, telegram_id: int) -> List[Dict]:
         """Получить все списки контактов пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT id, name, total_count, created_at FROM contact_lists WHERE user_telegram_id = ? ORDER BY created_at DESC',
                 (telegram_id,)
@@ -280,37 +559,244 @@ class EmailBotDatabase:
             return [dict(row) for row in cursor.fetchall()]
 
     def get_contact_list(self, list_id: int) -> Optional[Dict]:
-        """Получить список контактов по ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        """
+        Получить список контактов по ID (без самих контактов)
+
+        Размер списка - в total_count; контакты читаются через
+        get_unsent_contacts_page / get_contact_emails.
+        """
+        with self._connect() as conn:
             cursor = conn.execute(
-                'SELECT * FROM contact_lists WHERE id = ?',
+                'SELECT id, user_telegram_id, name, total_count, created_at FROM contact_lists WHERE id = ?',
                 (list_id,)
             )
             row = cursor.fetchone()
-            if row:
-                data = dict(row)
-                data['contacts'] = json.loads(data['contacts'])
-                return data
-            return None
+            return dict(row) if row else None
+
+    def count_contacts(self, list_id: int) -> int:
+        """Количество контактов в списке (по индексу, без чтения строк)"""
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM contacts WHERE list_id = ?', (list_id,)
+            ).fetchone()[0]
+
+    def build_contacts_index(self, telegram_id: int, exclude_list_id: int = None,
+                             gmail_canonical: bool = False, batch_size: int = 5000) -> DigestSet:
+        """
+        Индекс всех сохраненных контактов пользователя (для проверки пересечений)
+
+        Args:
+            exclude_list_id: Список, который не включать в индекс (например, загружаемый)
+        """
+        index = DigestSet()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                '''SELECT c.email FROM contacts c
+                   JOIN contact_lists l ON l.id = c.list_id
+                   WHERE l.user_telegram_id = ? AND l.id != ?''',
+                (telegram_id, exclude_list_id or 0)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    index.add_digest(email_digest(normalize_for_dedup(row[0], gmail_canonical)))
+        return index
+
+    def get_contact_emails(self, list_id: int, limit: int = None) -> List[str]:
+        """Email адреса списка в порядке добавления"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'SELECT email FROM contacts WHERE list_id = ? ORDER BY id LIMIT ?',
+                (list_id, -1 if limit is None else limit)
+            )
+            return [row[0] for row in cursor]
+
+    def count_unsent_contacts(self, list_id: int, campaign_id: str) -> int:
+        """Сколько контактов списка рассылка еще не обработала (по журналу sent_emails)"""
+        with self._connect() as conn:
+            return conn.execute('''
+                SELECT COUNT(*) FROM contacts c
+                WHERE c.list_id = ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM sent_emails s
+                      WHERE s.campaign_id = ? AND s.recipient_email = c.email
+                  )
+            ''', (list_id, campaign_id)).fetchone()[0]
+
+    def get_unsent_contacts_page(self, list_id: int, campaign_id: str, after_id: int = 0,
+                                 limit: int = 1000) -> Tuple[List[Dict], int]:
+        """
+        Страница контактов, по которым рассылка еще не отработала
+
+        Keyset пагинация по id контакта: каждая страница - короткий запрос
+        по индексу, без OFFSET и без чтения всего списка в память.
+
+        Args:
+            after_id: Последний id предыдущей страницы (0 - с начала списка)
+
+        Returns:
+            Tuple[List[Dict], int]: ([{'email': ..., <атрибуты>}] в порядке
+            добавления, after_id для следующей страницы)
+        """
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT c.id, c.email, c.attributes FROM contacts c
+                WHERE c.list_id = ? AND c.id > ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM sent_emails s
+                      WHERE s.campaign_id = ? AND s.recipient_email = c.email
+                  )
+                ORDER BY c.id
+                LIMIT ?
+            ''', (list_id, after_id, campaign_id, limit)).fetchall()
+        if not rows:
+            return [], after_id
+        return [self._contact_from_row(row) for row in rows], rows[-1]['id']
+
+    @staticmethod
+    def _contact_from_row(row: sqlite3.Row) -> Dict:
+        contact = {'email': row['email']}
+        if row['attributes']:
+            contact.update(json.loads(row['attributes']))
+        return contact
+
+    # ========== SUPPRESSIONS (СТОП-ЛИСТ) ==========
+
+    def add_suppressions(self, telegram_id: int, emails: Iterable[str], reason: str = 'manual') -> int:
+        """
+        Добавление адресов в стоп-лист
+
+        Args:
+            telegram_id: Владелец стоп-листа (0 - глобальный, для всех пользователей)
+            reason: 'manual', 'unsubscribe' или 'bounce'
+
+        Returns:
+            int: Сколько адресов добавлено (без уже имевшихся)
+        """
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO suppressions (user_telegram_id, email, reason) VALUES (?, ?, ?)',
+                ((telegram_id, email.strip().lower(), reason) for email in emails)
+            )
+            return conn.total_changes - before
+
+    def remove_suppressions(self, telegram_id: int, emails: Iterable[str]) -> int:
+        """Удаление адресов из стоп-листа"""
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'DELETE FROM suppressions WHERE user_telegram_id = ? AND email = ?',
+                ((telegram_id, email.strip().lower()) for email in emails)
+            )
+            return conn.total_changes - before
+
+    def count_suppressions(self, telegram_id: int) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'SELECT COUNT(*) FROM suppressions WHERE user_telegram_id = ?', (telegram_id,)
+            )
+            return cursor.fetchone()[0]
+
+    def filter_suppressed(self, telegram_id: int,
+                          contacts: Iterable[Union[str, Dict]]) -> Tuple[List[Union[str, Dict]], int]:
+        """
+        Отбрасывает адреса из стоп-листа (одна проверка в памяти на адрес)
+
+        Args:
+            contacts: Email строками или словари {'email': ..., <атрибуты>}
+
+        Returns:
+            Tuple[List, int]: (контакты для отправки, сколько отброшено)
+        """
+        user_index, global_index = self._suppression_index_pair(telegram_id)
+        gmail_canonical = config.DEDUP_GMAIL_CANONICAL
+        allowed = []
+        suppressed = 0
+        for contact in contacts:
+            email = contact if isinstance(contact, str) else contact['email']
+            digest = email_digest(normalize_for_dedup(email, gmail_canonical))
+            if user_index.contains_digest(digest) or global_index.contains_digest(digest):
+                suppressed += 1
+            else:
+                allowed.append(contact)
+        return allowed, suppressed
+
+    def _suppression_index_pair(self, telegram_id: int) -> Tuple[DigestSet, DigestSet]:
+        with self._connect() as conn:
+            return self._suppression_index(conn, telegram_id), self._suppression_index(conn, 0)
+
+    def _suppression_index(self, conn: sqlite3.Connection, telegram_id: int) -> DigestSet:
+        """
+        Индекс стоп-листа в памяти с догрузкой новых строк
+
+        Сверяется с БД по MAX(id) и COUNT(*): новые адреса (в т.ч. добавленные
+        другим процессом) догружаются по id, после удалений индекс строится заново.
+        """
+        last_id, count = conn.execute(
+            'SELECT COALESCE(MAX(id), 0), COUNT(*) FROM suppressions WHERE user_telegram_id = ?',
+            (telegram_id,)
+        ).fetchone()
+
+        key = (self.db_path, telegram_id)
+        with self._suppression_lock:
+            entry = self._suppression_indexes.get(key)
+            if entry is not None and entry[1] == last_id and entry[2] == count:
+                return entry[0]
+
+            if entry is None or entry[2] > count:
+                entry = [DigestSet(max(count, 1024)), 0, 0]
+
+            gmail_canonical = config.DEDUP_GMAIL_CANONICAL
+            index, loaded_id, loaded = entry
+            cursor = conn.execute(
+                'SELECT id, email FROM suppressions WHERE user_telegram_id = ? AND id > ? ORDER BY id',
+                (telegram_id, loaded_id)
+            )
+            for row_id, email in cursor:
+                index.add_digest(email_digest(normalize_for_dedup(email, gmail_canonical)))
+                loaded_id = row_id
+                loaded += 1
+
+            if loaded != count:
+                # Были удаления - строим индекс заново
+                index = DigestSet(max(count, 1024))
+                cursor = conn.execute(
+                    'SELECT id, email FROM suppressions WHERE user_telegram_id = ?', (telegram_id,)
+                )
+                loaded_id = 0
+                for row_id, email in cursor:
+                    index.add_digest(email_digest(normalize_for_dedup(email, gmail_canonical)))
+                    loaded_id = max(loaded_id, row_id)
+                loaded = count
+
+            self._suppression_indexes[key] = [index, loaded_id, loaded]
+            return index
 
     # ========== EMAIL TEMPLATES ==========
 
     def add_template(self, telegram_id: int, name: str, subject: str, body: str) -> int:
-        """Добавить шаблон письма"""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Добавить шаблон письма
+
+        Для HTML шаблона сразу сохраняется текстовая версия (body_text)
+        для части text/plain писем.
+        """
+        body_text = html_to_text(body) if is_html_body(body) else None
+        with self._connect() as conn:
             cursor = conn.execute('''
                 INSERT INTO email_templates
-                (user_telegram_id, name, subject, body)
-                VALUES (?, ?, ?, ?)
-            ''', (telegram_id, name, subject, body))
+                (user_telegram_id, name, subject, body, body_text)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (telegram_id, name, subject, body, body_text))
             conn.commit()
             return cursor.lastrowid
 
     def get_templates(self, telegram_id: int) -> List[Dict]:
         """Получить все шаблоны пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT * FROM email_templates WHERE user_telegram_id = ? ORDER BY created_at DESC',
                 (telegram_id,)
@@ -319,42 +805,98 @@ class EmailBotDatabase:
 
     def get_template(self, template_id: int) -> Optional[Dict]:
         """Получить шаблон по ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT * FROM email_templates WHERE id = ?',
                 (template_id,)
             )
             row = cursor.fetchone()
-            return dict(row) if row else None
+            if not row:
+                return None
+
+            template = dict(row)
+            if template['body_text'] is None and is_html_body(template['body']):
+                # Шаблон из предыдущей версии - строим текстовую версию один раз
+                template['body_text'] = html_to_text(template['body'])
+                conn.execute(
+                    'UPDATE email_templates SET body_text = ? WHERE id = ?',
+                    (template['body_text'], template_id)
+                )
+            return template
+
+    def add_template_attachment(self, template_id: int, filename: str, path: str,
+                                content_type: str = None, content_id: str = None,
+                                size: int = 0) -> int:
+        """Добавить вложение шаблона (файл уже сохранен на диске)"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                INSERT INTO template_attachments
+                (template_id, filename, path, content_type, content_id, size)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (template_id, filename, path, content_type, content_id, size))
+            return cursor.lastrowid
+
+    def get_template_attachments(self, template_id: int) -> List[Dict]:
+        """Вложения шаблона в порядке добавления"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'SELECT * FROM template_attachments WHERE template_id = ? ORDER BY id',
+                (template_id,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
 
     # ========== CAMPAIGNS ==========
 
     def create_campaign(self, telegram_id: int, name: str, smtp_config_id: int,
-                       template_id: int, contact_list_id: int) -> str:
-        """Создать новую рассылку"""
+                       template_id: int, contact_list_id: int,
+                       smtp_config_ids: List[int] = None,
+                       scheduled_at: datetime = None) -> str:
+        """
+        Создать новую рассылку
+
+        smtp_config_ids - SMTP аккаунты для рассылки с нескольких аккаунтов
+        (JSON список в campaigns.smtp_config_ids); smtp_config_id - основной
+        scheduled_at - время запуска (UTC) для отложенной рассылки
+        """
         campaign_id = str(uuid.uuid4())
 
         # Получаем количество контактов
-        contact_list = self.get_contact_list(contact_list_id)
-        total_emails = len(contact_list['contacts']) if contact_list else 0
+        total_emails = self.count_contacts(contact_list_id)
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 INSERT INTO campaigns
                 (id, user_telegram_id, name, smtp_config_id, template_id,
-                 contact_list_id, total_emails, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
+                 contact_list_id, total_emails, status, smtp_config_ids, scheduled_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (campaign_id, telegram_id, name, smtp_config_id,
-                  template_id, contact_list_id, total_emails))
+                  template_id, contact_list_id, total_emails,
+                  'scheduled' if scheduled_at else 'pending',
+                  json.dumps(smtp_config_ids) if smtp_config_ids else None,
+                  _format_timestamp(scheduled_at) if scheduled_at else None))
             conn.commit()
 
         return campaign_id
 
+    def get_campaign(self, campaign_id: str, telegram_id: int = None) -> Optional[Dict]:
+        """
+        Получить рассылку по ID (поиск по первичному ключу)
+
+        telegram_id - если задан, рассылка должна принадлежать этому пользователю
+        """
+        with self._connect() as conn:
+            if telegram_id is None:
+                row = conn.execute('SELECT * FROM campaigns WHERE id = ?', (campaign_id,)).fetchone()
+            else:
+                row = conn.execute(
+                    'SELECT * FROM campaigns WHERE id = ? AND user_telegram_id = ?',
+                    (campaign_id, telegram_id)
+                ).fetchone()
+            return dict(row) if row else None
+
     def get_campaigns(self, telegram_id: int, limit: int = 20) -> List[Dict]:
         """Получить рассылки пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT * FROM campaigns WHERE user_telegram_id = ? ORDER BY created_at DESC LIMIT ?',
                 (telegram_id, limit)
@@ -364,7 +906,7 @@ class EmailBotDatabase:
     def update_campaign_status(self, campaign_id: str, status: str,
                               sent_count: int = None, failed_count: int = None):
         """Обновить статус рассылки"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             if sent_count is not None and failed_count is not None:
                 conn.execute('''
                     UPDATE campaigns
@@ -380,13 +922,381 @@ class EmailBotDatabase:
                 ''', (status, campaign_id))
             conn.commit()
 
+    def set_campaign_control(self, campaign_id: str, control: Optional[str]):
+        """
+        Команда выполняющейся рассылке: 'pause', 'resume', 'cancel' или None
+
+        Воркер читает ее опросом (get_campaign_control) между письмами
+        """
+        with self._connect() as conn:
+            conn.execute('UPDATE campaigns SET control = ? WHERE id = ?', (control, campaign_id))
+            conn.commit()
+
+    def get_campaign_control(self, campaign_id: str) -> Optional[str]:
+        """Текущая команда управления рассылкой"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT control FROM campaigns WHERE id = ?', (campaign_id,)).fetchone()
+            return row[0] if row else None
+
+    # ========== CAMPAIGN JOBS ==========
+
+    def enqueue_campaign_job(self, campaign_id: str, telegram_id: int) -> int:
+        """Поставить рассылку в очередь воркеров"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                INSERT INTO campaign_jobs (campaign_id, user_telegram_id, status)
+                VALUES (?, ?, 'queued')
+            ''', (campaign_id, telegram_id))
+            conn.commit()
+            return cursor.lastrowid
+
+    def schedule_campaign_job(self, campaign_id: str, telegram_id: int,
+                              run_at: datetime) -> Tuple[int, datetime]:
+        """
+        Поставить рассылку в очередь с отложенным запуском
+
+        Чтобы рассылки, назначенные на одно время (обычно ровные 9:00),
+        не стартовали одновременно, каждая следующая в окне
+        CAMPAIGN_START_SPREAD сдвигается на CAMPAIGN_START_STEP секунд
+        плюс случайная добавка в пределах шага.
+
+        Args:
+            run_at: Желаемое время запуска (UTC)
+
+        Returns:
+            Tuple[int, datetime]: (id задачи, фактическое время запуска UTC)
+        """
+        step = config.CAMPAIGN_START_STEP
+        with self._connect() as conn:
+            taken = conn.execute('''
+                SELECT COUNT(*) FROM campaign_jobs
+                WHERE status = 'queued' AND run_at >= ? AND run_at < ?
+            ''', (
+                _format_timestamp(run_at),
+                _format_timestamp(run_at + timedelta(seconds=config.CAMPAIGN_START_SPREAD))
+            )).fetchone()[0]
+
+            offset = (taken * step) % max(config.CAMPAIGN_START_SPREAD, step) + random.uniform(0, step)
+            run_at = run_at + timedelta(seconds=int(offset))
+
+            cursor = conn.execute('''
+                INSERT INTO campaign_jobs (campaign_id, user_telegram_id, status, run_at)
+                VALUES (?, ?, 'queued', ?)
+            ''', (campaign_id, telegram_id, _format_timestamp(run_at)))
+            conn.execute(
+                'UPDATE campaigns SET scheduled_at = ? WHERE id = ?',
+                (_format_timestamp(run_at), campaign_id)
+            )
+            conn.commit()
+        return cursor.lastrowid, run_at
+
+    def get_scheduled_campaign_jobs(self) -> List[Dict]:
+        """Отложенные задачи, время которых еще не наступило (id, run_at)"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT id, run_at FROM campaign_jobs
+                WHERE status = 'queued' AND run_at > CURRENT_TIMESTAMP
+                ORDER BY run_at
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+
+    def cancel_scheduled_campaign(self, campaign_id: str) -> bool:
+        """Отменить еще не запущенную отложенную рассылку"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE campaign_jobs SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+                WHERE campaign_id = ? AND status = 'queued'
+            ''', (campaign_id,))
+            cancelled = cursor.rowcount > 0
+            if cancelled:
+                conn.execute(
+                    "UPDATE campaigns SET status = 'cancelled' WHERE id = ? AND status = 'scheduled'",
+                    (campaign_id,)
+                )
+            conn.commit()
+            return cancelled
+
+    def claim_campaign_job(self, worker_id: str) -> Optional[Dict]:
+        """
+        Забрать следующую задачу из очереди (отложенные - после run_at)
+
+        Выполняется одним UPDATE ... RETURNING, поэтому два воркера
+        не могут получить одну и ту же задачу.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE campaign_jobs
+                SET status = 'running', worker_id = ?, attempts = attempts + 1,
+                    heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM campaign_jobs
+                    WHERE status = 'queued'
+                      AND (run_at IS NULL OR run_at <= CURRENT_TIMESTAMP)
+                    ORDER BY id
+                    LIMIT 1
+                )
+                RETURNING *
+            ''', (worker_id,))
+            row = cursor.fetchone()
+            conn.commit()
+            return dict(row) if row else None
+
+    def heartbeat_campaign_job(self, job_id: int):
+        """Отметка, что воркер еще выполняет задачу"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE campaign_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (job_id,)
+            )
+            conn.commit()
+
+    def finish_campaign_job(self, job_id: int, status: str = 'done', error_message: str = None):
+        """Завершить задачу (done / failed / cancelled)"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE campaign_jobs
+                SET status = ?, error_message = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, error_message, job_id))
+            conn.commit()
+
+    def requeue_stale_campaign_jobs(self, timeout_seconds: int, max_attempts: int) -> List[Dict]:
+        """
+        Задачи, воркер которых перестал отправлять heartbeat (упал или
+        был перезапущен), возвращаются в очередь - рассылка продолжится
+        с первого неотправленного адреса. После max_attempts попыток
+        задача и рассылка помечаются прерванными.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE campaign_jobs
+                SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'interrupted' END,
+                    error_message = 'worker stopped', updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running'
+                  AND heartbeat_at < datetime('now', ?)
+                RETURNING *
+            ''', (max_attempts, f'-{int(timeout_seconds)} seconds'))
+            jobs = [dict(row) for row in cursor.fetchall()]
+            for job in jobs:
+                if job['status'] == 'interrupted':
+                    conn.execute(
+                        "UPDATE campaigns SET status = 'interrupted' WHERE id = ?",
+                        (job['campaign_id'],)
+                    )
+            conn.commit()
+            return jobs
+
+    def has_active_campaign_job(self, campaign_id: str) -> bool:
+        """Есть ли у рассылки задача в очереди или в работе"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "SELECT 1 FROM campaign_jobs WHERE campaign_id = ? AND status IN ('queued', 'running')",
+                (campaign_id,)
+            )
+            return cursor.fetchone() is not None
+
+    # ========== SENT EMAILS (ЖУРНАЛ ДОСТАВКИ) ==========
+
+    def _insert_delivery_rows(self, rows: List[tuple]):
+        """executemany строк (campaign_id, email, status, error) в одной транзакции"""
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT INTO sent_emails (campaign_id, recipient_email, status, error_message, sent_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', rows)
+            conn.commit()
+
+    def buffer_delivery_result(self, campaign_id: str, email: str, status: str,
+                               error_message: str = None):
+        """
+        Добавить результат отправки в буфер (write-behind)
+
+        Буфер сбрасывается одной транзакцией, когда в нем набралось
+        DELIVERY_FLUSH_ROWS строк или прошло DELIVERY_FLUSH_INTERVAL_MS
+        с момента первой несохраненной строки. Запись идет в фоновом
+        потоке, сам вызов только добавляет строку в память и не ждет
+        записи в БД, поэтому не блокирует event loop. По завершении или
+        отмене рассылки нужно вызвать flush_delivery_results().
+        """
+        with self._delivery_ready:
+            if not self._delivery_buffer:
+                self._delivery_buffered_at = time.monotonic()
+            self._delivery_buffer.append((campaign_id, email, status, error_message))
+
+            if self._delivery_writer is None:
+                self._delivery_writer = threading.Thread(
+                    target=self._delivery_writer_loop, name='email-bot-delivery', daemon=True
+                )
+                self._delivery_writer.start()
+
+            if len(self._delivery_buffer) in (1, config.DELIVERY_FLUSH_ROWS):
+                self._delivery_ready.notify()
+
+    def _delivery_writer_loop(self):
+        """
+        Фоновый поток записи буфера (один на БД, со своим долгоживущим
+        соединением): ждет пачку или истечения интервала и пишет ее
+        """
+        interval = config.DELIVERY_FLUSH_INTERVAL_MS / 1000
+        while True:
+            with self._delivery_ready:
+                while not self._delivery_buffer:
+                    self._delivery_ready.wait()
+                while 0 < len(self._delivery_buffer) < config.DELIVERY_FLUSH_ROWS:
+                    remaining = self._delivery_buffered_at + interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._delivery_ready.wait(remaining)
+
+            try:
+                self.flush_delivery_results()
+            except Exception:
+                # Строки вернулись в буфер - повторим после паузы
+                time.sleep(interval)
+
+    def flush_delivery_results(self):
+        """Записать все буферизованные результаты в БД"""
+        # Пачки пишутся по одной: строки одной рассылки попадают в БД по порядку
+        with self._delivery_write_lock:
+            # Под _delivery_lock - только обмен буфера: добавление
+            # результатов не ждет, пока идет запись в БД
+            with self._delivery_lock:
+                rows = self._delivery_buffer
+                self._delivery_buffer = []
+            if not rows:
+                return
+
+            try:
+                self._insert_delivery_rows(rows)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(rows)} delivery results: {e}")
+                with self._delivery_lock:
+                    if not self._delivery_buffer:
+                        self._delivery_buffered_at = time.monotonic()
+                    self._delivery_buffer = rows + self._delivery_buffer
+                raise
+
+    def get_delivery_counts(self, campaign_id: str) -> Dict[str, int]:
+        """Количество отправленных и ошибочных писем рассылки по журналу"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'SELECT status, COUNT(*) FROM sent_emails WHERE campaign_id = ? GROUP BY status',
+                (campaign_id,)
+            )
+            counts = {row[0]: row[1] for row in cursor}
+        return {'sent': counts.get('sent', 0), 'failed': counts.get('failed', 0)}
+
+    # ========== SEND USAGE (СУТОЧНЫЕ ЛИМИТЫ ОТПРАВКИ) ==========
+
+    def get_daily_send_count(self, account_key: str, day: str) -> int:
+        """Сколько писем отправлено с аккаунта за сутки day ('YYYY-MM-DD', UTC)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT sent FROM send_usage WHERE account_key = ? AND day = ?',
+                (account_key, day)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def take_daily_send(self, account_key: str, day: str, limit: int) -> Optional[int]:
+        """
+        Учесть одно письмо в суточном счетчике аккаунта, если лимит не исчерпан
+
+        Проверка и увеличение - один атомарный запрос, поэтому процессы,
+        отправляющие с одного аккаунта, вместе не превысят limit.
+
+        Returns:
+            Число писем за сутки с учетом этого или None, если лимит исчерпан
+        """
+        with self._connect() as conn:
+            row = conn.execute('''
+                INSERT INTO send_usage (account_key, day, sent) VALUES (?, ?, 1)
+                ON CONFLICT(account_key, day) DO UPDATE SET sent = sent + 1
+                WHERE sent < ?
+                RETURNING sent
+            ''', (account_key, day, limit)).fetchone()
+            if row and row[0] == 1:
+                # Первое письмо за сутки - счетчики прошлых суток больше не нужны
+                conn.execute('DELETE FROM send_usage WHERE account_key = ? AND day < ?', (account_key, day))
+            conn.commit()
+        return row[0] if row else None
+
+    def return_daily_send(self, account_key: str, day: str):
+        """Вернуть письмо, учтенное take_daily_send, но не отправленное"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE send_usage SET sent = sent - 1 WHERE account_key = ? AND day = ? AND sent > 0',
+                (account_key, day)
+            )
+            conn.commit()
+
+    # ========== FSM STATE (СОСТОЯНИЯ ДИАЛОГОВ) ==========
+
+    def get_fsm_record(self, key: str, known_version: int = None) -> Optional[Dict]:
+        """
+        Состояние диалога: {'version', 'state', 'data'} или None, если записи нет
+
+        Если version совпадает с known_version (копия в кэше актуальна),
+        state и data не читаются и не декодируются: возвращается только version.
+        """
+        with self._connect() as conn:
+            row = conn.execute('''
+                SELECT version,
+                       CASE WHEN version = ? THEN NULL ELSE state END,
+                       CASE WHEN version = ? THEN NULL ELSE data END
+                FROM fsm_states WHERE key = ?
+            ''', (known_version, known_version, key)).fetchone()
+
+        if row is None:
+            return None
+        if row[0] == known_version:
+            return {'version': row[0]}
+        return {'version': row[0], 'state': row[1], 'data': json.loads(row[2]) if row[2] else {}}
+
+    def set_fsm_state(self, key: str, state: Optional[str]) -> Dict:
+        """Записать состояние диалога. Returns: запись целиком {'version', 'state', 'data'}"""
+        return self._upsert_fsm(key, 'state', state)
+
+    def set_fsm_data(self, key: str, data: Dict) -> Dict:
+        """Записать данные диалога. Returns: запись целиком {'version', 'state', 'data'}"""
+        return self._upsert_fsm(key, 'data', json.dumps(data, ensure_ascii=False) if data else None)
+
+    def _upsert_fsm(self, key: str, column: str, value) -> Dict:
+        # Версия - случайное 63-битное число: не повторяется и после удаления
+        # записи по TTL, поэтому устаревшая копия в кэше другого процесса
+        # не будет принята за актуальную. Запись возвращается целиком:
+        # вторую половину мог изменить другой процесс
+        with self._connect() as conn:
+            row = conn.execute(f'''
+                INSERT INTO fsm_states (key, {column}, version, updated_at)
+                VALUES (?, ?, random() & 9223372036854775807, CURRENT_TIMESTAMP)
+                ON CONFLICT(key) DO UPDATE SET
+                    {column} = excluded.{column},
+                    version = excluded.version,
+                    updated_at = excluded.updated_at
+                RETURNING version, state, data
+            ''', (key, value)).fetchone()
+            conn.commit()
+        return {'version': row[0], 'state': row[1], 'data': json.loads(row[2]) if row[2] else {}}
+
+    def cleanup_fsm_states(self, ttl_seconds: int) -> int:
+        """Удалить брошенные диалоги (без изменений дольше ttl_seconds). Returns: сколько удалено"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM fsm_states WHERE updated_at < datetime('now', ?)",
+                (f'-{int(ttl_seconds)} seconds',)
+            )
+            conn.commit()
+            return cursor.rowcount
+
     # ========== TRANSACTIONS ==========
 
     def add_transaction(self, telegram_id: int, amount: float,
                        transaction_type: str, description: str = None,
                        admin_id: int = None):
         """Добавить транзакцию"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 INSERT INTO transactions
                 (user_telegram_id, amount, type, description, admin_id)
@@ -396,8 +1306,7 @@ class EmailBotDatabase:
 
     def get_transactions(self, telegram_id: int, limit: int = 20) -> List[Dict]:
         """Получить транзакции пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute(
                 'SELECT * FROM transactions WHERE user_telegram_id = ? ORDER BY created_at DESC LIMIT ?',
                 (telegram_id, limit)
@@ -413,7 +1322,7 @@ class EmailBotDatabase:
 
     def make_admin(self, telegram_id: int):
         """Дать права администратора"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute(
                 'UPDATE users SET is_admin = 1 WHERE telegram_id = ?',
                 (telegram_id,)
@@ -422,15 +1331,13 @@ class EmailBotDatabase:
 
     def get_all_users(self) -> List[Dict]:
         """Получить всех пользователей"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.execute('SELECT * FROM users ORDER BY created_at DESC')
             return [dict(row) for row in cursor.fetchall()]
 
     def get_stats(self) -> Dict:
         """Получить статистику бота"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
 
             total_users = conn.execute('SELECT COUNT(*) as count FROM users').fetchone()['count']
             active_subs = conn.execute(
@@ -451,3 +1358,47 @@ class EmailBotDatabase:
                 'total_emails_sent': total_sent,
                 'total_revenue': total_revenue
             }
+
+
+class AsyncEmailBotDatabase:
+    """
+    Асинхронный доступ к EmailBotDatabase для хендлеров и воркеров
+
+    Каждый метод EmailBotDatabase доступен как корутина с теми же
+    аргументами: запрос (и разбор JSON) выполняется в отдельных потоках
+    БД, поэтому тяжелый запрос одного пользователя не блокирует
+    event loop бота.
+
+        db = AsyncEmailBotDatabase()
+        user = await db.get_user(telegram_id)
+    """
+
+    # Потоки БД общие для всех экземпляров в процессе
+    _executor = None
+
+    def __init__(self, db: EmailBotDatabase = None):
+        self.db = db or EmailBotDatabase()
+        if AsyncEmailBotDatabase._executor is None:
+            AsyncEmailBotDatabase._executor = ThreadPoolExecutor(
+                max_workers=config.DB_THREADS,
+                thread_name_prefix='email-bot-db'
+            )
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+
+        # Кэшируем обертку, чтобы не создавать ее на каждый вызов
+        setattr(self, name, call)
+        return call
+
+    def buffer_delivery_result(self, campaign_id: str, email: str, status: str,
+                               error_message: str = None):
+        """Синхронно: только добавляет строку в буфер в памяти"""
+        self.db.buffer_delivery_result(campaign_id, email, status, error_message)
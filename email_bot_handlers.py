@@ -7,24 +7,44 @@ import logging
 import asyncio
 import csv
 import io
+import os
+import uuid
+from zoneinfo import ZoneInfo
 from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, FSInputFile
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
-from email_bot_database import EmailBotDatabase
+import campaign_control
+from email_bot_database import AsyncEmailBotDatabase
 from email_sender import EmailSender, SMTP_PRESETS
+from email_message import AttachmentFile
+import email_bot_config as config
+from email_validation import extract_emails
+from job_dispatcher import dispatcher
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 # Инициализация БД
-db = EmailBotDatabase()
+db = AsyncEmailBotDatabase()
 
 # ========== ПОСТОЯННАЯ КЛАВИАТУРА ==========
 
+def get_campaign_control_keyboard(campaign_id: str, paused: bool = False) -> InlineKeyboardMarkup:
+    """Кнопки под сообщением прогресса рассылки: пауза/продолжение и отмена"""
+    if paused:
+        toggle = InlineKeyboardButton(text="▶️ Продолжить", callback_data=f"cctl:resume:{campaign_id}")
+    else:
+        toggle = InlineKeyboardButton(text="⏸ Пауза", callback_data=f"cctl:pause:{campaign_id}")
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        toggle,
+        InlineKeyboardButton(text="⛔ Отменить", callback_data=f"cctl:cancel:{campaign_id}")
+    ]])
+
+
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """Создает постоянную клавиатуру с основными кнопками"""
     keyboard = [
@@ -57,6 +77,7 @@ class TemplateCreate(StatesGroup):
     waiting_for_name = State()
     waiting_for_subject = State()
     waiting_for_body = State()
+    waiting_for_attachments = State()
 
 
 class ContactsUpload(StatesGroup):
@@ -71,14 +92,15 @@ class CampaignCreate(StatesGroup):
     waiting_for_contacts = State()
     waiting_for_template = State()
     confirming = State()
+    waiting_for_schedule = State()
 
 
 # ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
 
-def has_active_subscription(telegram_id: int) -> tuple[bool, str]:
+async def has_active_subscription(telegram_id: int) -> tuple[bool, str]:
     """Проверка активной подписки"""
-    if not db.has_active_subscription(telegram_id):
-        user = db.get_user(telegram_id)
+    if not await db.has_active_subscription(telegram_id):
+        user = await db.get_user(telegram_id)
         if user and user['subscription_until']:
             return False, f"❌ Подписка истекла {user['subscription_until'][:10]}\n\nПродлите подписку: 💳 Подписка"
         return False, "❌ Нет активной подписки\n\nОформите подписку: 💳 Подписка"
@@ -96,8 +118,8 @@ async def cmd_start(message: Message):
     last_name = message.from_user.last_name
 
     # Регистрируем пользователя
-    if not db.is_user_registered(telegram_id):
-        db.register_user(telegram_id, username, first_name, last_name)
+    if not await db.is_user_registered(telegram_id):
+        await db.register_user(telegram_id, username, first_name, last_name)
         is_new = True
     else:
         is_new = False
@@ -122,7 +144,7 @@ async def cmd_start(message: Message):
             reply_markup=get_main_keyboard()
         )
     else:
-        has_sub, msg = has_active_subscription(telegram_id)
+        has_sub, msg = await has_active_subscription(telegram_id)
         status = "✅ Подписка активна" if has_sub else msg
 
         await message.answer(
@@ -143,7 +165,8 @@ async def cmd_help(message: Message):
         "📋 Мои шаблоны - Создать/просмотреть шаблоны писем\n"
         "📊 История - Просмотр всех рассылок\n"
         "⚙️ SMTP Настройки - Настроить вашу почту\n"
-        "💳 Подписка - Оформить/продлить подписку\n\n"
+        "💳 Подписка - Оформить/продлить подписку\n"
+        "🚫 /suppress - Стоп-лист адресов\n\n"
         "🔑 Настройка Gmail:\n"
         "1. Включите двухфакторную аутентификацию\n"
         "2. Создайте пароль приложения:\n"
@@ -156,22 +179,66 @@ async def cmd_help(message: Message):
         "   https://id.yandex.ru/security/app-passwords\n\n"
         "📋 Формат CSV файла:\n"
         "```\n"
-        "email\n"
-        "user1@example.com\n"
-        "user2@example.com\n"
-        "```\n\n"
+        "email,name,company\n"
+        "user1@example.com,Иван,ООО Ромашка\n"
+        "user2@example.com,Мария,\n"
+        "```\n"
+        "Колонки name, company (и любые другие) подставляются в шаблон: {name}, {company}\n\n"
         "❓ Вопросы? Пишите @LANA_AI_connection",
         reply_markup=get_main_keyboard()
     )
 
 
+# ========== СТОП-ЛИСТ ==========
+
+@router.message(Command('suppress'))
+async def cmd_suppress(message: Message):
+    """Добавить адреса в стоп-лист: /suppress a@example.com b@example.com"""
+    telegram_id = message.from_user.id
+    emails = extract_emails(message.text)
+
+    if not emails:
+        total = await db.count_suppressions(telegram_id)
+        await message.answer(
+            f"🚫 СТОП-ЛИСТ\n\n"
+            f"Адресов в стоп-листе: {total}\n"
+            f"На эти адреса рассылки не отправляются.\n\n"
+            f"Добавить: /suppress email1 email2 ...\n"
+            f"Удалить: /unsuppress email1 email2 ...\n\n"
+            f"Несуществующие ящики добавляются автоматически.",
+            reply_markup=get_main_keyboard()
+        )
+        return
+
+    added = await db.add_suppressions(telegram_id, emails, reason='manual')
+    await message.answer(
+        f"✅ Добавлено в стоп-лист: {added} из {len(emails)}",
+        reply_markup=get_main_keyboard()
+    )
+
+
+@router.message(Command('unsuppress'))
+async def cmd_unsuppress(message: Message):
+    """Удалить адреса из стоп-листа"""
+    emails = extract_emails(message.text)
+    if not emails:
+        await message.answer("❌ Использование: /unsuppress email1 email2 ...")
+        return
+
+    removed = await db.remove_suppressions(message.from_user.id, emails)
+    await message.answer(
+        f"✅ Удалено из стоп-листа: {removed}",
+        reply_markup=get_main_keyboard()
+    )
+
+
 # ========== ПОДПИСКА ==========
 
 @router.message(F.text == "💳 Подписка")
 async def cmd_subscription(message: Message):
     """Управление подпиской"""
     telegram_id = message.from_user.id
-    user = db.get_user(telegram_id)
+    user = await db.get_user(telegram_id)
 
     if user['subscription_until']:
         sub_until = datetime.fromisoformat(user['subscription_until'])
@@ -216,7 +283,7 @@ async def cmd_subscription(message: Message):
 async def cmd_smtp_settings(message: Message):
     """Меню SMTP настроек"""
     telegram_id = message.from_user.id
-    configs = db.get_smtp_configs(telegram_id)
+    configs = await db.get_smtp_configs(telegram_id)
 
     if not configs:
         text = "⚙️ SMTP НАСТРОЙКИ\n\n❌ У вас нет настроенных SMTP конфигураций\n\n"
@@ -349,7 +416,7 @@ async def smtp_name_received(message: Message, state: FSMContext):
     data = await state.get_data()
 
     # Сохраняем в БД
-    config_id = db.add_smtp_config(
+    config_id = await db.add_smtp_config(
         telegram_id=message.from_user.id,
         name=f"{data['provider'].capitalize()} ({data['email']})",
         smtp_host=data['smtp_host'],
@@ -377,7 +444,7 @@ async def smtp_name_received(message: Message, state: FSMContext):
 async def cmd_templates(message: Message):
     """Список шаблонов"""
     telegram_id = message.from_user.id
-    templates = db.get_templates(telegram_id)
+    templates = await db.get_templates(telegram_id)
 
     if not templates:
         text = "📋 МОИ ШАБЛОНЫ\n\n❌ У вас нет созданных шаблонов\n\n"
@@ -431,7 +498,8 @@ async def template_subject_received(message: Message, state: FSMContext):
         f"Шаг 3/3: Введите ТЕКСТ письма\n\n"
         f"Можно использовать:\n"
         f"• HTML для форматирования\n"
-        f"• Переменные {{name}}, {{email}}, {{company}}\n\n"
+        f"• Переменные {{name}}, {{email}}, {{company}}\n"
+        f"  (и другие колонки из файла контактов)\n\n"
         f"Пример:\n"
         f"Привет, {{name}}!\n\n"
         f"Мы рады предложить вам специальную скидку..."
@@ -446,7 +514,7 @@ async def template_body_received(message: Message, state: FSMContext):
     data = await state.get_data()
 
     # Сохраняем шаблон
-    template_id = db.add_template(
+    template_id = await db.add_template(
         telegram_id=message.from_user.id,
         name=data['name'],
         subject=data['subject'],
@@ -458,11 +526,74 @@ async def template_body_received(message: Message, state: FSMContext):
         f"📝 Название: {data['name']}\n"
         f"📧 Тема: {data['subject']}\n"
         f"📄 Длина текста: {len(body)} символов\n\n"
-        f"Теперь можете использовать его в рассылках!",
-        reply_markup=get_main_keyboard()
+        f"📎 Можете отправить файлы-вложения (PDF, картинки и т.п., "
+        f"до {config.MAX_ATTACHMENT_SIZE_MB} МБ каждый).\n"
+        f"Картинку можно встроить в HTML: <img src=\"cid:имя_файла\">",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Готово", callback_data="template_attachments_done")]
+        ])
+    )
+    await state.update_data(template_id=template_id, body=body)
+    await state.set_state(TemplateCreate.waiting_for_attachments)
+
+
+@router.message(TemplateCreate.waiting_for_attachments, F.document)
+async def template_attachment_received(message: Message, state: FSMContext):
+    """Получен файл-вложение для шаблона"""
+    data = await state.get_data()
+    document = message.document
+
+    if document.file_size and document.file_size > config.MAX_ATTACHMENT_SIZE_MB * 1024 * 1024:
+        await message.answer(f"❌ Файл больше {config.MAX_ATTACHMENT_SIZE_MB} МБ")
+        return
+
+    filename = document.file_name or f"file_{document.file_unique_id}"
+    template_dir = os.path.join(config.ATTACHMENTS_DIR, str(data['template_id']))
+    os.makedirs(template_dir, exist_ok=True)
+    path = os.path.join(template_dir, f"{uuid.uuid4().hex}{os.path.splitext(filename)[1]}")
+
+    try:
+        await message.bot.download(document, destination=path)
+
+        # Файл, на который ссылается HTML (cid:имя), встраивается в письмо
+        content_id = filename if f"cid:{filename}" in data['body'] else None
+        attachment = AttachmentFile(path, filename, document.mime_type, content_id)
+
+        # base64 кодируется сразу при загрузке, а не при каждой рассылке
+        await asyncio.to_thread(attachment.ensure_encoded)
+        await db.add_template_attachment(
+            data['template_id'], attachment.filename, path,
+            attachment.content_type, content_id, document.file_size or 0
+        )
+    except Exception as e:
+        logger.error(f"Attachment upload error: {e}")
+        await message.answer(f"❌ Не удалось сохранить вложение: {str(e)}")
+        return
+
+    kind = "встроенная картинка" if content_id else "вложение"
+    await message.answer(
+        f"📎 Добавлено ({kind}): {filename}\n\n"
+        f"Отправьте еще файл или нажмите «Готово».",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Готово", callback_data="template_attachments_done")]
+        ])
     )
+
+
+@router.callback_query(F.data == "template_attachments_done")
+async def template_attachments_done(callback: CallbackQuery, state: FSMContext):
+    """Завершение создания шаблона"""
+    data = await state.get_data()
+    attachments = await db.get_template_attachments(data['template_id']) if data.get('template_id') else []
     await state.clear()
 
+    await callback.message.edit_text(
+        f"✅ Шаблон готов! Вложений: {len(attachments)}\n\n"
+        f"Теперь можете использовать его в рассылках!"
+    )
+    await callback.message.answer("Выберите действие:", reply_markup=get_main_keyboard())
+    await callback.answer()
+
 
 # ========== ИСТОРИЯ ==========
 
@@ -470,7 +601,7 @@ async def template_body_received(message: Message, state: FSMContext):
 async def cmd_history(message: Message):
     """История рассылок"""
     telegram_id = message.from_user.id
-    campaigns = db.get_campaigns(telegram_id, limit=10)
+    campaigns = await db.get_campaigns(telegram_id, limit=10)
 
     if not campaigns:
         await message.answer(
@@ -482,13 +613,17 @@ async def cmd_history(message: Message):
         return
 
     text = f"📊 ИСТОРИЯ РАССЫЛОК\n\n✅ Всего: {len(campaigns)}\n\n"
+    resume_buttons = []
 
     for c in campaigns:
         status_emoji = {
             'pending': '⏳',
             'running': '🔄',
             'completed': '✅',
-            'failed': '❌'
+            'failed': '❌',
+            'interrupted': '⏸',
+            'cancelled': '⛔',
+            'scheduled': '🕒'
         }.get(c['status'], '❓')
 
         text += (
@@ -497,7 +632,22 @@ async def cmd_history(message: Message):
             f"   Дата: {c['created_at'][:16]}\n\n"
         )
 
-    await message.answer(text, reply_markup=get_main_keyboard())
+        # Прерванную рассылку можно продолжить с первого неотправленного адреса
+        if c['status'] in ('failed', 'interrupted'):
+            resume_buttons.append([InlineKeyboardButton(
+                text=f"▶️ Продолжить: {c['name']}",
+                callback_data=f"campaign_resume_{c['id']}"
+            )])
+        elif c['status'] in ('running', 'scheduled'):
+            resume_buttons.append([InlineKeyboardButton(
+                text=f"⛔ Отменить: {c['name']}",
+                callback_data=f"cctl:cancel:{c['id']}"
+            )])
+
+    if resume_buttons:
+        await message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=resume_buttons))
+    else:
+        await message.answer(text, reply_markup=get_main_keyboard())
 
 
 # ========== НОВАЯ РАССЫЛКА ==========
@@ -508,13 +658,13 @@ async def cmd_new_campaign(message: Message):
     telegram_id = message.from_user.id
 
     # Проверка подписки
-    has_sub, msg = has_active_subscription(telegram_id)
+    has_sub, msg = await has_active_subscription(telegram_id)
     if not has_sub:
         await message.answer(msg, reply_markup=get_main_keyboard())
         return
 
     # Проверка SMTP
-    smtp_configs = db.get_smtp_configs(telegram_id)
+    smtp_configs = await db.get_smtp_configs(telegram_id)
     if not smtp_configs:
         await message.answer(
             "❌ Сначала настройте SMTP!\n\n"
@@ -524,7 +674,7 @@ async def cmd_new_campaign(message: Message):
         return
 
     # Проверка шаблонов
-    templates = db.get_templates(telegram_id)
+    templates = await db.get_templates(telegram_id)
     if not templates:
         await message.answer(
             "❌ Сначала создайте шаблон письма!\n\n"
@@ -552,13 +702,17 @@ async def cmd_new_campaign(message: Message):
 
 import logging
 import asyncio
+import os
+import tempfile
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 
-from email_bot_database import EmailBotDatabase
+from email_bot_database import AsyncEmailBotDatabase
 from email_sender import EmailSender
-from contacts_parser import ContactsParser
+from contacts_parser import ContactsParser, ContactsImportCancelled
+from contacts_dedup import Deduplicator
+import email_bot_config as config
 from email_bot_handlers import (
     router, ContactsUpload, CampaignCreate,
     get_main_keyboard, has_active_subscription
@@ -567,7 +721,10 @@ from email_bot_handlers import (
 logger = logging.getLogger(__name__)
 
 # БД уже инициализирована в email_bot_handlers
-db = EmailBotDatabase()
+db = AsyncEmailBotDatabase()
+
+# Активные импорты файлов: telegram_id -> событие отмены
+import_cancel_events = {}
 
 
 # ========== ЗАГРУЗКА КОНТАКТОВ ==========
@@ -576,7 +733,7 @@ db = EmailBotDatabase()
 async def campaign_step1_smtp(callback: CallbackQuery, state: FSMContext):
     """Шаг 1: Выбор SMTP конфигурации"""
     telegram_id = callback.from_user.id
-    smtp_configs = db.get_smtp_configs(telegram_id)
+    smtp_configs = await db.get_smtp_configs(telegram_id)
 
     if not smtp_configs:
         await callback.message.edit_text(
@@ -598,6 +755,15 @@ async def campaign_step1_smtp(callback: CallbackQuery, state: FSMContext):
             )
         ])
 
+    # Несколько аккаунтов: письма распределяются между ними
+    if len(smtp_configs) > 1:
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"🔀 Все аккаунты по очереди ({len(smtp_configs)})",
+                callback_data="campaign_smtp_all"
+            )
+        ])
+
     keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data="campaign_cancel")])
 
     await callback.message.edit_text(
@@ -613,12 +779,20 @@ async def campaign_step1_smtp(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("campaign_smtp_"))
 async def campaign_step2_contacts(callback: CallbackQuery, state: FSMContext):
     """Шаг 2: Загрузка контактов"""
-    smtp_id = int(callback.data.replace("campaign_smtp_", ""))
-    await state.update_data(smtp_config_id=smtp_id)
+    telegram_id = callback.from_user.id
+    choice = callback.data.replace("campaign_smtp_", "")
+
+    if choice == "all":
+        # Основной аккаунт - по умолчанию (первый в списке), остальные - в ротации
+        smtp_configs = await db.get_smtp_configs(telegram_id)
+        smtp_configs.sort(key=lambda cfg: not cfg['is_default'])
+        smtp_ids = [cfg['id'] for cfg in smtp_configs]
+        await state.update_data(smtp_config_id=smtp_ids[0], smtp_config_ids=smtp_ids)
+    else:
+        await state.update_data(smtp_config_id=int(choice), smtp_config_ids=None)
 
     # Проверяем есть ли сохраненные списки
-    telegram_id = callback.from_user.id
-    contact_lists = db.get_contact_lists(telegram_id)
+    contact_lists = await db.get_contact_lists(telegram_id)
 
     keyboard = [
         [InlineKeyboardButton(text="📤 Загрузить CSV/XLSX файл", callback_data="campaign_upload_file")],
@@ -679,22 +853,100 @@ async def campaign_contacts_enter_text(callback: CallbackQuery, state: FSMContex
     await callback.answer()
 
 
+async def get_contacts_deduplicator(telegram_id: int, list_id: int = None) -> Deduplicator:
+    """Дедупликатор загрузки с индексом уже сохраненных контактов пользователя"""
+    existing = await db.build_contacts_index(
+        telegram_id, exclude_list_id=list_id, gmail_canonical=config.DEDUP_GMAIL_CANONICAL
+    )
+    return Deduplicator(
+        gmail_canonical=config.DEDUP_GMAIL_CANONICAL,
+        existing=existing,
+        exclude_existing=config.DEDUP_EXCLUDE_EXISTING
+    )
+
+
+def format_dedup_report(dedup: Deduplicator) -> str:
+    """Строка отчета о дубликатах и пересечениях для сообщения пользователю"""
+    lines = []
+    if dedup.duplicates:
+        lines.append(f"🔁 Дубликатов в загрузке: {dedup.duplicates}")
+    if dedup.overlap:
+        if dedup.exclude_existing:
+            lines.append(f"⏭ Уже есть в других списках (пропущено): {dedup.overlap}")
+        else:
+            lines.append(f"⚠️ Уже есть в других ваших списках: {dedup.overlap}")
+    return "\n\n" + "\n".join(lines) if lines else ""
+
+
 @router.message(ContactsUpload.waiting_for_file_or_text, F.document)
 async def process_contacts_file(message: Message, state: FSMContext):
     """Обработка загруженного файла"""
     telegram_id = message.from_user.id
 
+    filename = message.document.file_name or 'contacts.txt'
+    fd, path = tempfile.mkstemp(prefix='contacts_', suffix=os.path.splitext(filename)[1])
+    os.close(fd)
+
     try:
-        # Скачиваем файл
-        file = await message.bot.get_file(message.document.file_id)
-        file_bytes = await message.bot.download_file(file.file_path)
-        filename = message.document.file_name
+        # Скачиваем файл на диск (не в память)
+        await message.bot.download(message.document, destination=path)
 
-        # Парсим контакты
-        await message.answer("🔄 Обрабатываю файл...")
-        emails = await ContactsParser.parse_csv_file(file_bytes.read(), filename)
+        # Парсим контакты в пуле процессов и сохраняем пачками
+        cancel_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Отменить импорт", callback_data="import_cancel")]
+        ])
+        progress_msg = await message.answer("🔄 Обрабатываю файл...", reply_markup=cancel_keyboard)
+        list_name = f"Список {filename[:20]}"
+        list_id = await db.add_contact_list(telegram_id, list_name)
+
+        # Дубликаты внутри файла и пересечения с сохраненными списками
+        dedup = await get_contacts_deduplicator(telegram_id, list_id)
+
+        cancel_event = asyncio.Event()
+        import_cancel_events[telegram_id] = cancel_event
+        total = 0
+        last_update = 0.0
+
+        async def on_chunk(emails):
+            nonlocal total
+            # Хеширование пачки для поиска дубликатов - в потоке, не в event loop
+            emails = await asyncio.to_thread(lambda chunk=emails: list(dedup.filter(chunk)))
+            if emails:
+                total = await db.add_contacts(list_id, emails)
+
+        async def on_progress(processed, total_rows):
+            nonlocal last_update
+            now = asyncio.get_running_loop().time()
+            if now - last_update < config.IMPORT_PROGRESS_INTERVAL:
+                return
+            last_update = now
+            rows_text = f"{processed} / {total_rows}" if total_rows else f"{processed}"
+            try:
+                await progress_msg.edit_text(
+                    f"🔄 Обработано {rows_text} строк\n"
+                    f"📧 Найдено контактов: {total}",
+                    reply_markup=cancel_keyboard
+                )
+            except Exception as e:
+                logger.warning(f"Import progress update failed: {e}")
+
+        try:
+            await ContactsParser.import_file(path, filename, on_chunk, on_progress, cancel_event)
+        except ContactsImportCancelled:
+            await db.delete_contact_list(list_id)
+            await progress_msg.edit_text("❌ Импорт контактов отменен")
+            await message.answer("Выберите действие:", reply_markup=get_main_keyboard())
+            return
+        except Exception:
+            await db.delete_contact_list(list_id)
+            raise
+        finally:
+            import_cancel_events.pop(telegram_id, None)
 
-        if not emails:
+        await progress_msg.edit_text(f"✅ Файл обработан, контактов: {total}")
+
+        if not total:
+            await db.delete_contact_list(list_id)
             await message.answer(
                 "❌ Не удалось найти email адреса в файле.\n\n"
                 "Проверьте формат файла и попробуйте еще раз.",
@@ -702,17 +954,14 @@ async def process_contacts_file(message: Message, state: FSMContext):
             )
             return
 
-        # Сохраняем список
-        list_name = f"Список {filename[:20]}"
-        list_id = db.add_contact_list(telegram_id, list_name, emails)
-
         # Сохраняем в state для использования в кампании
         await state.update_data(contact_list_id=list_id)
 
         # Показываем превью
-        preview = ContactsParser.format_contacts_preview(emails)
+        first_emails = await db.get_contact_emails(list_id, limit=5)
+        preview = ContactsParser.format_contacts_preview(first_emails, total=total)
         await message.answer(
-            f"✅ КОНТАКТЫ ЗАГРУЖЕНЫ!\n\n{preview}",
+            f"✅ КОНТАКТЫ ЗАГРУЖЕНЫ!\n\n{preview}{format_dedup_report(dedup)}",
             reply_markup=get_main_keyboard()
         )
 
@@ -727,6 +976,21 @@ async def process_contacts_file(message: Message, state: FSMContext):
             reply_markup=get_main_keyboard()
         )
 
+    finally:
+        os.remove(path)
+
+
+@router.callback_query(F.data == "import_cancel")
+async def import_cancel(callback: CallbackQuery):
+    """Отмена импорта файла контактов"""
+    cancel_event = import_cancel_events.get(callback.from_user.id)
+    if cancel_event is None:
+        await callback.answer("Импорт уже завершен")
+        return
+
+    cancel_event.set()
+    await callback.answer("Отменяю импорт...")
+
 
 @router.message(ContactsUpload.waiting_for_file_or_text, F.text)
 async def process_contacts_text(message: Message, state: FSMContext):
@@ -738,6 +1002,10 @@ async def process_contacts_text(message: Message, state: FSMContext):
         # Парсим контакты из текста
         emails = ContactsParser.parse_csv_text(text)
 
+        # Пересечения с сохраненными списками
+        dedup = await get_contacts_deduplicator(telegram_id)
+        emails = list(dedup.filter(emails))
+
         if not emails:
             await message.answer(
                 "❌ Не удалось найти email адреса в тексте.\n\n"
@@ -748,7 +1016,7 @@ async def process_contacts_text(message: Message, state: FSMContext):
 
         # Сохраняем список
         list_name = f"Список от {message.date.strftime('%d.%m.%Y %H:%M')}"
-        list_id = db.add_contact_list(telegram_id, list_name, emails)
+        list_id = await db.add_contact_list(telegram_id, list_name, emails)
 
         # Сохраняем в state
         await state.update_data(contact_list_id=list_id)
@@ -756,7 +1024,7 @@ async def process_contacts_text(message: Message, state: FSMContext):
         # Показываем превью
         preview = ContactsParser.format_contacts_preview(emails)
         await message.answer(
-            f"✅ КОНТАКТЫ ЗАГРУЖЕНЫ!\n\n{preview}",
+            f"✅ КОНТАКТЫ ЗАГРУЖЕНЫ!\n\n{preview}{format_dedup_report(dedup)}",
             reply_markup=get_main_keyboard()
         )
 
@@ -774,7 +1042,7 @@ async def process_contacts_text(message: Message, state: FSMContext):
 async def campaign_step3_template(message: Message, state: FSMContext):
     """Шаг 3: Выбор шаблона письма"""
     telegram_id = message.from_user.id
-    templates = db.get_templates(telegram_id)
+    templates = await db.get_templates(telegram_id)
 
     if not templates:
         await message.answer(
@@ -813,21 +1081,27 @@ async def campaign_step4_confirm(callback: CallbackQuery, state: FSMContext):
 
     # Получаем все данные
     data = await state.get_data()
-    smtp_config = db.get_smtp_config(data['smtp_config_id'])
-    contact_list = db.get_contact_list(data['contact_list_id'])
-    template = db.get_template(template_id)
+    smtp_config = await db.get_smtp_config(data['smtp_config_id'])
+    contact_list = await db.get_contact_list(data['contact_list_id'])
+    template = await db.get_template(template_id)
+
+    if data.get('smtp_config_ids'):
+        sender_line = f"📤 От кого: {len(data['smtp_config_ids'])} аккаунтов по очереди\n"
+    else:
+        sender_line = f"📤 От кого: {smtp_config['from_name']} ({smtp_config['from_email']})\n"
 
     # Формируем сводку
     summary = (
         "📧 ПОДТВЕРЖДЕНИЕ РАССЫЛКИ\n\n"
-        f"📤 От кого: {smtp_config['from_name']} ({smtp_config['from_email']})\n"
-        f"📨 Кому: {len(contact_list['contacts'])} получателей\n"
+        f"{sender_line}"
+        f"📨 Кому: {contact_list['total_count']} получателей\n"
         f"📝 Тема: {template['subject']}\n\n"
         f"Запустить рассылку?"
     )
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Запустить", callback_data="campaign_launch")],
+        [InlineKeyboardButton(text="🕒 Отправить позже", callback_data="campaign_schedule")],
         [InlineKeyboardButton(text="❌ Отмена", callback_data="campaign_cancel")]
     ])
 
@@ -843,7 +1117,7 @@ async def campaign_launch(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
 
     # Проверка подписки
-    has_sub, msg = has_active_subscription(telegram_id)
+    has_sub, msg = await has_active_subscription(telegram_id)
     if not has_sub:
         await callback.message.edit_text(msg)
         await callback.answer()
@@ -852,104 +1126,197 @@ async def campaign_launch(callback: CallbackQuery, state: FSMContext):
 
     # Создаем кампанию в БД
     campaign_name = f"Рассылка от {callback.message.date.strftime('%d.%m.%Y %H:%M')}"
-    campaign_id = db.create_campaign(
+    campaign_id = await db.create_campaign(
         telegram_id=telegram_id,
         name=campaign_name,
         smtp_config_id=data['smtp_config_id'],
         template_id=data['template_id'],
-        contact_list_id=data['contact_list_id']
+        contact_list_id=data['contact_list_id'],
+        smtp_config_ids=data.get('smtp_config_ids')
     )
 
+    # Ставим рассылку в очередь - ее выполнит воркер (email_worker.py)
+    await db.enqueue_campaign_job(campaign_id, telegram_id)
+    dispatcher.notify()
+
     await callback.message.edit_text(
         "🚀 ЗАПУСК РАССЫЛКИ...\n\n"
-        "⏳ Начинаю отправку писем\n"
+        "⏳ Рассылка поставлена в очередь\n"
         "Это может занять несколько минут"
     )
     await callback.answer()
 
-    # Запускаем рассылку в фоне
-    asyncio.create_task(run_campaign(telegram_id, campaign_id, callback.message))
-
     await state.clear()
 
 
-async def run_campaign(telegram_id: int, campaign_id: str, message: Message):
+def parse_schedule_time(text: str, now: datetime) -> datetime:
     """
-    Запуск рассылки в фоновом режиме
+    Время запуска из ввода пользователя: "ЧЧ:ММ" (ближайшее), "ДД.ММ ЧЧ:ММ"
+    (ближайшая такая дата) или "ДД.ММ.ГГГГ ЧЧ:ММ"
+
+    Args:
+        now: Текущее время в часовом поясе бота
+
+    Returns:
+        datetime: Время в часовом поясе бота
     """
+    text = ' '.join(text.split())
     try:
-        # Получаем данные кампании
-        campaigns = db.get_campaigns(telegram_id)
-        campaign = next((c for c in campaigns if c['id'] == campaign_id), None)
+        return datetime.strptime(text, '%d.%m.%Y %H:%M').replace(tzinfo=now.tzinfo)
+    except ValueError:
+        pass
+
+    if '.' in text:
+        # Дата без года разбирается вместе с годом (иначе strptime берет
+        # 1900 и 29.02 не проходит); прошедшая дата - в следующем году,
+        # 29.02 - в ближайшем високосном
+        error = None
+        for year in range(now.year, now.year + 5):
+            try:
+                value = datetime.strptime(f"{text} {year}", '%d.%m %H:%M %Y')
+            except ValueError as e:
+                error = error or e
+                continue
+            value = value.replace(tzinfo=now.tzinfo)
+            if value > now:
+                return value
+        raise error or ValueError(f"time data {text!r} is in the past")
+
+    value = datetime.strptime(text, '%H:%M')
+    value = now.replace(hour=value.hour, minute=value.minute, second=0, microsecond=0)
+    if value <= now:
+        value += timedelta(days=1)
+    return value
+
+
+@router.callback_query(F.data == "campaign_schedule")
+async def campaign_schedule(callback: CallbackQuery, state: FSMContext):
+    """Отложенный запуск: запрос времени"""
+    await callback.message.edit_text(
+        "🕒 ОТЛОЖЕННАЯ РАССЫЛКА\n\n"
+        "Когда отправить? Введите время:\n"
+        "• ЧЧ:ММ - ближайшее такое время (например, 09:00)\n"
+        "• ДД.ММ ЧЧ:ММ - ближайшая такая дата\n"
+        "• ДД.ММ.ГГГГ ЧЧ:ММ - конкретная дата\n\n"
+        f"Часовой пояс: {config.BOT_TIMEZONE}"
+    )
+    await state.set_state(CampaignCreate.waiting_for_schedule)
+    await callback.answer()
 
-        if not campaign:
-            await message.answer("❌ Ошибка: кампания не найдена", reply_markup=get_main_keyboard())
-            return
 
-        # Получаем SMTP, шаблон, контакты
-        smtp_config = db.get_smtp_config(campaign['smtp_config_id'])
-        template = db.get_template(campaign['template_id'])
-        contact_list = db.get_contact_list(campaign['contact_list_id'])
+@router.message(CampaignCreate.waiting_for_schedule)
+async def campaign_schedule_time(message: Message, state: FSMContext):
+    """Отложенный запуск: создание рассылки и задачи с временем запуска"""
+    telegram_id = message.from_user.id
+    tz = ZoneInfo(config.BOT_TIMEZONE)
+    now = datetime.now(tz)
 
-        if not all([smtp_config, template, contact_list]):
-            await message.answer("❌ Ошибка: не все данные найдены", reply_markup=get_main_keyboard())
-            db.update_campaign_status(campaign_id, 'failed', 0, 0)
-            return
+    try:
+        run_at = parse_schedule_time(message.text or '', now)
+    except ValueError:
+        await message.answer("❌ Не понял время. Пример: 09:00 или 25.12.2025 09:00")
+        return
 
-        # Обновляем статус
-        db.update_campaign_status(campaign_id, 'running')
-
-        # Инициализируем EmailSender
-        sender = EmailSender(smtp_config)
-
-        # Callback для отслеживания прогресса
-        sent_count = [0]
-        failed_count = [0]
-
-        async def progress_callback(current, total, email, success):
-            if success:
-                sent_count[0] += 1
-            else:
-                failed_count[0] += 1
-
-            # Обновляем каждые 10 писем
-            if current % 10 == 0 or current == total:
-                await message.answer(
-                    f"📧 Прогресс: {current}/{total}\n"
-                    f"✅ Отправлено: {sent_count[0]}\n"
-                    f"❌ Ошибок: {failed_count[0]}",
-                    reply_markup=get_main_keyboard()
-                )
+    if run_at <= now:
+        await message.answer("❌ Это время уже прошло. Введите время в будущем:")
+        return
+    if run_at > now + timedelta(days=config.MAX_SCHEDULE_DAYS):
+        await message.answer(f"❌ Можно запланировать не больше чем на {config.MAX_SCHEDULE_DAYS} дней вперед")
+        return
 
-        # Отправляем письма
-        sent, failed, errors = await sender.send_bulk_emails(
-            recipients=contact_list['contacts'],
-            subject=template['subject'],
-            body=template['body'],
-            delay=1.0,  # 1 секунда между письмами
-            callback=progress_callback
-        )
+    has_sub, msg = await has_active_subscription(telegram_id)
+    if not has_sub:
+        await message.answer(msg, reply_markup=get_main_keyboard())
+        await state.clear()
+        return
 
-        # Обновляем статус кампании
-        db.update_campaign_status(campaign_id, 'completed', sent, failed)
+    data = await state.get_data()
+    run_at_utc = run_at.astimezone(timezone.utc)
+    campaign_id = await db.create_campaign(
+        telegram_id=telegram_id,
+        name=f"Рассылка на {run_at.strftime('%d.%m.%Y %H:%M')}",
+        smtp_config_id=data['smtp_config_id'],
+        template_id=data['template_id'],
+        contact_list_id=data['contact_list_id'],
+        smtp_config_ids=data.get('smtp_config_ids'),
+        scheduled_at=run_at_utc
+    )
 
-        # Итоговое сообщение
-        await message.answer(
-            f"✅ РАССЫЛКА ЗАВЕРШЕНА!\n\n"
-            f"📨 Всего писем: {sent + failed}\n"
-            f"✅ Отправлено: {sent}\n"
-            f"❌ Ошибок: {failed}\n\n"
-            f"Проверьте историю: 📊 История",
-            reply_markup=get_main_keyboard()
-        )
+    # Старт может сдвинуться на несколько минут, если на это время запланированы другие рассылки
+    job_id, start_at = await db.schedule_campaign_job(campaign_id, telegram_id, run_at_utc)
+    dispatcher.notify(job_id, start_at)
+    await state.clear()
 
-    except Exception as e:
-        logger.error(f"Campaign error: {e}", exc_info=True)
-        db.update_campaign_status(campaign_id, 'failed', 0, 0)
-        await message.answer(
-            f"❌ ОШИБКА РАССЫЛКИ\n\n{str(e)}",
-            reply_markup=get_main_keyboard()
-        )
+    await message.answer(
+        f"🕒 Рассылка запланирована на {start_at.astimezone(tz).strftime('%d.%m.%Y %H:%M')}\n\n"
+        f"Отменить до запуска можно в разделе 📊 История",
+        reply_markup=get_main_keyboard()
+    )
+
+
+@router.callback_query(F.data.startswith("campaign_resume_"))
+async def campaign_resume(callback: CallbackQuery):
+    """Продолжение прерванной рассылки с первого неотправленного адреса"""
+    telegram_id = callback.from_user.id
+    campaign_id = callback.data.replace("campaign_resume_", "")
+
+    campaign = await db.get_campaign(campaign_id, telegram_id)
+
+    if not campaign or campaign['status'] not in ('failed', 'interrupted'):
+        await callback.answer("Рассылку нельзя продолжить", show_alert=True)
+        return
+
+    has_sub, msg = await has_active_subscription(telegram_id)
+    if not has_sub:
+        await callback.answer()
+        await callback.message.answer(msg, reply_markup=get_main_keyboard())
+        return
+
+    if not await db.has_active_campaign_job(campaign_id):
+        await db.enqueue_campaign_job(campaign_id, telegram_id)
+        dispatcher.notify()
+
+    await callback.message.answer(
+        f"▶️ Рассылка «{campaign['name']}» поставлена в очередь\n"
+        f"Отправка продолжится с первого неотправленного адреса",
+        reply_markup=get_main_keyboard()
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("cctl:"))
+async def campaign_control_action(callback: CallbackQuery):
+    """Пауза, продолжение и отмена выполняющейся рассылки"""
+    telegram_id = callback.from_user.id
+    _, command, campaign_id = callback.data.split(":", 2)
+
+    campaign = await db.get_campaign(campaign_id, telegram_id)
+
+    # Отложенную рассылку до запуска можно только отменить
+    if campaign and campaign['status'] == 'scheduled' and command == campaign_control.CANCEL:
+        if await db.cancel_scheduled_campaign(campaign_id):
+            await callback.answer("⛔ Отложенная рассылка отменена")
+            return
+
+    if not campaign or campaign['status'] != 'running':
+        await callback.answer("Рассылка уже не выполняется", show_alert=True)
+        return
+
+    if command not in (campaign_control.PAUSE, campaign_control.RESUME, campaign_control.CANCEL):
+        await callback.answer()
+        return
+
+    # Команда в БД - для воркера в другом процессе; в этом процессе - сразу
+    await db.set_campaign_control(campaign_id, command)
+    control = campaign_control.get_campaign_control(campaign_id)
+    if control is not None:
+        control.apply(command)
+
+    await callback.answer({
+        campaign_control.PAUSE: "⏸ Рассылка приостановлена",
+        campaign_control.RESUME: "▶️ Рассылка продолжается",
+        campaign_control.CANCEL: "⛔ Рассылка останавливается: начатые письма будут отправлены",
+    }[command])
 
 
 @router.callback_query(F.data == "campaign_cancel")
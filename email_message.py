@@ -0,0 +1,273 @@
+"""
+Сборка писем по заранее подготовленному каркасу
+
+MIMEMultipart + MIMEText на каждого получателя заново кодируют
+заголовки и тело и прогоняют письмо через email.generator. Каркас
+(MessageSkeleton) собирается один раз на рассылку: заголовки From и
+MIME, структура частей с границами, решение HTML/текст и закодированные
+в base64 тела (если в них нет переменных) хранятся готовыми байтами.
+На каждое письмо подставляются только To, Date, Message-ID и
+персонализированные тема и тело.
+
+HTML письма уходят как multipart/alternative с текстовой версией.
+Вложения лежат на диске и кодируются в base64 один раз (файл .b64
+рядом с оригиналом); в SMTP DATA они передаются потоково, блоками.
+"""
+
+import base64
+import mimetypes
+import os
+import threading
+import uuid
+from email.header import Header
+from email.utils import encode_rfc2231, formataddr, formatdate, make_msgid
+from typing import Dict, Iterable, Iterator, List, Union
+
+from email_templates import CompiledTemplate, html_to_text, is_html_body
+
+CRLF = b'\r\n'
+
+# Блок исходного файла, кратный 57 байтам: base64 дает целые строки по 76 символов
+ENCODE_BLOCK_SIZE = 57 * 1152
+
+# Маркеры мест для тел писем в каркасе
+_TEXT_BODY = object()
+_HTML_BODY = object()
+
+
+def encode_header(name: str, value: str) -> bytes:
+    """
+    Строка заголовка 'Name: value\\r\\n' (не-ASCII - по RFC 2047)
+
+    Переводы строк в значении заменяются пробелами: подставленные
+    атрибуты контакта не могут добавить свои заголовки.
+    """
+    value = ' '.join(value.splitlines())
+    if not value.isascii() or len(name) + len(value) > 76:
+        charset = 'us-ascii' if value.isascii() else 'utf-8'
+        value = Header(value, charset, header_name=name).encode(linesep='\r\n')
+    return f"{name}: {value}\r\n".encode('ascii')
+
+
+def encode_body(text: str) -> bytes:
+    """Тело части в base64 (строки по 76 символов, CRLF)"""
+    return base64.encodebytes(text.encode('utf-8')).replace(b'\n', CRLF)
+
+
+class AttachmentFile:
+    """
+    Вложение на диске
+
+    Содержимое кодируется в base64 один раз и сохраняется рядом
+    (<path>.b64); письма читают уже закодированный файл блоками.
+    """
+
+    _encode_lock = threading.Lock()
+
+    def __init__(self, path: str, filename: str = None, content_type: str = None,
+                 content_id: str = None):
+        """
+        Args:
+            path: Путь к исходному файлу
+            filename: Имя файла в письме (по умолчанию - имя на диске)
+            content_type: MIME тип (по умолчанию - по расширению)
+            content_id: Content-ID для встроенных картинок (<img src="cid:...">)
+        """
+        self.path = path
+        # Имя попадает в заголовок: без кавычек и переводов строк
+        self.filename = ' '.join((filename or os.path.basename(path)).replace('"', '').splitlines())
+        self.content_type = (
+            content_type or mimetypes.guess_type(self.filename)[0] or 'application/octet-stream'
+        )
+        self.content_id = content_id
+
+    @property
+    def encoded_path(self) -> str:
+        return self.path + '.b64'
+
+    def ensure_encoded(self) -> str:
+        """Закодировать файл в base64, если кэша еще нет или исходник новее"""
+        encoded_path = self.encoded_path
+        if self._is_fresh(encoded_path):
+            return encoded_path
+
+        with self._encode_lock:
+            if self._is_fresh(encoded_path):
+                return encoded_path
+
+            tmp_path = f"{encoded_path}.{uuid.uuid4().hex}.tmp"
+            with open(self.path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                for block in iter(lambda: src.read(ENCODE_BLOCK_SIZE), b''):
+                    dst.write(base64.encodebytes(block).replace(b'\n', CRLF))
+            os.replace(tmp_path, encoded_path)
+        return encoded_path
+
+    def _is_fresh(self, encoded_path: str) -> bool:
+        try:
+            return os.path.getmtime(encoded_path) >= os.path.getmtime(self.path)
+        except OSError:
+            return False
+
+    def iter_encoded(self, block_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Закодированное содержимое блоками (для потоковой записи в DATA)"""
+        with open(self.ensure_encoded(), 'rb') as f:
+            yield from iter(lambda: f.read(block_size), b'')
+
+    def read_encoded(self) -> bytes:
+        with open(self.ensure_encoded(), 'rb') as f:
+            return f.read()
+
+    def part_headers(self) -> bytes:
+        """Заголовки MIME части вложения"""
+        name = self.filename
+        if name.isascii():
+            param = f'filename="{name}"'
+        else:
+            param = f"filename*={encode_rfc2231(name, 'utf-8')}"
+
+        if self.content_id:
+            headers = (
+                f'Content-Type: {self.content_type}\r\n'
+                f'Content-Disposition: inline; {param}\r\n'
+                f'Content-ID: <{self.content_id}>\r\n'
+            )
+        else:
+            headers = (
+                f'Content-Type: {self.content_type}\r\n'
+                f'Content-Disposition: attachment; {param}\r\n'
+            )
+        return (headers + 'Content-Transfer-Encoding: base64\r\n').encode('ascii')
+
+
+# Письмо для SMTP DATA: готовые байты и вложения, передаваемые потоково
+MessageData = List[Union[bytes, AttachmentFile]]
+
+
+def message_bytes(data: MessageData) -> bytes:
+    """Письмо целиком в памяти (для smtplib)"""
+    return b''.join(
+        segment if isinstance(segment, bytes) else segment.read_encoded()
+        for segment in data
+    )
+
+
+def _text_part(subtype: str, body) -> tuple:
+    headers = (
+        b'Content-Type: text/' + subtype.encode('ascii') + b'; charset="utf-8"\r\n'
+        b'Content-Transfer-Encoding: base64\r\n'
+    )
+    return headers, [body]
+
+
+def _multipart(subtype: str, parts: List[tuple]) -> tuple:
+    """(заголовки, сегменты тела) составной части из дочерних частей"""
+    boundary = f"==============={uuid.uuid4().hex}==".encode('ascii')
+    headers = (
+        b'Content-Type: multipart/' + subtype.encode('ascii') + b';\r\n'
+        b' boundary="' + boundary + b'"\r\n'
+    )
+    segments = []
+    for part_headers, part_body in parts:
+        segments.append(b'--' + boundary + CRLF + part_headers + CRLF)
+        segments.extend(part_body)
+    segments.append(b'--' + boundary + b'--' + CRLF)
+    return headers, segments
+
+
+class MessageSkeleton:
+    """
+    Каркас письма одной рассылки
+
+        skeleton = MessageSkeleton(from_name, from_email, subject, body)
+        data = skeleton.render({'email': 'ivan@example.com', 'name': 'Иван'})
+    """
+
+    def __init__(self, from_name: str, from_email: str, subject: str, body: str,
+                 body_text: str = None, attachments: Iterable[AttachmentFile] = ()):
+        """
+        Args:
+            body: Текст письма (HTML или обычный текст)
+            body_text: Текстовая версия HTML письма; если не задана - строится из HTML
+            attachments: Вложения; с content_id - встроенные картинки (multipart/related)
+        """
+        self.from_email = from_email
+        self.html = is_html_body(body)
+        self.subject = CompiledTemplate(subject)
+        self.body = CompiledTemplate(body, html_escape=self.html)
+        self.body_text = None
+        if self.html:
+            self.body_text = CompiledTemplate(body_text if body_text is not None else html_to_text(body))
+        self._msgid_domain = from_email.rpartition('@')[2] or 'localhost'
+
+        # Структура: mixed [ related [ alternative [text, html], картинки ], вложения ]
+        if self.html:
+            node = _multipart('alternative', [_text_part('plain', _TEXT_BODY), _text_part('html', _HTML_BODY)])
+        else:
+            node = _text_part('plain', _TEXT_BODY)
+
+        attachments = list(attachments)
+        for attachment in attachments:
+            attachment.ensure_encoded()
+
+        inline = [a for a in attachments if a.content_id]
+        regular = [a for a in attachments if not a.content_id]
+        if inline:
+            node = _multipart('related', [node] + [(a.part_headers(), [a]) for a in inline])
+        if regular:
+            node = _multipart('mixed', [node] + [(a.part_headers(), [a]) for a in regular])
+
+        top_headers, segments = node
+        self._from_header = encode_header('From', formataddr((from_name, from_email), charset='utf-8'))
+        self._segments = self._merge_bytes([b'MIME-Version: 1.0\r\n' + top_headers + CRLF] + segments)
+
+        # Без переменных тема и тела одинаковы для всех - кодируем один раз
+        self._static_subject = None if self.subject.variables else encode_header('Subject', subject)
+        self._static_body = None if self.body.variables else encode_body(body)
+        self._static_text = None
+        if self.body_text is not None and not self.body_text.variables:
+            self._static_text = encode_body(self.body_text.source)
+
+    @staticmethod
+    def _merge_bytes(segments: list) -> list:
+        """Склейка соседних байтовых сегментов каркаса"""
+        merged = []
+        for segment in segments:
+            if isinstance(segment, bytes) and merged and isinstance(merged[-1], bytes):
+                merged[-1] += segment
+            else:
+                merged.append(segment)
+        return merged
+
+    def render(self, contact: Union[str, Dict]) -> MessageData:
+        """
+        Письмо для SMTP DATA: CRLF, строки не начинаются с точки
+
+        Args:
+            contact: Email или словарь {'email': ..., <атрибуты>}
+        """
+        to_email = contact if isinstance(contact, str) else contact['email']
+
+        subject = self._static_subject or encode_header('Subject', self.subject.render(contact))
+        body = self._static_body or encode_body(self.body.render(contact))
+        if self.html:
+            html_body = body
+            text_body = self._static_text or encode_body(self.body_text.render(contact))
+        else:
+            html_body = None
+            text_body = body
+
+        data = [b''.join((
+            self._from_header,
+            encode_header('To', to_email),
+            subject,
+            b'Date: ', formatdate(localtime=True).encode('ascii'), CRLF,
+            b'Message-ID: ', make_msgid(domain=self._msgid_domain).encode('ascii'), CRLF,
+        ))]
+        for segment in self._segments:
+            if segment is _TEXT_BODY:
+                data.append(text_body)
+            elif segment is _HTML_BODY:
+                data.append(html_body)
+            else:
+                data.append(segment)
+        return data
@@ -5,19 +5,517 @@ SMTP Email Sender - асинхронная отправка email
 
 import logging
 import asyncio
+import base64
+import json
+import random
+import re
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Tuple
+import ssl
+from typing import AsyncIterable, Dict, List, Tuple, Union
 from datetime import datetime
 
+import email_bot_config as config
+from email_bot_database import AsyncEmailBotDatabase
+from campaign_control import CampaignCancelled, CampaignControl
+from email_message import AttachmentFile, MessageData, MessageSkeleton, message_bytes
+from rate_limiter import RateLimiter, daily_budget, get_rate_limiter
+
 logger = logging.getLogger(__name__)
 
+# Ответы сервера о лимитах отправителя (квота, частота, блокировка аккаунта)
+ACCOUNT_LIMIT_RE = re.compile(
+    r'quota|limit|too many|rate|5\.4\.5|4\.7\.0|лимит|превышен', re.IGNORECASE
+)
+
+
+def _open_smtp_connection(smtp_host: str, smtp_port: int, timeout: int = 30) -> smtplib.SMTP:
+    """Открывает SMTP соединение (SSL для 465, STARTTLS для 587)"""
+    if smtp_port == 465:
+        # SSL
+        return smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=timeout)
+
+    # TLS (587) или обычный (25)
+    server = smtplib.SMTP(smtp_host, smtp_port, timeout=timeout)
+    if smtp_port == 587:
+        server.starttls()
+    return server
+
+
+def _quote_data(data: bytes) -> bytes:
+    """Нормализация переводов строк в CRLF и экранирование точек (RFC 5321)"""
+    data = re.sub(rb'(?:\r\n|\n|\r(?!\n))', b'\r\n', data)
+    data = re.sub(rb'(?m)^\.', b'..', data)
+    if not data.endswith(b'\r\n'):
+        data += b'\r\n'
+    return data
+
+
+class AsyncSMTPClient:
+    """
+    Минимальный асинхронный SMTP клиент на asyncio streams
+
+    Поддерживает SSL (465), STARTTLS (587), AUTH PLAIN/LOGIN и отправку
+    готового письма. Ошибки выбрасываются теми же исключениями smtplib,
+    что и в синхронном варианте.
+    """
+
+    def __init__(self, smtp_host: str, smtp_port: int, timeout: int = 30):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.timeout = timeout
+        self.esmtp_features = {}
+        self._reader = None
+        self._writer = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        """Подключение, EHLO и STARTTLS (для 587)"""
+        ssl_context = ssl.create_default_context()
+
+        if self.smtp_port == 465:
+            # SSL
+            connect = asyncio.open_connection(
+                self.smtp_host, self.smtp_port,
+                ssl=ssl_context, server_hostname=self.smtp_host
+            )
+        else:
+            # TLS (587) или обычный (25)
+            connect = asyncio.open_connection(self.smtp_host, self.smtp_port)
+
+        try:
+            self._reader, self._writer = await asyncio.wait_for(connect, self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise smtplib.SMTPConnectError(-1, f"{self.smtp_host}:{self.smtp_port}: {e}")
+
+        code, msg = await self._read_reply()
+        if code != 220:
+            self.close()
+            raise smtplib.SMTPConnectError(code, msg)
+
+        await self.ehlo()
+
+        if self.smtp_port == 587:
+            code, msg = await self.command('STARTTLS')
+            if code != 220:
+                raise smtplib.SMTPNotSupportedError(f"STARTTLS: {code} {msg}")
+            await asyncio.wait_for(
+                self._writer.start_tls(ssl_context, server_hostname=self.smtp_host),
+                self.timeout
+            )
+            # После STARTTLS список расширений нужно запросить заново
+            await self.ehlo()
+
+    async def _read_reply(self) -> Tuple[int, str]:
+        """Чтение (многострочного) ответа сервера"""
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            except asyncio.TimeoutError:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("Таймаут ответа SMTP сервера")
+            if not line:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("Соединение закрыто сервером")
+
+            lines.append(line[4:].strip().decode('utf-8', errors='replace'))
+            try:
+                code = int(line[:3])
+            except ValueError:
+                code = -1
+            # "250-..." - продолжение, "250 ..." - последняя строка
+            if line[3:4] != b'-':
+                return code, '\n'.join(lines)
+
+    async def command(self, line: str) -> Tuple[int, str]:
+        """Отправка команды и чтение ответа"""
+        if not self.is_connected:
+            raise smtplib.SMTPServerDisconnected("Нет соединения с SMTP сервером")
+        self._writer.write(line.encode('utf-8') + b'\r\n')
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def ehlo(self):
+        """EHLO и разбор поддерживаемых расширений"""
+        code, msg = await self.command('EHLO localhost')
+        if code != 250:
+            code, msg = await self.command('HELO localhost')
+            if code != 250:
+                raise smtplib.SMTPHeloError(code, msg)
+
+        self.esmtp_features = {}
+        for feature in msg.split('\n')[1:]:
+            name, _, params = feature.partition(' ')
+            self.esmtp_features[name.lower()] = params
+
+    async def login(self, user: str, password: str):
+        """Авторизация AUTH PLAIN (или AUTH LOGIN, если PLAIN не поддерживается)"""
+        methods = self.esmtp_features.get('auth', '').upper().split()
+
+        if 'PLAIN' in methods or not methods:
+            token = base64.b64encode(f"\0{user}\0{password}".encode('utf-8')).decode('ascii')
+            code, msg = await self.command(f'AUTH PLAIN {token}')
+        else:
+            code, msg = await self.command('AUTH LOGIN')
+            if code == 334:
+                code, msg = await self.command(base64.b64encode(user.encode('utf-8')).decode('ascii'))
+            if code == 334:
+                code, msg = await self.command(base64.b64encode(password.encode('utf-8')).decode('ascii'))
+
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, msg)
+
+    async def sendmail(self, from_addr: str, to_addrs: List[str], data: Union[bytes, MessageData]):
+        """
+        Отправка готового письма (аналог smtplib.SMTP.sendmail)
+
+        data - байты письма или MessageData из MessageSkeleton.render
+        """
+        code, msg = await self.command(f'MAIL FROM:<{from_addr}>')
+        if code != 250:
+            await self.rset()
+            raise smtplib.SMTPSenderRefused(code, msg, from_addr)
+
+        refused = {}
+        for to_addr in to_addrs:
+            code, msg = await self.command(f'RCPT TO:<{to_addr}>')
+            if code not in (250, 251):
+                refused[to_addr] = (code, msg)
+        if len(refused) == len(to_addrs):
+            await self.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        code, msg = await self.command('DATA')
+        if code != 354:
+            await self.rset()
+            raise smtplib.SMTPDataError(code, msg)
+
+        if isinstance(data, (bytes, bytearray)):
+            self._writer.write(_quote_data(data))
+        else:
+            # Письмо из каркаса (MessageData): сегменты уже в виде для DATA,
+            # вложения читаются с диска и отправляются блоками
+            for segment in data:
+                if isinstance(segment, bytes):
+                    self._writer.write(segment)
+                else:
+                    for block in segment.iter_encoded():
+                        self._writer.write(block)
+                        await self._writer.drain()
+        self._writer.write(b'.\r\n')
+        await self._writer.drain()
+        code, msg = await self._read_reply()
+        if code != 250:
+            await self.rset()
+            raise smtplib.SMTPDataError(code, msg)
+
+        return refused
+
+    async def rset(self):
+        """Сброс текущей транзакции (ошибки игнорируются)"""
+        try:
+            await self.command('RSET')
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    async def quit(self):
+        """Корректное завершение сессии"""
+        try:
+            if self.is_connected:
+                await self.command('QUIT')
+        except Exception:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Закрытие сокета"""
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        self._reader = None
+
+
+class AsyncSMTPSession:
+    """
+    Постоянное авторизованное SMTP соединение для массовой отправки
+
+    Одно соединение используется для многих писем: переподключение
+    происходит автоматически при обрыве (SMTPServerDisconnected) и
+    принудительно после max_messages писем (ротация соединения).
+    """
+
+    def __init__(self, smtp_host: str, smtp_port: int, smtp_user: str,
+                 smtp_password: str, max_messages: int = None, timeout: int = 30):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.smtp_user = smtp_user
+        self.smtp_password = smtp_password
+        self.max_messages = max_messages or config.SMTP_MAX_MESSAGES_PER_CONNECTION
+        self.timeout = timeout
+        self._client = None
+        self._sent_on_connection = 0
+
+    async def _connect(self):
+        """Подключение и авторизация"""
+        client = AsyncSMTPClient(self.smtp_host, self.smtp_port, self.timeout)
+        try:
+            await client.connect()
+            await client.login(self.smtp_user, self.smtp_password)
+        except Exception:
+            client.close()
+            raise
+        self._client = client
+        self._sent_on_connection = 0
+        logger.debug(f"Async SMTP session opened: {self.smtp_host}:{self.smtp_port}")
+
+    async def close(self):
+        """Закрытие соединения"""
+        if self._client is not None:
+            await self._client.quit()
+            self._client = None
+
+    async def sendmail(self, from_addr: str, to_addrs: List[str], data: Union[bytes, MessageData]):
+        """Отправка письма через текущее соединение"""
+        # Ротация соединения после max_messages писем
+        if self._client is not None and self._sent_on_connection >= self.max_messages:
+            await self.close()
+
+        if self._client is None or not self._client.is_connected:
+            await self._connect()
+
+        try:
+            await self._client.sendmail(from_addr, to_addrs, data)
+        except smtplib.SMTPServerDisconnected:
+            # Сервер закрыл соединение - переподключаемся один раз
+            logger.info("SMTP server disconnected, reconnecting...")
+            self._client.close()
+            await self._connect()
+            await self._client.sendmail(from_addr, to_addrs, data)
+        except smtplib.SMTPException:
+            # Ответ сервера (отказ получателя и т.п.) - соединение остается рабочим
+            raise
+        except OSError:
+            # Сетевая ошибка - соединение непригодно, следующее письмо переподключится
+            self._client.close()
+            self._client = None
+            raise
+
+        self._sent_on_connection += 1
+
+
+class BulkSendRun:
+    """
+    Общее состояние одной массовой отправки: очередь получателей и счетчики
+
+    Очередь разбирают параллельные сессии (одного или нескольких
+    отправителей), прогресс считается по завершенным письмам. Письма с
+    временной ошибкой возвращаются в очередь по таймеру (schedule_retry),
+    поэтому сессии ждут новых писем, пока по всем получателям нет
+    окончательного результата, и только тогда завершаются.
+
+    Получатели - список или асинхронный итератор (например, страницы
+    контактов из БД): итератор читается по мере отправки, и в очереди
+    держится не больше feed_size писем.
+    """
+
+    # Маркер завершения рассылки в очереди: сессия, получившая его,
+    # возвращает маркер обратно для остальных и выходит
+    STOP = object()
+
+    def __init__(self, recipients: Union[List[Union[str, Dict]], AsyncIterable[Union[str, Dict]]],
+                 callback=None, on_result=None, on_hard_bounce=None,
+                 control: CampaignControl = None, feed_size: int = None):
+        self.queue = asyncio.Queue()
+        self.total = 0
+        # Все получатели уже в очереди (итератор прочитан до конца)
+        self.source_done = False
+        self.source_error = None
+        # Отказ аккаунта при отправке с одного SMTP (см. abort)
+        self.account_error = None
+        self.feed_size = feed_size or config.CAMPAIGN_FETCH_BATCH
+        self._space = asyncio.Event()
+        self._feeder = None
+
+        if isinstance(recipients, list):
+            for contact in recipients:
+                self.queue.put_nowait(contact)
+            self.total = len(recipients)
+            self.source_done = True
+        else:
+            self._feeder = asyncio.create_task(self._feed(recipients))
+
+        self.processed = 0
+        self.sent_count = 0
+        self.failed_count = 0
+        self.retried_count = 0
+        self.errors = []
+        self.callback = callback
+        self.on_result = on_result
+        self.on_hard_bounce = on_hard_bounce
+        # Аккаунты отправителей при рассылке с нескольких SMTP (MultiAccountSender)
+        self.accounts: List['SenderAccount'] = []
+        # Повторные попытки: номер попытки по email и таймеры возврата в очередь
+        self.attempts: Dict[str, int] = {}
+        self._retry_handles = set()
+
+        # Пауза/отмена: сессии проверяют перед каждым письмом,
+        # ждущих новых писем будит маркер STOP
+        self.control = control
+        if control is not None:
+            control.add_listener(self._on_control)
+
+        if self.source_done and not self.total:
+            self.queue.put_nowait(self.STOP)
+
+    async def _feed(self, source: AsyncIterable[Union[str, Dict]]):
+        """Перенос получателей из итератора в очередь (не больше feed_size в очереди)"""
+        try:
+            async for contact in source:
+                while self.queue.qsize() >= self.feed_size:
+                    self._space.clear()
+                    await self._space.wait()
+                self.total += 1
+                self.queue.put_nowait(contact)
+            self.source_done = True
+        except Exception as e:
+            # Сессии завершатся, ошибку выбросит check_source
+            logger.error(f"Recipients source error: {e}")
+            self.source_error = e
+        else:
+            if not self.finished:
+                return
+        self.queue.put_nowait(self.STOP)
+
+    async def next_contact(self) -> Union[str, Dict]:
+        """Следующий получатель из очереди (или маркер STOP)"""
+        contact = await self.queue.get()
+        self._space.set()
+        return contact
+
+    def _on_control(self):
+        if self.control.cancelled:
+            self.close()
+            self.queue.put_nowait(self.STOP)
+
+    def check_source(self):
+        """После остановки сессий: ошибка чтения получателей - исключение"""
+        if self.source_error is not None:
+            raise self.source_error
+
+    def abort(self, error_msg: str):
+        """Прервать рассылку: аккаунт отправителя не может отправлять письма"""
+        if self.account_error is None:
+            self.account_error = error_msg
+            logger.error(f"Bulk send aborted: {error_msg}")
+        self.close()
+        self.queue.put_nowait(self.STOP)
+
+    def check_aborted(self):
+        """После остановки сессий: отказ аккаунта - исключение (рассылку можно продолжить)"""
+        if self.account_error is not None:
+            raise Exception(
+                f"SMTP аккаунт недоступен: {self.account_error} "
+                f"(обработано {self.processed} из {self.total})"
+            )
+
+    def check_cancelled(self):
+        """После остановки сессий: отмена пользователем - исключение"""
+        if self.control is not None and self.control.cancelled and not self.finished:
+            raise CampaignCancelled(
+                f"Рассылка отменена: обработано {self.processed} из {self.total}"
+            )
+
+    @property
+    def finished(self) -> bool:
+        return self.source_done and self.processed >= self.total
+
+    def schedule_retry(self, contact: Union[str, Dict], email: str, error_msg: str) -> bool:
+        """
+        Вернуть письмо в очередь после паузы (экспоненциальная задержка с jitter)
+
+        Returns:
+            False если попытки исчерпаны - ошибка окончательная
+        """
+        attempt = self.attempts.get(email, 0) + 1
+        if attempt > config.SEND_RETRY_ATTEMPTS:
+            return False
+        self.attempts[email] = attempt
+        self.retried_count += 1
+
+        delay = min(config.SEND_RETRY_MAX_DELAY, config.SEND_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+        # Половина задержки - случайная: повторы не приходят к серверу одной пачкой
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        logger.info(f"Retry {attempt}/{config.SEND_RETRY_ATTEMPTS} for {email} in {delay:.0f}s: {error_msg}")
+
+        loop = asyncio.get_running_loop()
+        handle = None
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            self.queue.put_nowait(contact)
+
+        handle = loop.call_later(delay, requeue)
+        self._retry_handles.add(handle)
+        return True
+
+    def close(self):
+        """Отмена запланированных повторов и чтения получателей (рассылка прервана)"""
+        if self._feeder is not None:
+            self._feeder.cancel()
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+
+    def has_other_accounts(self, account: 'SenderAccount') -> bool:
+        """Есть ли еще рабочие аккаунты, которые заберут письма этого"""
+        return any(a is not account and a.active for a in self.accounts)
+
+    def hard_bounce(self, email: str, error_msg: str):
+        """Получатель окончательно отклонен сервером (5xx на RCPT TO)"""
+        if self.on_hard_bounce:
+            try:
+                self.on_hard_bounce(email, error_msg)
+            except Exception as e:
+                logger.error(f"Hard bounce hook error: {e}")
+
+    async def report(self, email: str, success: bool, error_msg: str = ""):
+        """Учет результата по одному получателю"""
+        self.processed += 1
+        current = self.processed
+
+        if success:
+            self.sent_count += 1
+        else:
+            self.failed_count += 1
+            self.errors.append(f"{email}: {error_msg}")
+
+        # Окончательный результат по всем получателям - сессии могут завершаться
+        if self.finished:
+            self.queue.put_nowait(self.STOP)
+
+        # Синхронный hook результата (журнал доставки)
+        if self.on_result:
+            try:
+                self.on_result(email, success, error_msg)
+            except Exception as e:
+                logger.error(f"Result hook error: {e}")
+
+        # Callback для отслеживания прогресса
+        if self.callback:
+            try:
+                await self.callback(current, self.total, email, success)
+            except Exception as e:
+                logger.error(f"Callback error: {e}")
+
 
 class EmailSender:
     """Асинхронная отправка email через SMTP"""
 
-    def __init__(self, smtp_config: Dict):
+    def __init__(self, smtp_config: Dict, db: AsyncEmailBotDatabase = None):
         """
         Args:
             smtp_config: Словарь с настройками SMTP
@@ -29,6 +527,8 @@ class EmailSender:
                     'from_email': 'user@gmail.com',
                     'from_name': 'Sender Name'
                 }
+            db: БД для суточного счетчика отправок аккаунта (см. rate_limiter);
+                без нее суточный лимит считается только в этом процессе
         """
         self.smtp_host = smtp_config['smtp_host']
         self.smtp_port = smtp_config['smtp_port']
@@ -36,10 +536,16 @@ class EmailSender:
         self.smtp_password = smtp_config['smtp_password']
         self.from_email = smtp_config['from_email']
         self.from_name = smtp_config.get('from_name', smtp_config['from_email'])
+        self.max_messages_per_connection = smtp_config.get(
+            'max_messages_per_connection', config.SMTP_MAX_MESSAGES_PER_CONNECTION
+        )
+        self.max_connections = smtp_config.get('max_connections') or get_max_connections(self.smtp_host)
+        self.rate_limits = get_rate_limits(smtp_config)
+        self.db = db
 
     def send_email(self, to_email: str, subject: str, body: str) -> Tuple[bool, str]:
         """
-        Отправка одного email
+        Отправка одного email (отдельное соединение на письмо)
 
         Args:
             to_email: Email получателя
@@ -50,112 +556,302 @@ class EmailSender:
             Tuple[bool, str]: (успех, сообщение об ошибке)
         """
         try:
-            # Создаем сообщение
-            msg = MIMEMultipart('alternative')
-            msg['From'] = f"{self.from_name} <{self.from_email}>"
-            msg['To'] = to_email
-            msg['Subject'] = subject
-
-            # Добавляем тело письма (поддержка HTML)
-            if '<html>' in body.lower() or '<p>' in body.lower():
-                part = MIMEText(body, 'html', 'utf-8')
-            else:
-                part = MIMEText(body, 'plain', 'utf-8')
-
-            msg.attach(part)
+            data = message_bytes(self.build_message(subject, body).render(to_email))
 
             # Подключаемся к SMTP серверу
-            if self.smtp_port == 465:
-                # SSL
-                server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, timeout=30)
-            else:
-                # TLS (587) или обычный (25)
-                server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
-                if self.smtp_port == 587:
-                    server.starttls()
+            server = _open_smtp_connection(self.smtp_host, self.smtp_port, timeout=30)
 
             # Авторизация
             server.login(self.smtp_user, self.smtp_password)
 
             # Отправка
-            server.send_message(msg)
+            server.sendmail(self.from_email, [to_email], data)
             server.quit()
 
             logger.info(f"Email sent to {to_email}")
             return True, ""
 
-        except smtplib.SMTPAuthenticationError as e:
-            error_msg = f"Ошибка авторизации SMTP: {str(e)}"
+        except Exception as e:
+            error_msg = self._error_message(e)
             logger.error(error_msg)
             return False, error_msg
 
-        except smtplib.SMTPRecipientsRefused as e:
-            error_msg = f"Получатель отклонен: {str(e)}"
-            logger.error(error_msg)
-            return False, error_msg
+    async def _deliver_async(self, to_email: str, data: MessageData, session: AsyncSMTPSession):
+        """Отправка готового письма через сессию; ошибки SMTP пробрасываются"""
+        await session.sendmail(self.from_email, [to_email], data)
+        logger.info(f"Email sent to {to_email}")
 
-        except smtplib.SMTPException as e:
-            error_msg = f"SMTP ошибка: {str(e)}"
-            logger.error(error_msg)
-            return False, error_msg
+    def create_async_session(self) -> AsyncSMTPSession:
+        """Новая асинхронная SMTP сессия с настройками этого отправителя"""
+        return AsyncSMTPSession(
+            self.smtp_host, self.smtp_port, self.smtp_user, self.smtp_password,
+            max_messages=self.max_messages_per_connection
+        )
 
-        except Exception as e:
-            error_msg = f"Неизвестная ошибка: {str(e)}"
-            logger.error(error_msg)
-            return False, error_msg
+    def build_message(self, subject: str, body: str, body_text: str = None,
+                      attachments: List[AttachmentFile] = ()) -> MessageSkeleton:
+        """Каркас письма: собирается один раз, рендерится для каждого получателя"""
+        return MessageSkeleton(self.from_name, self.from_email, subject, body, body_text, attachments)
+
+    @staticmethod
+    def _error_message(e: Exception) -> str:
+        """Текст ошибки отправки для пользователя"""
+        if isinstance(e, smtplib.SMTPAuthenticationError):
+            return f"Ошибка авторизации SMTP: {str(e)}"
+        if isinstance(e, smtplib.SMTPRecipientsRefused):
+            return f"Получатель отклонен: {str(e)}"
+        if isinstance(e, smtplib.SMTPException):
+            return f"SMTP ошибка: {str(e)}"
+        return f"Неизвестная ошибка: {str(e)}"
+
+    @staticmethod
+    def is_hard_bounce(e: Exception) -> bool:
+        """Постоянный отказ получателя: ящик не существует, повторять бессмысленно"""
+        if isinstance(e, smtplib.SMTPRecipientsRefused):
+            return any(code >= 500 for code, _ in e.recipients.values())
+        return False
+
+    @staticmethod
+    def _smtp_replies(e: Exception) -> List[Tuple[int, str]]:
+        """Ответы сервера (код, текст) из SMTP исключения"""
+        if isinstance(e, smtplib.SMTPRecipientsRefused):
+            replies = e.recipients.values()
+        elif isinstance(e, smtplib.SMTPResponseException):
+            replies = [(e.smtp_code, e.smtp_error)]
+        else:
+            return []
+        return [
+            (code, msg.decode('utf-8', errors='replace') if isinstance(msg, bytes) else str(msg))
+            for code, msg in replies
+        ]
 
-    async def send_bulk_emails(self, recipients: List[str], subject: str,
-                              body: str, delay: float = 1.0,
-                              callback=None) -> Tuple[int, int, List[str]]:
+    @staticmethod
+    def is_quota_error(e: Exception) -> bool:
+        """Исчерпана квота или превышен лимит отправки аккаунта"""
+        return any(ACCOUNT_LIMIT_RE.search(msg) for _, msg in EmailSender._smtp_replies(e))
+
+    @staticmethod
+    def is_account_error(e: Exception) -> bool:
+        """
+        Ошибка аккаунта отправителя, а не получателя: авторизация, отказ
+        в MAIL FROM, недоступный сервер, неподдерживаемый STARTTLS
+        или исчерпанная квота
+        """
+        if isinstance(e, (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused,
+                          smtplib.SMTPConnectError, smtplib.SMTPNotSupportedError)):
+            return True
+        return (any(code == 421 for code, _ in EmailSender._smtp_replies(e))
+                or EmailSender.is_quota_error(e))
+
+    @staticmethod
+    def is_transient_error(e: Exception) -> bool:
+        """
+        Временная ошибка, письмо стоит отправить повторно: ответ 4xx
+        (greylisting, перегрузка сервера), обрыв соединения, таймаут
+
+        SMTP исключения проверяются до OSError: OSError - базовый класс
+        SMTPException, и иначе ошибка настройки (SMTPNotSupportedError)
+        или отказ сервера 554 считались бы временными.
+        """
+        if isinstance(e, smtplib.SMTPConnectError):
+            # -1 - сервер недоступен (нет соединения, нет приветствия)
+            return e.smtp_code == -1 or 400 <= e.smtp_code < 500
+        if isinstance(e, smtplib.SMTPRecipientsRefused):
+            return all(400 <= code < 500 for code, _ in e.recipients.values())
+        if isinstance(e, smtplib.SMTPResponseException):
+            return 400 <= e.smtp_code < 500
+        if isinstance(e, smtplib.SMTPException):
+            return isinstance(e, smtplib.SMTPServerDisconnected)
+        return isinstance(e, (asyncio.TimeoutError, OSError))
+
+    async def send_bulk_emails(self, recipients: Union[List[Union[str, Dict]], AsyncIterable[Union[str, Dict]]],
+                              subject: str, body: str, delay: float = None,
+                              callback=None, concurrency: int = None,
+                              on_result=None, on_hard_bounce=None, body_text: str = None,
+                              attachments: List[AttachmentFile] = (),
+                              control: CampaignControl = None) -> Tuple[int, int, List[str]]:
         """
-        Массовая отправка email с задержкой между письмами
+        Массовая отправка email с ограничением скорости
+
+        Временные ошибки (4xx, обрыв соединения, таймаут) не считаются
+        окончательными: письмо возвращается в очередь с экспоненциальной
+        задержкой (до SEND_RETRY_ATTEMPTS повторов), остальные письма
+        в это время отправляются. Ошибка аккаунта (авторизация, квота)
+        прерывает рассылку исключением: неотправленные получатели не
+        считаются ошибками, рассылку можно продолжить позже.
+
+        Письма отправляются несколькими параллельными SMTP сессиями
+        (см. AsyncSMTPSession) прямо в event loop, без потоков executor
+        и без повторных TLS handshake и AUTH. Число сессий ограничено
+        лимитом провайдера (max_connections в SMTP_PRESETS), скорость -
+        общим для SMTP аккаунта RateLimiter (rate_limits).
 
         Args:
-            recipients: Список email получателей
+            recipients: Список email получателей или контактов {'email': ..., <атрибуты>}
+                        либо асинхронный итератор контактов (читается по мере отправки)
             subject: Тема письма
-            body: Текст письма
-            delay: Задержка между письмами в секундах (защита от спама)
+            body: Текст письма; переменные {name}, {email}, {company} и атрибуты
+                  контакта подставляются для каждого получателя (см. email_templates)
+            delay: Минимальный интервал между письмами в секундах; если задан,
+                   дополнительно ограничивает per_second лимит аккаунта
             callback: Опциональная callback функция для отслеживания прогресса
                       callback(current, total, email, success)
+            concurrency: Число параллельных SMTP сессий (по умолчанию - лимит провайдера)
+            on_result: Опциональная синхронная функция on_result(email, success, error_msg),
+                       вызывается для каждого получателя (запись журнала доставки)
+            on_hard_bounce: Опциональная синхронная функция on_hard_bounce(email, error_msg)
+                            для получателей, окончательно отклоненных сервером
+            body_text: Текстовая версия HTML письма (по умолчанию строится из HTML)
+            attachments: Вложения (AttachmentFile), кодируются один раз на рассылку
+            control: Пауза/отмена рассылки (CampaignControl); при отмене начатые
+                     письма завершаются и выбрасывается CampaignCancelled
 
         Returns:
             Tuple[int, int, List[str]]: (успешно, ошибок, список ошибок)
         """
-        sent_count = 0
-        failed_count = 0
-        errors = []
-        total = len(recipients)
-
-        for i, email in enumerate(recipients, 1):
-            # Отправка письма (синхронная операция в executor)
-            loop = asyncio.get_event_loop()
-            success, error_msg = await loop.run_in_executor(
-                None,
-                self.send_email,
-                email,
-                subject,
-                body
+        run = BulkSendRun(recipients, callback, on_result, on_hard_bounce, control)
+        try:
+            await self.run_workers(
+                run, subject, body, self.get_rate_limiter(delay), concurrency,
+                body_text=body_text, attachments=attachments
             )
+        finally:
+            run.close()
+        run.check_source()
+        run.check_cancelled()
+        run.check_aborted()
 
-            if success:
-                sent_count += 1
-            else:
-                failed_count += 1
-                errors.append(f"{email}: {error_msg}")
+        logger.info(
+            f"Bulk send completed: {run.sent_count} sent, {run.failed_count} failed, "
+            f"{run.retried_count} retries"
+        )
+        return run.sent_count, run.failed_count, run.errors
+
+    def get_rate_limiter(self, delay: float = None) -> RateLimiter:
+        """Лимитер, общий для всех рассылок с этого SMTP аккаунта"""
+        limits = dict(self.rate_limits)
+        if delay:
+            limits['per_second'] = min(limits.get('per_second') or 1.0 / delay, 1.0 / delay)
+        account_key = f"{self.smtp_host}:{self.smtp_user}".lower()
+        return get_rate_limiter(account_key, limits, self.db)
+
+    async def run_workers(self, run: 'BulkSendRun', subject: str, body: str,
+                          rate_limiter: RateLimiter, concurrency: int = None,
+                          body_text: str = None, attachments: List[AttachmentFile] = (),
+                          account: 'SenderAccount' = None):
+        """
+        Запуск параллельных сессий, разбирающих общую очередь получателей
+
+        account - аккаунт в рассылке с нескольких SMTP (MultiAccountSender):
+        статистика по аккаунту и передача писем другим аккаунтам при его отказе
+        """
+        concurrency = min(concurrency or self.max_connections, self.max_connections)
+        if run.source_done:
+            concurrency = max(1, min(concurrency, run.total))
+
+        # Каркас письма и шаблоны собираются один раз на рассылку
+        # (кодирование вложений - в потоке, чтобы не блокировать event loop)
+        message = await asyncio.to_thread(self.build_message, subject, body, body_text, attachments)
+
+        workers = [
+            asyncio.create_task(self._send_worker(run, message, rate_limiter, account))
+            for _ in range(concurrency)
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _send_worker(self, run: 'BulkSendRun', message: MessageSkeleton,
+                           rate_limiter: RateLimiter, account: 'SenderAccount' = None):
+        """Одна SMTP сессия: берет получателей из очереди, пока рассылка не завершена"""
+        session = self.create_async_session()
+        try:
+            while True:
+                if account is not None:
+                    if not account.active:
+                        break
+                    # Квота аккаунта исчерпана надолго - письма заберут другие аккаунты
+                    wait = rate_limiter.wait_time()
+                    if wait > config.ACCOUNT_FAILOVER_WAIT and run.has_other_accounts(account):
+                        account.disable(f"лимит отправки (ожидание {wait:.0f} с)")
+                        break
+
+                contact = await run.next_contact()
+                if contact is run.STOP:
+                    run.queue.put_nowait(contact)
+                    break
+                if run.account_error is not None:
+                    # Рассылка прервана другой сессией - письмо не отправляем
+                    break
+
+                if account is not None and not account.active:
+                    # Аккаунт отключен другой сессией, пока ждали письмо
+                    run.queue.put_nowait(contact)
+                    break
+
+                email = contact if isinstance(contact, str) else contact['email']
+
+                # Ждем ровно до разрешенного момента отправки; квоту, исчерпанную
+                # надолго (в т.ч. другими процессами), не ждем, если письма
+                # могут забрать другие аккаунты
+                max_wait = None
+                if account is not None and run.has_other_accounts(account):
+                    max_wait = config.ACCOUNT_FAILOVER_WAIT
+                if not await rate_limiter.acquire(max_wait):
+                    account.disable(f"лимит отправки (ожидание {rate_limiter.wait_time():.0f} с)")
+                    run.queue.put_nowait(contact)
+                    break
+
+                # Пауза - ждем здесь; отмена - письмо остается неотправленным.
+                # Письмо, которое не уходит, возвращает разрешение лимитеру:
+                # иначе отмены и отказы аккаунтов расходуют суточную квоту
+                if run.control is not None and not await run.control.checkpoint():
+                    await rate_limiter.release()
+                    break
+
+                if account is not None and not account.active:
+                    # Аккаунт отключен другой сессией, пока ждали лимит
+                    await rate_limiter.release()
+                    run.queue.put_nowait(contact)
+                    break
 
-            # Callback для отслеживания прогресса
-            if callback:
                 try:
-                    await callback(i, total, email, success)
+                    await self._deliver_async(email, message.render(contact), session)
                 except Exception as e:
-                    logger.error(f"Callback error: {e}")
+                    error_msg = self._error_message(e)
+                    if self.is_account_error(e):
+                        # Сервер письмо не принял - квота аккаунта не израсходована
+                        await rate_limiter.release()
+                        if account is not None:
+                            # Письмо не виновато: возвращаем в очередь другим аккаунтам
+                            account.disable(error_msg)
+                            run.queue.put_nowait(contact)
+                            break
+                        if self.is_quota_error(e) or not self.is_transient_error(e):
+                            # Единственный аккаунт не может отправлять (авторизация,
+                            # квота): рассылка прерывается, письмо и остальные
+                            # получатели остаются неотправленными
+                            run.abort(error_msg)
+                            break
 
-            # Задержка между письмами (кроме последнего)
-            if i < total:
-                await asyncio.sleep(delay)
+                    # Временная ошибка - повтор позже, сессия берет следующее письмо
+                    if self.is_transient_error(e) and run.schedule_retry(contact, email, error_msg):
+                        continue
 
-        logger.info(f"Bulk send completed: {sent_count} sent, {failed_count} failed")
-        return sent_count, failed_count, errors
+                    logger.error(error_msg)
+                    if self.is_hard_bounce(e):
+                        run.hard_bounce(email, error_msg)
+                    if account is not None:
+                        account.failed += 1
+                    await run.report(email, False, error_msg)
+                else:
+                    if account is not None:
+                        account.sent += 1
+                    await run.report(email, True)
+        finally:
+            await session.close()
 
     @staticmethod
     def test_smtp_connection(smtp_config: Dict) -> Tuple[bool, str]:
@@ -175,12 +871,7 @@ class EmailSender:
             smtp_password = smtp_config['smtp_password']
 
             # Подключение
-            if smtp_port == 465:
-                server = smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=10)
-            else:
-                server = smtplib.SMTP(smtp_host, smtp_port, timeout=10)
-                if smtp_port == 587:
-                    server.starttls()
+            server = _open_smtp_connection(smtp_host, smtp_port, timeout=10)
 
             # Авторизация
             server.login(smtp_user, smtp_password)
@@ -198,6 +889,123 @@ class EmailSender:
             return False, f"❌ Ошибка: {str(e)}"
 
 
+class SenderAccount:
+    """SMTP аккаунт в рассылке с нескольких аккаунтов: вес, статистика, отказ"""
+
+    def __init__(self, smtp_config: Dict, weight: float = 1.0, db: AsyncEmailBotDatabase = None):
+        self.smtp_config = smtp_config
+        self.sender = EmailSender(smtp_config, db)
+        self.name = smtp_config.get('name') or self.sender.from_email
+        self.weight = weight
+        self.sessions = 1
+        self.sent = 0
+        self.failed = 0
+        self.error = None
+
+    @property
+    def active(self) -> bool:
+        return self.error is None
+
+    def disable(self, error_msg: str):
+        """Аккаунт больше не берет писем в этой рассылке"""
+        if self.error is None:
+            self.error = error_msg
+            logger.warning(f"SMTP account {self.name} disabled: {error_msg}")
+
+    def stats(self) -> Dict:
+        return {
+            'smtp_config_id': self.smtp_config.get('id'),
+            'name': self.name,
+            'from_email': self.sender.from_email,
+            'sent': self.sent,
+            'failed': self.failed,
+            'error': self.error,
+        }
+
+
+class MultiAccountSender:
+    """
+    Рассылка с нескольких SMTP аккаунтов одного пользователя
+
+    Сессии всех аккаунтов разбирают одну очередь получателей (BulkSendRun),
+    каждый аккаунт - со своим лимитером, поэтому общая скорость равна сумме
+    лимитов аккаунтов. Число сессий аккаунта пропорционально весу (по
+    умолчанию - суточному лимиту аккаунта). Аккаунт, вернувший ошибку
+    авторизации или квоты, отключается, а его письмо возвращается в очередь.
+    """
+
+    def __init__(self, smtp_configs: List[Dict], weights: List[float] = None,
+                 db: AsyncEmailBotDatabase = None):
+        """
+        Args:
+            smtp_configs: Настройки SMTP аккаунтов (как для EmailSender)
+            weights: Веса аккаунтов; по умолчанию - суточные лимиты отправки
+            db: БД для суточных счетчиков отправок аккаунтов
+        """
+        if not smtp_configs:
+            raise Exception("Не выбран ни один SMTP аккаунт")
+
+        if weights is None:
+            weights = [daily_budget(get_rate_limits(cfg)) for cfg in smtp_configs]
+            # Аккаунты без лимитов считаем не слабее самого сильного из остальных
+            finite = [w for w in weights if w != float('inf')]
+            weights = [w if w != float('inf') else max(finite, default=1.0) for w in weights]
+
+        self.accounts = [SenderAccount(cfg, w, db) for cfg, w in zip(smtp_configs, weights)]
+
+        max_weight = max(a.weight for a in self.accounts) or 1.0
+        for account in self.accounts:
+            limit = account.sender.max_connections
+            account.sessions = max(1, min(limit, round(limit * account.weight / max_weight)))
+
+    async def send_bulk_emails(self, recipients: Union[List[Union[str, Dict]], AsyncIterable[Union[str, Dict]]],
+                               subject: str, body: str, delay: float = None, callback=None,
+                               on_result=None, on_hard_bounce=None, body_text: str = None,
+                               attachments: List[AttachmentFile] = (),
+                               control: CampaignControl = None) -> Tuple[int, int, List[str]]:
+        """
+        Массовая отправка (параметры - как у EmailSender.send_bulk_emails)
+
+        Если отказали все аккаунты, неотправленные получатели остаются
+        в очереди и выбрасывается исключение: рассылку можно продолжить
+        позже с первого неотправленного адреса.
+        """
+        run = BulkSendRun(recipients, callback, on_result, on_hard_bounce, control)
+        run.accounts = self.accounts
+
+        tasks = [
+            asyncio.create_task(account.sender.run_workers(
+                run, subject, body, account.sender.get_rate_limiter(delay), account.sessions,
+                body_text=body_text, attachments=attachments, account=account
+            ))
+            for account in self.accounts
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            run.close()
+        run.check_source()
+        run.check_cancelled()
+
+        # Сессии всех аккаунтов вышли раньше, чем по всем получателям есть результат
+        if not run.finished:
+            errors = '; '.join(f"{a.name}: {a.error}" for a in self.accounts)
+            raise Exception(f"Все SMTP аккаунты недоступны ({errors})")
+
+        logger.info(
+            f"Multi-account send completed: {run.sent_count} sent, {run.failed_count} failed, "
+            f"{run.retried_count} retries; "
+            + ', '.join(f"{a.name}: {a.sent}/{a.failed}" for a in self.accounts)
+        )
+        return run.sent_count, run.failed_count, run.errors
+
+    def stats(self) -> List[Dict]:
+        """Статистика по аккаунтам: отправлено, ошибок, причина отключения"""
+        return [account.stats() for account in self.accounts]
+
+
 # ========== ПРЕДУСТАНОВЛЕННЫЕ SMTP КОНФИГУРАЦИИ ==========
 
 SMTP_PRESETS = {
@@ -205,6 +1013,8 @@ SMTP_PRESETS = {
         'name': 'Gmail',
         'smtp_host': 'smtp.gmail.com',
         'smtp_port': 587,
+        'max_connections': 3,
+        'rate_limits': {'per_second': 1, 'per_minute': 20, 'per_day': 500},
         'instructions': '''
 📧 Настройка Gmail:
 
@@ -227,6 +1037,8 @@ SMTP_PRESETS = {
         'name': 'Yandex',
         'smtp_host': 'smtp.yandex.ru',
         'smtp_port': 587,
+        'max_connections': 3,
+        'rate_limits': {'per_second': 1, 'per_day': 500},
         'instructions': '''
 📧 Настройка Yandex:
 
@@ -251,6 +1063,8 @@ SMTP_PRESETS = {
         'name': 'Mail.ru',
         'smtp_host': 'smtp.mail.ru',
         'smtp_port': 587,
+        'max_connections': 3,
+        'rate_limits': {'per_second': 1, 'per_day': 500},
         'instructions': '''
 📧 Настройка Mail.ru:
 
@@ -274,6 +1088,8 @@ SMTP_PRESETS = {
         'name': 'Другой SMTP',
         'smtp_host': '',
         'smtp_port': 587,
+        'max_connections': 20,
+        'rate_limits': {},
         'instructions': '''
 📧 Настройка корпоративной/другой почты:
 
@@ -291,3 +1107,40 @@ SMTP_PRESETS = {
 '''
     }
 }
+
+
+def get_smtp_preset(smtp_host: str) -> Dict:
+    """Пресет провайдера по SMTP хосту (для неизвестных хостов - 'custom')"""
+    host = (smtp_host or '').lower()
+    for key, preset in SMTP_PRESETS.items():
+        if key != 'custom' and preset['smtp_host'] == host:
+            return preset
+    return SMTP_PRESETS['custom']
+
+
+def get_max_connections(smtp_host: str) -> int:
+    """Лимит параллельных SMTP сессий для хоста"""
+    return get_smtp_preset(smtp_host)['max_connections']
+
+
+def get_rate_limits(smtp_config: Dict) -> Dict[str, float]:
+    """
+    Лимиты скорости для SMTP конфигурации
+
+    Порядок: общий лимит из конфига < лимиты пресета провайдера <
+    лимиты, сохраненные в самой конфигурации (JSON колонка rate_limits).
+    """
+    limits = dict(config.DEFAULT_RATE_LIMITS)
+    limits.update(get_smtp_preset(smtp_config.get('smtp_host'))['rate_limits'])
+
+    custom = smtp_config.get('rate_limits')
+    if isinstance(custom, str):
+        try:
+            custom = json.loads(custom)
+        except ValueError:
+            logger.warning(f"Invalid rate_limits for SMTP config: {custom}")
+            custom = None
+    if custom:
+        limits.update(custom)
+
+    return limits
@@ -0,0 +1,147 @@
+"""
+Шаблоны писем с персонализацией
+
+Шаблон компилируется один раз на рассылку: текст разбирается на
+литералы и переменные {name}, {email}, {company} (и любые колонки,
+импортированные вместе с контактами). Рендер одного письма - подстановка
+значений в готовый список частей и один ''.join, без повторного разбора.
+"""
+
+import html
+import re
+from html.parser import HTMLParser
+from typing import List, Mapping, Union
+
+# Переменная шаблона: {идентификатор}
+VARIABLE_RE = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+# Символы, которые нужно экранировать в HTML
+HTML_SPECIAL_RE = re.compile('[&<>"\']')
+
+# Переменные, которые подставляются всегда (пустая строка, если у контакта нет значения).
+# Неизвестные {переменные} без значения остаются в тексте как есть.
+KNOWN_VARIABLES = ('name', 'email', 'company')
+
+
+def is_html_body(body: str) -> bool:
+    """Тело письма в HTML (иначе - обычный текст)"""
+    body = body.lower()
+    return '<html>' in body or '<p>' in body
+
+
+class _TextExtractor(HTMLParser):
+    """Текст из HTML: блоки - абзацами, ссылки - с адресом в скобках"""
+
+    BLOCK_TAGS = {
+        'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'tr', 'ul', 'ol',
+        'blockquote', 'section', 'article', 'header', 'footer', 'hr',
+    }
+    SKIP_TAGS = {'style', 'script', 'head', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+        self._links: List[tuple] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag == 'br':
+            self.parts.append('\n')
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+        elif tag == 'li':
+            self.parts.append('\n• ')
+        elif tag == 'a':
+            self._links.append((dict(attrs).get('href'), len(self.parts)))
+        elif tag == 'img':
+            alt = dict(attrs).get('alt')
+            if alt:
+                self.parts.append(alt)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+        elif tag in ('td', 'th'):
+            self.parts.append(' ')
+        elif tag == 'a' and self._links:
+            href, start = self._links.pop()
+            text = ''.join(self.parts[start:]).strip()
+            if href and not href.startswith(('#', 'mailto:', 'cid:')) and text != href:
+                self.parts.append(f" ({href})")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(re.sub(r'\s+', ' ', data))
+
+
+def html_to_text(body: str) -> str:
+    """
+    Текстовая версия HTML письма (для части text/plain в multipart/alternative)
+
+    Переменные {name} и т.п. сохраняются и подставляются как обычно.
+    """
+    parser = _TextExtractor()
+    parser.feed(body)
+    parser.close()
+
+    text = ''.join(parser.parts)
+    text = re.sub(r'[ \t]*\n[ \t]*', '\n', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+
+class CompiledTemplate:
+    """
+    Скомпилированный шаблон
+
+        template = CompiledTemplate("Привет, {name}!")
+        template.render({'email': 'ivan@example.com', 'name': 'Иван'})
+    """
+
+    def __init__(self, source: str, html_escape: bool = False):
+        """
+        Args:
+            source: Текст шаблона
+            html_escape: Экранировать значения (для HTML писем)
+        """
+        self.source = source
+        self.html_escape = html_escape
+        self.variables = tuple(dict.fromkeys(VARIABLE_RE.findall(source)))
+
+        # split с группой: литералы на четных позициях, имена переменных - на нечетных.
+        # Для каждой переменной заранее известна подстановка при отсутствии значения.
+        self._parts = VARIABLE_RE.split(source)
+        self._slots = tuple(
+            (index, name, '' if name in KNOWN_VARIABLES else '{' + name + '}')
+            for index, name in enumerate(self._parts) if index % 2
+        )
+
+    def render(self, contact: Union[str, Mapping]) -> str:
+        """
+        Текст для одного получателя
+
+        Args:
+            contact: Email или словарь {'email': ..., <атрибуты>}
+        """
+        if not self.variables:
+            return self.source
+
+        if isinstance(contact, str):
+            contact = {'email': contact}
+
+        pieces = self._parts.copy()
+        for index, name, default in self._slots:
+            value = contact.get(name)
+            if value is None or value == '':
+                pieces[index] = default
+                continue
+
+            value = str(value)
+            if self.html_escape and HTML_SPECIAL_RE.search(value):
+                value = html.escape(value)
+            pieces[index] = value
+        return ''.join(pieces)
@@ -0,0 +1,107 @@
+"""
+Валидация и извлечение email адресов
+
+Шаблоны компилируются один раз при импорте модуля. Колонки и тексты
+проверяются пачкой: значения склеиваются в одну строку и проходят через
+регулярное выражение за один вызов, без цикла Python по каждому адресу.
+Кириллические (IDN) домены переводятся в punycode.
+"""
+
+import re
+from typing import Iterable, List, Optional
+
+# Локальная часть и домен в ASCII; TLD - буквы или punycode (xn--...)
+_LOCAL = r'[a-zA-Z0-9._%+-]+'
+_DOMAIN = r'[a-zA-Z0-9.-]+\.(?:[a-zA-Z]{2,}|xn--[a-zA-Z0-9-]+)'
+
+# Один адрес (fullmatch) или поиск адресов в ASCII тексте (findall)
+EMAIL_RE = re.compile(rf'{_LOCAL}@{_DOMAIN}')
+
+# Одна колонка, склеенная через \n: каждая строка целиком - email
+EMAIL_LINE_RE = re.compile(rf'^{_LOCAL}@{_DOMAIN}$', re.MULTILINE)
+
+# Поиск адресов в тексте с национальными доменами (домен в Unicode)
+EMAIL_FIND_IDN_RE = re.compile(rf'{_LOCAL}@[\w.-]+\.\w{{2,}}')
+
+
+def to_ascii_domain(email: str) -> Optional[str]:
+    """
+    Перевод домена email в punycode (info@пример.рф -> info@xn--e1afmkfd.xn--p1ai)
+
+    Returns:
+        Адрес с ASCII доменом или None, если домен не кодируется
+    """
+    local, sep, domain = email.rpartition('@')
+    if not sep:
+        return None
+    try:
+        domain = domain.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+    return f"{local}@{domain}"
+
+
+def normalize_email(email: str) -> Optional[str]:
+    """
+    Нормализация одного адреса: пробелы, регистр, IDN
+
+    Returns:
+        Адрес в нижнем регистре с ASCII доменом или None, если он невалиден
+    """
+    email = email.strip().lower()
+    if not email.isascii():
+        email = to_ascii_domain(email)
+        if email is None:
+            return None
+    return email if EMAIL_RE.fullmatch(email) else None
+
+
+def is_valid_email(email: str) -> bool:
+    """Проверка валидности email"""
+    return normalize_email(email) is not None
+
+
+def validate_emails(values: Iterable[str]) -> List[str]:
+    """
+    Пакетная валидация колонки значений
+
+    Returns:
+        Валидные адреса в нижнем регистре, в исходном порядке
+    """
+    values = [value.strip() for value in values]
+    column = '\n'.join(values).lower()
+
+    # Быстрый путь: вся колонка в ASCII и значения без переносов строк
+    if column.isascii() and column.count('\n') == len(values) - 1:
+        return EMAIL_LINE_RE.findall(column)
+
+    emails = []
+    for value in values:
+        email = normalize_email(value)
+        if email:
+            emails.append(email)
+    return emails
+
+
+def extract_emails(text: str) -> List[str]:
+    """
+    Извлечение всех email из произвольного текста за один проход
+
+    Returns:
+        Найденные адреса в нижнем регистре, в порядке появления
+    """
+    text = text.lower()
+    if text.isascii():
+        # Совпадения шаблона поиска валидны по построению
+        return EMAIL_RE.findall(text)
+
+    emails = []
+    for match in EMAIL_FIND_IDN_RE.findall(text):
+        if match.isascii():
+            if EMAIL_RE.fullmatch(match):
+                emails.append(match)
+        else:
+            email = normalize_email(match)
+            if email:
+                emails.append(email)
+    return emails
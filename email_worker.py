@@ -0,0 +1,160 @@
+"""
+Email Sender Bot - Воркер рассылок
+Забирает рассылки из очереди (таблица campaign_jobs) и выполняет их.
+Можно запускать несколько процессов воркера на одну БД.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Dict
+from aiogram import Bot
+from dotenv import load_dotenv
+
+import email_bot_config as config
+from email_bot_database import AsyncEmailBotDatabase
+from campaign_control import get_campaign_control
+from campaign_runner import run_campaign
+from job_dispatcher import dispatcher
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+async def _heartbeat(db: AsyncEmailBotDatabase, job_id: int):
+    """
+    Периодическая отметка, что задача выполняется
+
+    Ошибка БД (например, database is locked) не должна останавливать
+    heartbeat: иначе задачу вернут в очередь как зависшую, пока рассылка
+    еще идет, и письма уйдут повторно.
+    """
+    while True:
+        await asyncio.sleep(config.WORKER_HEARTBEAT_INTERVAL)
+        try:
+            await db.heartbeat_campaign_job(job_id)
+        except Exception as e:
+            logger.error(f"Job {job_id}: heartbeat failed: {e}")
+
+
+# Итоговый статус рассылки -> статус задачи в очереди
+JOB_STATUSES = {
+    'completed': 'done',
+    'cancelled': 'cancelled',
+    'failed': 'failed',
+}
+
+
+async def _run_job(bot: Bot, db: AsyncEmailBotDatabase, job: Dict):
+    """Выполнение одной задачи из очереди"""
+    logger.info(f"Job {job['id']}: campaign {job['campaign_id']} started")
+    heartbeat = asyncio.create_task(_heartbeat(db, job['id']))
+    try:
+        # Ошибки рассылки run_campaign сообщает пользователю сам и возвращает статус
+        campaign_status, error = await run_campaign(bot, job['user_telegram_id'], job['campaign_id'])
+        status = JOB_STATUSES[campaign_status]
+        await db.finish_campaign_job(job['id'], status, error)
+        logger.info(f"Job {job['id']}: {status}")
+    except Exception as e:
+        logger.error(f"Job {job['id']} failed: {e}", exc_info=True)
+        await db.finish_campaign_job(job['id'], 'failed', str(e))
+    finally:
+        heartbeat.cancel()
+
+
+async def worker_loop(bot: Bot, db: AsyncEmailBotDatabase, worker_id: str = None):
+    """
+    Основной цикл воркера
+
+    Одновременно выполняется до CAMPAIGN_WORKER_CONCURRENCY рассылок.
+    Если очередь пуста, воркер спит до ближайшей отложенной задачи
+    (job_dispatcher), новой задачи из этого процесса или
+    WORKER_POLL_INTERVAL секунд.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    slots = asyncio.Semaphore(config.CAMPAIGN_WORKER_CONCURRENCY)
+    running = set()
+    # Рассылки, запущенные этим воркером: campaign_id -> id задачи
+    running_campaigns: Dict[str, int] = {}
+
+    logger.info(f"Campaign worker {worker_id} started")
+    reloaded_at = 0.0
+
+    try:
+        while True:
+            slot_taken = False
+            try:
+                # Отложенные задачи (в т.ч. созданные другими процессами)
+                if time.monotonic() - reloaded_at > config.SCHEDULER_RELOAD_INTERVAL:
+                    dispatcher.load(await db.get_scheduled_campaign_jobs())
+                    reloaded_at = time.monotonic()
+
+                # Задачи упавших воркеров - возвращаем в очередь (рассылка продолжится)
+                for job in await db.requeue_stale_campaign_jobs(config.WORKER_STALE_TIMEOUT,
+                                                                config.WORKER_MAX_ATTEMPTS):
+                    logger.warning(f"Job {job['id']} (campaign {job['campaign_id']}): {job['status']}")
+
+                await slots.acquire()
+                slot_taken = True
+                job = await db.claim_campaign_job(worker_id)
+                if not job:
+                    slots.release()
+                    slot_taken = False
+                    await dispatcher.wait(config.WORKER_POLL_INTERVAL)
+                    continue
+
+                campaign_id = job['campaign_id']
+                if campaign_id in running_campaigns or get_campaign_control(campaign_id) is not None:
+                    # Рассылка уже выполняется в этом процессе (задачу вернули
+                    # в очередь или поставили повторно): второй запуск отправил
+                    # бы повторно письма, еще не записанные в журнал
+                    slots.release()
+                    slot_taken = False
+                    logger.warning(f"Job {job['id']}: campaign {campaign_id} is already running")
+                    if running_campaigns.get(campaign_id) != job['id']:
+                        await db.finish_campaign_job(job['id'], 'failed', 'campaign already running')
+                    continue
+
+                task = asyncio.create_task(_run_job(bot, db, job))
+                # Слот освободит завершившаяся задача
+                slot_taken = False
+                running.add(task)
+                running_campaigns[campaign_id] = job['id']
+                task.add_done_callback(running.discard)
+                task.add_done_callback(lambda _, campaign_id=campaign_id: running_campaigns.pop(campaign_id, None))
+                task.add_done_callback(lambda _: slots.release())
+
+            except Exception as e:
+                # Ошибка БД не должна останавливать воркер (в т.ч. встроенный в бот)
+                if slot_taken:
+                    slots.release()
+                logger.error(f"Campaign worker error: {e}", exc_info=True)
+                await asyncio.sleep(config.WORKER_POLL_INTERVAL)
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def main():
+    """Запуск отдельного процесса воркера"""
+    bot = Bot(token=config.TELEGRAM_BOT_TOKEN)
+    db = AsyncEmailBotDatabase()
+
+    try:
+        await worker_loop(bot, db)
+    finally:
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by user")
@@ -0,0 +1,118 @@
+"""
+Хранилище состояний диалогов (FSM aiogram) в SQLite
+
+Незаконченные мастера (настройка SMTP, создание рассылки) переживают
+перезапуск бота, а несколько процессов бота на одной БД видят одно и то
+же состояние пользователя.
+
+Последние использованные состояния держатся в LRU кэше процесса. Каждая
+запись в БД получает новую версию; чтение сверяет версию копии в кэше
+одним запросом по первичному ключу и читает данные из БД, только если
+их изменил другой процесс. Брошенные диалоги удаляются по TTL.
+"""
+
+import asyncio
+import copy
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+import email_bot_config as config
+from email_bot_database import AsyncEmailBotDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM хранилище aiogram в таблице fsm_states"""
+
+    def __init__(self, db: AsyncEmailBotDatabase = None, cache_size: int = None,
+                 ttl_seconds: int = None):
+        """
+        Args:
+            db: База данных (по умолчанию - БД бота, AsyncEmailBotDatabase())
+            cache_size: Сколько состояний держать в LRU кэше процесса
+            ttl_seconds: Через сколько секунд без изменений диалог считается брошенным
+        """
+        self.db = db or AsyncEmailBotDatabase()
+        self.cache_size = cache_size or config.FSM_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds or config.FSM_STATE_TTL_HOURS * 3600
+        # key -> (версия, состояние, данные)
+        self._cache: "OrderedDict[str, Tuple[int, Optional[str], Dict[str, Any]]]" = OrderedDict()
+        self._cleanup_task = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _remember(self, key: str, version: int, state: Optional[str], data: Dict[str, Any]):
+        self._cache[key] = (version, state, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Состояние и данные: из кэша, если версия в БД не изменилась"""
+        cached = self._cache.get(key)
+        record = await self.db.get_fsm_record(key, cached[0] if cached else None)
+
+        if record is None:
+            self._cache.pop(key, None)
+            return None, {}
+
+        if 'data' not in record:
+            # Версия совпала - копия в кэше актуальна
+            self._cache.move_to_end(key)
+            return cached[1], cached[2]
+
+        self._remember(key, record['version'], record['state'], record['data'])
+        return record['state'], record['data']
+
+    # Запись кладет в кэш строку, которую вернула БД: вторую половину записи
+    # (данные при set_state, состояние при set_data) мог изменить другой процесс
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        storage_key = self._key(key)
+
+        record = await self.db.set_fsm_state(storage_key, state)
+        self._remember(storage_key, record['version'], record['state'], record['data'])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+
+        record = await self.db.set_fsm_data(storage_key, data)
+        self._remember(storage_key, record['version'], record['state'], record['data'])
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        # Копия: изменения словаря обработчиком не должны попадать в кэш
+        return copy.deepcopy(data)
+
+    def start_cleanup(self):
+        """Запустить периодическое удаление брошенных диалогов"""
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def _cleanup_loop(self):
+        while True:
+            try:
+                removed = await self.db.cleanup_fsm_states(self.ttl_seconds)
+                if removed:
+                    logger.info(f"Removed {removed} abandoned FSM states")
+            except Exception as e:
+                logger.error(f"FSM cleanup error: {e}")
+            await asyncio.sleep(config.FSM_CLEANUP_INTERVAL)
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+        self._cache.clear()
@@ -0,0 +1,81 @@
+"""
+Пробуждение воркера рассылок к моменту запуска задач
+
+Вместо частого опроса БД воркер держит кучу (heapq) времен запуска
+отложенных задач и спит ровно до ближайшего из них. Новые задачи из
+этого процесса (бот со встроенным воркером) будят его сразу через
+notify(); задачи, созданные другими процессами, подхватываются
+периодической перезагрузкой кучи и обычным опросом очереди.
+"""
+
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+
+def parse_timestamp(value: str) -> float:
+    """Время из SQLite ('YYYY-MM-DD HH:MM:SS', UTC) в unix timestamp"""
+    return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+
+
+class JobDispatcher:
+    """Куча времен запуска отложенных задач и событие пробуждения воркера"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+        self._job_ids = set()
+        self._wake: Optional[asyncio.Event] = None
+
+    def _event(self) -> asyncio.Event:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    def add(self, job_id: int, run_at: float):
+        """Запомнить время запуска задачи (unix timestamp)"""
+        if job_id in self._job_ids:
+            return
+        self._job_ids.add(job_id)
+        heapq.heappush(self._heap, (run_at, job_id))
+
+    def load(self, jobs: List[Dict]):
+        """Задачи из БД (get_scheduled_campaign_jobs)"""
+        for job in jobs:
+            self.add(job['id'], parse_timestamp(job['run_at']))
+
+    def notify(self, job_id: int = None, run_at: datetime = None):
+        """Новая задача: немедленная - будит воркер, отложенная - попадает в кучу"""
+        if job_id is not None and run_at is not None:
+            self.add(job_id, run_at.replace(tzinfo=run_at.tzinfo or timezone.utc).timestamp())
+        self._event().set()
+
+    async def wait(self, timeout: float):
+        """
+        Ждать, пока наступит время ближайшей задачи, придет notify()
+        или истечет timeout (опрос задач других процессов)
+        """
+        now = time.time()
+        due = False
+        while self._heap and self._heap[0][0] <= now:
+            _, job_id = heapq.heappop(self._heap)
+            self._job_ids.discard(job_id)
+            due = True
+        if due:
+            return
+
+        delay = timeout
+        if self._heap:
+            delay = min(delay, self._heap[0][0] - now)
+
+        event = self._event()
+        try:
+            await asyncio.wait_for(event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+
+# Диспетчер процесса: общий для обработчиков бота и встроенного воркера
+dispatcher = JobDispatcher()
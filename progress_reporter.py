@@ -0,0 +1,136 @@
+"""
+Прогресс рассылки в Telegram: одно сообщение, редактируемое по таймеру
+
+Отправка писем не ждет Telegram: update() только отмечает, что данные
+изменились, а сообщение редактирует отдельная задача не чаще раза в
+CAMPAIGN_PROGRESS_INTERVAL секунд. Все изменения за интервал
+схлопываются в одно редактирование с последними значениями.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+import email_bot_config as config
+
+logger = logging.getLogger(__name__)
+
+# Ближайший момент, когда в чат можно писать (общий для всех отчетов процесса)
+_chat_next_send: Dict[int, float] = {}
+
+
+async def wait_chat_slot(chat_id: int):
+    """Не чаще TELEGRAM_CHAT_MIN_INTERVAL секунд между запросами в один чат"""
+    now = time.monotonic()
+    slot = max(now, _chat_next_send.get(chat_id, 0.0))
+    _chat_next_send[chat_id] = slot + config.TELEGRAM_CHAT_MIN_INTERVAL
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+
+def _delay_chat(chat_id: int, seconds: float):
+    """Telegram попросил подождать (flood control) - откладываем все запросы в чат"""
+    _chat_next_send[chat_id] = max(_chat_next_send.get(chat_id, 0.0), time.monotonic() + seconds)
+
+
+class ProgressReporter:
+    """
+    Сообщение с прогрессом, обновляемое в фоне
+
+        reporter = ProgressReporter(bot, chat_id, render=lambda: f"Отправлено: {sent}")
+        await reporter.start()
+        ...
+        reporter.update()          # из цикла отправки, без ожидания
+        ...
+        await reporter.finish()    # последнее состояние
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, render: Callable[[], str],
+                 interval: float = None, reply_markup=None):
+        """
+        Args:
+            render: Текст сообщения по текущему состоянию (вызывается при редактировании)
+            interval: Минимальный интервал между редактированиями, секунды
+            reply_markup: Inline клавиатура под сообщением
+        """
+        self.bot = bot
+        self.chat_id = chat_id
+        self.render = render
+        self.interval = interval or config.CAMPAIGN_PROGRESS_INTERVAL
+        self.reply_markup = reply_markup
+        self.message_id: Optional[int] = None
+        self._last_text = None
+        self._changed = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        """Отправить сообщение и запустить фоновое обновление"""
+        await self._publish(self.render())
+        self._task = asyncio.create_task(self._run())
+
+    def update(self):
+        """Состояние изменилось (не блокирует)"""
+        self._changed.set()
+
+    async def finish(self, reply_markup=None):
+        """Остановить обновление и показать последнее состояние"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        self.reply_markup = reply_markup
+        await self._publish(self.render(), force=True)
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            await self._publish(self.render())
+            # Изменения за интервал схлопываются в одно редактирование
+            await asyncio.sleep(self.interval)
+
+    async def _publish(self, text: str, force: bool = False):
+        """Отправка или редактирование сообщения; ошибки Telegram не прерывают рассылку"""
+        if text == self._last_text and not force:
+            return
+
+        for _ in range(3):
+            await wait_chat_slot(self.chat_id)
+            try:
+                if self.message_id is None:
+                    message = await self.bot.send_message(self.chat_id, text, reply_markup=self.reply_markup)
+                    self.message_id = message.message_id
+                else:
+                    await self.bot.edit_message_text(
+                        text, chat_id=self.chat_id, message_id=self.message_id,
+                        reply_markup=self.reply_markup
+                    )
+                self._last_text = text
+                return
+
+            except TelegramRetryAfter as e:
+                logger.warning(f"Progress flood control in chat {self.chat_id}: retry after {e.retry_after}s")
+                _delay_chat(self.chat_id, e.retry_after)
+
+            except TelegramBadRequest as e:
+                if 'message is not modified' in e.message:
+                    self._last_text = text
+                    return
+                if 'message to edit not found' in e.message:
+                    # Сообщение удалили - продолжаем в новом
+                    self.message_id = None
+                    continue
+                logger.warning(f"Progress update failed: {e}")
+                return
+
+            except Exception as e:
+                logger.warning(f"Progress update failed: {e}")
+                return
@@ -0,0 +1,233 @@
+"""
+Ограничение скорости отправки (token bucket)
+Общие лимиты на SMTP аккаунт: в секунду, минуту, час и сутки
+
+Суточный лимит считается в БД (send_usage), если лимитеру передана БД:
+он общий для всех процессов, отправляющих с аккаунта, и не сбрасывается
+при перезапуске. Без БД суточный лимит считается в памяти процесса.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from email_bot_database import AsyncEmailBotDatabase
+
+logger = logging.getLogger(__name__)
+
+# Длительность окна лимита в секундах
+LIMIT_PERIODS = {
+    'per_second': 1,
+    'per_minute': 60,
+    'per_hour': 3600,
+    'per_day': 86400,
+}
+
+# Долгое ожидание разбивается на шаги: новые лимиты и счетчики
+# других процессов учитываются не позже чем через N секунд
+LIMIT_RECHECK_INTERVAL = 60
+
+class TokenBucket:
+    """Корзина токенов: budget токенов за period секунд с равномерным пополнением"""
+
+    def __init__(self, budget: float, period: float):
+        self.tokens = None
+        self.updated_at = time.monotonic()
+        self.set_budget(budget, period)
+
+    def set_budget(self, budget: float, period: float):
+        """Новый лимит: уже израсходованные токены остаются израсходованными"""
+        if self.tokens is not None:
+            self._refill(time.monotonic())
+        self.rate = budget / period
+        # Емкость не меньше одного токена, иначе дробный лимит (0.5/сек) не сработает
+        self.capacity = max(float(budget), 1.0)
+        self.tokens = self.capacity if self.tokens is None else min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд ждать до появления одного токена"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def give_back(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class DailyCounter:
+    """Суточный лимит SMTP аккаунта в БД (сутки - календарные, по UTC)"""
+
+    def __init__(self, account_key: str, limit: float, db: AsyncEmailBotDatabase):
+        self.account_key = account_key
+        self.limit = int(limit)
+        self.db = db
+        # Последнее известное значение счетчика в БД
+        self.day = None
+        self.sent = 0
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    def wait_time(self) -> float:
+        """Сколько секунд до новых суток, если лимит исчерпан (по последнему значению из БД)"""
+        if self.day != self._today() or self.sent < self.limit:
+            return 0.0
+        now = datetime.now(timezone.utc)
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (midnight - now).total_seconds()
+
+    async def take(self) -> bool:
+        """Учесть одно письмо; False - лимит за сутки исчерпан (в т.ч. другими процессами)"""
+        day = self._today()
+        sent = await self.db.take_daily_send(self.account_key, day, self.limit)
+        self.day = day
+        self.sent = self.limit if sent is None else sent
+        return sent is not None
+
+    async def give_back(self):
+        """Вернуть письмо, учтенное take(), но не отправленное"""
+        if self.day is not None:
+            await self.db.return_daily_send(self.account_key, self.day)
+            self.sent = max(self.sent - 1, 0)
+
+
+class RateLimiter:
+    """
+    Набор token bucket лимитов для одного SMTP аккаунта
+
+    acquire() ждет ровно столько, сколько нужно, чтобы уложиться во все
+    лимиты сразу. Ожидающие обслуживаются по очереди (FIFO). Если заданы
+    account_key и db, суточный лимит считается в БД (DailyCounter).
+    """
+
+    def __init__(self, limits: Dict[str, float], account_key: str = None,
+                 db: AsyncEmailBotDatabase = None):
+        self.account_key = account_key
+        self.db = db
+        self.limits = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._daily: Optional[DailyCounter] = None
+        self._lock = asyncio.Lock()
+        self.update_limits(limits)
+
+    def update_limits(self, limits: Dict[str, float]):
+        """Новые лимиты: расход по уже действующим лимитам сохраняется"""
+        limits = dict(limits)
+        active = {name: budget for name, budget in limits.items() if name in LIMIT_PERIODS and budget}
+
+        daily = active.pop('per_day', None) if self.account_key and self.db else None
+        if daily is None:
+            self._daily = None
+        elif self._daily is None or self._daily.db is not self.db:
+            self._daily = DailyCounter(self.account_key, daily, self.db)
+        else:
+            self._daily.limit = int(daily)
+
+        for name in list(self._buckets):
+            if name not in active:
+                del self._buckets[name]
+        for name, budget in active.items():
+            if name in self._buckets:
+                self._buckets[name].set_budget(budget, LIMIT_PERIODS[name])
+            else:
+                self._buckets[name] = TokenBucket(budget, LIMIT_PERIODS[name])
+
+        self.limits = limits
+
+    def wait_time(self) -> float:
+        """Сколько секунд ждать следующего разрешения (без его расхода)"""
+        now = time.monotonic()
+        wait = max((bucket.wait_time(now) for bucket in self._buckets.values()), default=0.0)
+        if self._daily is not None:
+            wait = max(wait, self._daily.wait_time())
+        return wait
+
+    async def acquire(self, max_wait: float = None) -> bool:
+        """
+        Дождаться разрешения на отправку одного письма
+
+        Args:
+            max_wait: Не ждать дольше N секунд: если разрешения придется
+                      ждать дольше, сразу вернуть False (ничего не расходуя)
+
+        Returns:
+            True - письмо можно отправлять
+        """
+        if not self._buckets and self._daily is None:
+            return True
+
+        async with self._lock:
+            while True:
+                wait = self.wait_time()
+                if wait <= 0:
+                    # Суточный счетчик проверяется последним: в БД учитываются только отправляемые письма
+                    if self._daily is not None and not await self._daily.take():
+                        continue
+                    for bucket in self._buckets.values():
+                        bucket.consume()
+                    return True
+                if max_wait is not None and wait > max_wait:
+                    return False
+                await asyncio.sleep(min(wait, LIMIT_RECHECK_INTERVAL))
+
+    async def release(self):
+        """
+        Вернуть разрешение, полученное acquire(), если письмо так и не ушло
+        (отмена рассылки, отключение аккаунта): иначе неотправленные письма
+        расходуют суточную квоту аккаунта
+        """
+        for bucket in self._buckets.values():
+            bucket.give_back()
+        if self._daily is not None:
+            await self._daily.give_back()
+
+
+def daily_budget(limits: Dict[str, float]) -> float:
+    """Писем в сутки по самому строгому из лимитов (inf - без ограничений)"""
+    return min(
+        (budget * LIMIT_PERIODS['per_day'] / LIMIT_PERIODS[name]
+         for name, budget in limits.items() if name in LIMIT_PERIODS and budget),
+        default=float('inf')
+    )
+
+
+# Лимитеры, общие для всех рассылок с одного SMTP аккаунта
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(account_key: str, limits: Dict[str, float],
+                     db: AsyncEmailBotDatabase = None) -> RateLimiter:
+    """
+    Общий лимитер для SMTP аккаунта
+
+    Все рассылки с одного аккаунта в процессе получают один и тот же
+    объект, а суточный лимит считается в БД db, поэтому параллельные
+    рассылки (и процессы воркеров) вместе не превысят суточный лимит
+    провайдера. Если лимиты аккаунта изменились, они применяются к
+    тому же лимитеру без сброса накопленного расхода.
+
+    Args:
+        db: БД суточных счетчиков (та же, с которой работает рассылка);
+            без нее суточный лимит считается только в этом процессе
+    """
+    limiter = _limiters.get(account_key)
+    if limiter is None:
+        limiter = RateLimiter(limits, account_key, db)
+        _limiters[account_key] = limiter
+        logger.info(f"Rate limiter for {account_key}: {limits}")
+    elif limiter.limits != limits or (db is not None and limiter.db is not db):
+        limiter.db = db or limiter.db
+        limiter.update_limits(limits)
+        logger.info(f"Rate limits for {account_key} updated: {limits}")
+    return limiter
@@ -0,0 +1,51 @@
+"""
+Общие фикстуры тестов
+"""
+
+import asyncio
+import shutil
+import ssl
+import subprocess
+
+import pytest
+
+import email_sender
+import rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limiters(monkeypatch):
+    """Лимитеры аккаунтов - свои в каждом тесте (общий реестр процесса и свой event loop)"""
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+
+
+@pytest.fixture
+def redirect_smtp(monkeypatch):
+    """Подключения клиента к любому SMTP порту идут на порт заглушки"""
+    target = {}
+    open_connection = asyncio.open_connection
+
+    def connect(host, port, **kwargs):
+        return open_connection('127.0.0.1', target['port'], **kwargs)
+
+    monkeypatch.setattr(email_sender.asyncio, 'open_connection', connect)
+    return target
+
+
+@pytest.fixture(scope='module')
+def tls_contexts(tmp_path_factory):
+    """Самоподписанный сертификат localhost: контексты сервера и клиента"""
+    if shutil.which('openssl') is None:
+        pytest.skip("openssl не найден")
+    path = tmp_path_factory.mktemp('tls')
+    cert, key = path / 'cert.pem', path / 'key.pem'
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost',
+         '-keyout', str(key), '-out', str(cert)],
+        check=True, capture_output=True
+    )
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert, key)
+    client_context = ssl.create_default_context(cafile=str(cert))
+    return server_context, client_context
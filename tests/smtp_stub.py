@@ -0,0 +1,164 @@
+"""
+SMTP сервер-заглушка для тестов отправки (asyncio, без внешних зависимостей)
+"""
+
+import asyncio
+import base64
+import ssl
+
+USER = 'sender@example.com'
+PASSWORD = 'secret'
+
+
+class StubSMTPServer:
+    """
+    SMTP сервер-заглушка: EHLO, STARTTLS, AUTH PLAIN/LOGIN, MAIL/RCPT/DATA
+
+    rcpt_replies - ответы на RCPT TO по адресу (по одному на попытку),
+    disconnect_after - закрыть соединение после N писем на соединении,
+    data_delay - задержка ответа на конец DATA (секунды),
+    passwords - учетные записи (логин -> пароль)
+    """
+
+    def __init__(self, tls_context: ssl.SSLContext = None, auth_methods: str = 'PLAIN LOGIN',
+                 disconnect_after: int = None, data_delay: float = 0):
+        self.tls_context = tls_context
+        self.auth_methods = auth_methods
+        self.disconnect_after = disconnect_after
+        self.data_delay = data_delay
+        self.passwords = {USER: PASSWORD}
+        self.rcpt_replies = {}
+        self.messages = []
+        self.connections = 0
+        # Одновременно открытые соединения: сейчас и максимум
+        self.active = 0
+        self.max_active = 0
+        self.tls_used = False
+        self.logins = []
+        self.port = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def recipients(self):
+        return [rcpt for _, rcpts, _ in self.messages for rcpt in rcpts]
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        tls_active = False
+        sent_on_connection = 0
+        mail_from, rcpts = None, []
+
+        def reply(line):
+            writer.write(line.encode() + b'\r\n')
+
+        reply('220 stub ESMTP')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                command = line.decode().strip()
+                verb = command.split(' ', 1)[0].upper()
+
+                if verb in ('EHLO', 'HELO'):
+                    features = ['stub', f'AUTH {self.auth_methods}', '8BITMIME']
+                    if self.tls_context is not None and not tls_active:
+                        features.append('STARTTLS')
+                    for feature in features[:-1]:
+                        reply(f'250-{feature}')
+                    reply(f'250 {features[-1]}')
+
+                elif verb == 'STARTTLS':
+                    reply('220 Ready to start TLS')
+                    await writer.drain()
+                    await writer.start_tls(self.tls_context)
+                    tls_active = self.tls_used = True
+
+                elif verb == 'AUTH':
+                    parts = command.split()
+                    if parts[1].upper() == 'PLAIN':
+                        _, user, password = base64.b64decode(parts[2]).decode().split('\0')
+                    else:
+                        reply('334 VXNlcm5hbWU6')
+                        await writer.drain()
+                        user = base64.b64decode(await reader.readline()).decode()
+                        reply('334 UGFzc3dvcmQ6')
+                        await writer.drain()
+                        password = base64.b64decode(await reader.readline()).decode()
+                    if user in self.passwords and self.passwords[user] == password:
+                        self.logins.append((parts[1].upper(), user))
+                        reply('235 Authentication successful')
+                    else:
+                        reply('535 5.7.8 Authentication credentials invalid')
+
+                elif verb == 'MAIL':
+                    mail_from, rcpts = command[10:].strip('<>'), []
+                    reply('250 OK')
+
+                elif verb == 'RCPT':
+                    rcpt = command[8:].strip('<>')
+                    replies = self.rcpt_replies.get(rcpt)
+                    if replies:
+                        reply(replies.pop(0))
+                    else:
+                        rcpts.append(rcpt)
+                        reply('250 OK')
+
+                elif verb == 'DATA':
+                    reply('354 End data with <CR><LF>.<CR><LF>')
+                    await writer.drain()
+                    data = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line == b'.\r\n':
+                            break
+                        # Обратное экранирование точек (RFC 5321, 4.5.2)
+                        data.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                    if self.data_delay:
+                        await asyncio.sleep(self.data_delay)
+                    self.messages.append((mail_from, rcpts, b''.join(data)))
+                    sent_on_connection += 1
+                    reply('250 OK queued')
+                    if self.disconnect_after and sent_on_connection >= self.disconnect_after:
+                        await writer.drain()
+                        return
+
+                elif verb == 'RSET':
+                    mail_from, rcpts = None, []
+                    reply('250 OK')
+
+                elif verb == 'QUIT':
+                    reply('221 Bye')
+                    await writer.drain()
+                    return
+
+                else:
+                    reply('502 Command not implemented')
+                await writer.drain()
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+
+
+def run_with_server(server: StubSMTPServer, redirect: dict, coro_factory):
+    """Запустить заглушку, выполнить корутину и остановить сервер"""
+    async def main():
+        await server.start()
+        redirect['port'] = server.port
+        try:
+            return await coro_factory()
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
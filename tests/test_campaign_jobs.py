@@ -0,0 +1,174 @@
+"""
+Тесты очереди рассылок campaign_jobs: захват задач воркерами, возврат
+задач упавших воркеров и отложенный запуск
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import email_bot_config as config
+from email_bot_database import EmailBotDatabase
+
+TELEGRAM_ID = 1
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = EmailBotDatabase(str(tmp_path / 'email_bot.db'))
+    db.register_user(TELEGRAM_ID)
+    return db
+
+
+def create_campaign(db: EmailBotDatabase, scheduled_at: datetime = None) -> str:
+    smtp_config_id = db.add_smtp_config(TELEGRAM_ID, 'smtp', 'localhost', 25, 'user', 'secret', 'from@example.com')
+    template_id = db.add_template(TELEGRAM_ID, 'template', 'Subject', 'Body')
+    list_id = db.add_contact_list(TELEGRAM_ID, 'list', ['a@example.com'])
+    return db.create_campaign(TELEGRAM_ID, 'campaign', smtp_config_id, template_id, list_id,
+                              scheduled_at=scheduled_at)
+
+
+def make_stale(db: EmailBotDatabase, job_id: int):
+    """Воркер задачи давно не отправлял heartbeat"""
+    with db._connect() as conn:
+        conn.execute(
+            "UPDATE campaign_jobs SET heartbeat_at = datetime('now', '-1 hour') WHERE id = ?",
+            (job_id,)
+        )
+
+
+def test_jobs_are_claimed_in_order(db):
+    campaign_id = create_campaign(db)
+    first = db.enqueue_campaign_job(campaign_id, TELEGRAM_ID)
+    second = db.enqueue_campaign_job(campaign_id, TELEGRAM_ID)
+
+    job = db.claim_campaign_job('worker-1')
+
+    assert (job['id'], job['status'], job['worker_id'], job['attempts']) == (first, 'running', 'worker-1', 1)
+    assert db.claim_campaign_job('worker-2')['id'] == second
+    assert db.claim_campaign_job('worker-3') is None
+
+
+def test_concurrent_workers_never_claim_the_same_job(tmp_path):
+    path = str(tmp_path / 'email_bot.db')
+    db = EmailBotDatabase(path)
+    db.register_user(TELEGRAM_ID)
+    campaign_id = create_campaign(db)
+    job_ids = {db.enqueue_campaign_job(campaign_id, TELEGRAM_ID) for _ in range(40)}
+    claimed = []
+    barrier = threading.Barrier(8)
+
+    def worker(n):
+        # Отдельный объект БД на поток - как отдельные процессы воркеров
+        worker_db = EmailBotDatabase(path)
+        barrier.wait()
+        while True:
+            job = worker_db.claim_campaign_job(f'worker-{n}')
+            if job is None:
+                return
+            claimed.append(job['id'])
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_stale_job_is_requeued_and_resumed(db):
+    campaign_id = create_campaign(db)
+    job_id = db.enqueue_campaign_job(campaign_id, TELEGRAM_ID)
+    db.claim_campaign_job('worker-1')
+
+    # Живой воркер (свежий heartbeat) задачу не теряет
+    assert db.requeue_stale_campaign_jobs(config.WORKER_STALE_TIMEOUT, max_attempts=3) == []
+
+    make_stale(db, job_id)
+    jobs = db.requeue_stale_campaign_jobs(config.WORKER_STALE_TIMEOUT, max_attempts=3)
+
+    assert [(job['id'], job['status']) for job in jobs] == [(job_id, 'queued')]
+    job = db.claim_campaign_job('worker-2')
+    assert (job['id'], job['worker_id'], job['attempts']) == (job_id, 'worker-2', 2)
+
+
+def test_heartbeat_keeps_job_running(db):
+    campaign_id = create_campaign(db)
+    job_id = db.enqueue_campaign_job(campaign_id, TELEGRAM_ID)
+    db.claim_campaign_job('worker-1')
+    make_stale(db, job_id)
+
+    db.heartbeat_campaign_job(job_id)
+
+    assert db.requeue_stale_campaign_jobs(config.WORKER_STALE_TIMEOUT, max_attempts=3) == []
+
+
+def test_job_is_interrupted_after_max_attempts(db):
+    campaign_id = create_campaign(db)
+    job_id = db.enqueue_campaign_job(campaign_id, TELEGRAM_ID)
+
+    for attempt in range(2):
+        assert db.claim_campaign_job('worker')['attempts'] == attempt + 1
+        make_stale(db, job_id)
+        jobs = db.requeue_stale_campaign_jobs(config.WORKER_STALE_TIMEOUT, max_attempts=2)
+
+    # Вторая попытка тоже оборвалась - автоматически больше не продолжаем
+    assert [(job['id'], job['status']) for job in jobs] == [(job_id, 'interrupted')]
+    assert db.claim_campaign_job('worker') is None
+    assert db.get_campaign(campaign_id)['status'] == 'interrupted'
+    assert not db.has_active_campaign_job(campaign_id)
+
+
+def test_scheduled_job_is_not_claimed_before_run_at(db):
+    run_at = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(hours=1)
+    campaign_id = create_campaign(db, scheduled_at=run_at)
+    job_id, _ = db.schedule_campaign_job(campaign_id, TELEGRAM_ID, run_at)
+
+    assert db.claim_campaign_job('worker') is None
+    assert [job['id'] for job in db.get_scheduled_campaign_jobs()] == [job_id]
+    assert db.has_active_campaign_job(campaign_id)
+
+    with db._connect() as conn:
+        conn.execute("UPDATE campaign_jobs SET run_at = datetime('now', '-1 second') WHERE id = ?", (job_id,))
+
+    assert db.get_scheduled_campaign_jobs() == []
+    assert db.claim_campaign_job('worker')['id'] == job_id
+
+
+def test_starts_at_the_same_time_are_spread(db, monkeypatch):
+    monkeypatch.setattr(config, 'CAMPAIGN_START_SPREAD', 60)
+    monkeypatch.setattr(config, 'CAMPAIGN_START_STEP', 15)
+    run_at = datetime(2030, 1, 1, 6, 0, tzinfo=timezone.utc)
+    campaign_id = create_campaign(db, scheduled_at=run_at)
+
+    offsets = [
+        (db.schedule_campaign_job(campaign_id, TELEGRAM_ID, run_at)[1] - run_at).total_seconds()
+        for _ in range(5)
+    ]
+
+    # Каждый следующий старт - в своем шаге окна, после окна - снова с начала
+    assert [int(offset // 15) for offset in offsets] == [0, 1, 2, 3, 0]
+    stored = [job['run_at'] for job in db.get_scheduled_campaign_jobs()]
+    assert sorted(stored) == sorted(
+        (run_at + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S') for offset in offsets
+    )
+    # У рассылки - время последней постановки в очередь
+    assert db.get_campaign(campaign_id)['scheduled_at'] == (
+        run_at + timedelta(seconds=offsets[-1])
+    ).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def test_cancel_scheduled_campaign(db):
+    run_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    campaign_id = create_campaign(db, scheduled_at=run_at)
+    db.schedule_campaign_job(campaign_id, TELEGRAM_ID, run_at)
+
+    assert db.get_campaign(campaign_id)['status'] == 'scheduled'
+    assert db.cancel_scheduled_campaign(campaign_id)
+
+    assert db.get_campaign(campaign_id)['status'] == 'cancelled'
+    assert db.get_scheduled_campaign_jobs() == []
+    # Уже отмененную (или запущенную) рассылку отменить нельзя
+    assert not db.cancel_scheduled_campaign(campaign_id)
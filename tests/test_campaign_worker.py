@@ -0,0 +1,88 @@
+"""
+Тесты воркера рассылок: статус задачи в очереди по итогу рассылки
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import campaign_runner
+import email_bot_config as config
+import email_worker
+from email_bot_database import AsyncEmailBotDatabase, EmailBotDatabase
+from smtp_stub import USER, StubSMTPServer, run_with_server
+
+TELEGRAM_ID = 1
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """БД рассылки во временном файле, без пауз между сообщениями в чат"""
+    db = AsyncEmailBotDatabase(EmailBotDatabase(str(tmp_path / 'email_bot.db')))
+    monkeypatch.setattr(campaign_runner, 'db', db)
+    monkeypatch.setattr(config, 'TELEGRAM_CHAT_MIN_INTERVAL', 0)
+    return db
+
+
+class FakeBot:
+    """Бот без Telegram API: запоминает тексты отправленных сообщений"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append(text)
+        return SimpleNamespace(message_id=len(self.messages))
+
+    async def edit_message_text(self, text, **kwargs):
+        return None
+
+
+def create_campaign(db: EmailBotDatabase, password: str) -> str:
+    """Рассылка на 3 адреса через SMTP аккаунт с заданным паролем"""
+    db.register_user(TELEGRAM_ID)
+    smtp_config_id = db.add_smtp_config(TELEGRAM_ID, 'stub', 'localhost', 25, USER, password, USER)
+    db.set_smtp_rate_limits(smtp_config_id, {'per_second': 1000})
+    template_id = db.add_template(TELEGRAM_ID, 'template', 'Subject', 'Body')
+    list_id = db.add_contact_list(TELEGRAM_ID, 'list', ['a@example.com', 'b@example.com', 'c@example.com'])
+    return db.create_campaign(TELEGRAM_ID, 'campaign', smtp_config_id, template_id, list_id)
+
+
+def test_failed_campaign_marks_job_failed(db, redirect_smtp):
+    campaign_id = create_campaign(db.db, 'wrong password')
+    job_id = db.db.enqueue_campaign_job(campaign_id, TELEGRAM_ID)
+    bot = FakeBot()
+
+    async def scenario():
+        job = await db.claim_campaign_job('test-worker')
+        await email_worker._run_job(bot, db, job)
+
+    run_with_server(StubSMTPServer(), redirect_smtp, scenario)
+
+    with db.db._connect() as conn:
+        job = dict(conn.execute('SELECT * FROM campaign_jobs WHERE id = ?', (job_id,)).fetchone())
+    assert job['status'] == 'failed'
+    assert 'SMTP аккаунт недоступен' in job['error_message']
+    assert db.db.get_campaign(campaign_id)['status'] == 'failed'
+    # Получатели не записаны ошибками - рассылку можно продолжить
+    assert db.db.get_delivery_counts(campaign_id) == {'sent': 0, 'failed': 0}
+    assert any('ОШИБКА РАССЫЛКИ' in text for text in bot.messages)
+
+
+def test_completed_campaign_marks_job_done(db, redirect_smtp):
+    campaign_id = create_campaign(db.db, 'secret')
+    job_id = db.db.enqueue_campaign_job(campaign_id, TELEGRAM_ID)
+    server = StubSMTPServer()
+
+    async def scenario():
+        job = await db.claim_campaign_job('test-worker')
+        await email_worker._run_job(FakeBot(), db, job)
+
+    run_with_server(server, redirect_smtp, scenario)
+
+    with db.db._connect() as conn:
+        status = conn.execute('SELECT status FROM campaign_jobs WHERE id = ?', (job_id,)).fetchone()[0]
+    assert status == 'done'
+    assert db.db.get_campaign(campaign_id)['status'] == 'completed'
+    assert sorted(server.recipients()) == ['a@example.com', 'b@example.com', 'c@example.com']
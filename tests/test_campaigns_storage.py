@@ -0,0 +1,81 @@
+"""
+Тесты поиска рассылок: по первичному ключу с проверкой владельца
+и списки пользователя по индексу (user_telegram_id, created_at)
+"""
+
+import pytest
+
+from email_bot_database import EmailBotDatabase
+
+TELEGRAM_ID = 1
+OTHER_ID = 2
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = EmailBotDatabase(str(tmp_path / 'email_bot.db'))
+    db.register_user(TELEGRAM_ID)
+    db.register_user(OTHER_ID)
+    return db
+
+
+def create_campaigns(db: EmailBotDatabase, telegram_id: int, count: int) -> list:
+    smtp_config_id = db.add_smtp_config(telegram_id, 'smtp', 'localhost', 25, 'user', 'secret', 'from@example.com')
+    template_id = db.add_template(telegram_id, 'template', 'Subject', 'Body')
+    list_id = db.add_contact_list(telegram_id, 'list', ['a@example.com', 'b@example.com'])
+    return [
+        db.create_campaign(telegram_id, f'campaign {i}', smtp_config_id, template_id, list_id)
+        for i in range(count)
+    ]
+
+
+def test_get_campaign_by_id(db):
+    campaign_id, = create_campaigns(db, TELEGRAM_ID, 1)
+
+    campaign = db.get_campaign(campaign_id)
+
+    assert (campaign['id'], campaign['name'], campaign['status']) == (campaign_id, 'campaign 0', 'pending')
+    assert campaign['total_emails'] == 2
+    assert db.get_campaign('no-such-campaign') is None
+
+
+def test_get_campaign_checks_owner(db):
+    campaign_id, = create_campaigns(db, TELEGRAM_ID, 1)
+
+    assert db.get_campaign(campaign_id, TELEGRAM_ID)['id'] == campaign_id
+    # Чужую рассылку по ID (например, из callback_data) не получить
+    assert db.get_campaign(campaign_id, OTHER_ID) is None
+
+
+def test_old_campaign_is_found_outside_latest_list(db):
+    campaign_ids = create_campaigns(db, TELEGRAM_ID, 25)
+
+    # В списке последних 20 самой первой рассылки нет, по ID она находится
+    assert campaign_ids[0] not in [c['id'] for c in db.get_campaigns(TELEGRAM_ID)]
+    assert db.get_campaign(campaign_ids[0], TELEGRAM_ID)['id'] == campaign_ids[0]
+
+
+@pytest.mark.parametrize('query', [
+    'SELECT * FROM campaigns WHERE user_telegram_id = ? ORDER BY created_at DESC LIMIT 20',
+    'SELECT * FROM smtp_configs WHERE user_telegram_id = ? ORDER BY created_at DESC',
+    'SELECT * FROM email_templates WHERE user_telegram_id = ? ORDER BY created_at DESC',
+    'SELECT id, name, total_count, created_at FROM contact_lists WHERE user_telegram_id = ? ORDER BY created_at DESC',
+])
+def test_user_lists_are_read_by_index_without_sorting(db, query):
+    with db._connect() as conn:
+        plan = ' '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', (TELEGRAM_ID,)))
+
+    assert '_user_created' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_campaign_lookup_uses_primary_key(db):
+    with db._connect() as conn:
+        plan = ' '.join(
+            row[3] for row in conn.execute(
+                'EXPLAIN QUERY PLAN SELECT * FROM campaigns WHERE id = ? AND user_telegram_id = ?',
+                ('id', TELEGRAM_ID)
+            )
+        )
+
+    assert 'sqlite_autoindex_campaigns_1' in plan
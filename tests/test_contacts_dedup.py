@@ -0,0 +1,76 @@
+"""
+Тесты дедупликации контактов и множества дайджестов DigestSet
+"""
+
+from contacts_dedup import DigestSet, Deduplicator, dedup_emails, email_digest, normalize_for_dedup
+
+
+def test_colliding_digests_are_kept_apart():
+    digests = DigestSet(capacity=4)
+    mask = len(digests._table) - 1
+    # Одинаковые младшие биты - одна стартовая ячейка, цепочка пробирования
+    colliding = [(i * (mask + 1)) | 3 for i in range(1, 4)]
+
+    assert all(digests.add_digest(digest) for digest in colliding)
+    assert all(digests.contains_digest(digest) for digest in colliding)
+    assert not digests.contains_digest((4 * (mask + 1)) | 3)
+    assert not digests.add_digest(colliding[1])
+    assert len(digests) == 3
+
+
+def test_table_grows_and_keeps_all_digests():
+    digests = DigestSet(capacity=1)
+    initial_size = len(digests._table)
+    keys = [f'user{i}@example.com' for i in range(5000)]
+
+    assert all(digests.add(key) for key in keys)
+
+    assert len(digests) == 5000
+    assert len(digests._table) > initial_size
+    # Заполнение не выше 50%, размер - степень двойки
+    assert len(digests) * 2 <= len(digests._table)
+    assert len(digests._table) & (len(digests._table) - 1) == 0
+    assert all(key in digests for key in keys)
+    assert 'other@example.com' not in digests
+
+
+def test_colliding_digests_survive_resize():
+    digests = DigestSet(capacity=2)
+    mask = len(digests._table) - 1
+    colliding = [(i * (mask + 1)) | 1 for i in range(1, 50)]
+    for digest in colliding:
+        digests.add_digest(digest)
+
+    assert len(digests) == len(colliding)
+    assert all(digests.contains_digest(digest) for digest in colliding)
+
+
+def test_zero_digest_is_reserved():
+    # 0 - пустая ячейка таблицы, дайджест ключа никогда не равен 0
+    assert all(email_digest(f'user{i}@example.com') != 0 for i in range(1000))
+
+
+def test_dedup_keeps_first_occurrence_in_order():
+    emails = ['b@example.com', 'A@example.com', 'b@example.com', ' a@example.com', 'c@example.com']
+    assert dedup_emails(emails) == ['b@example.com', 'A@example.com', 'c@example.com']
+
+
+def test_gmail_canonical_variants():
+    assert normalize_for_dedup('I.van+news@GoogleMail.com', gmail_canonical=True) == 'ivan@gmail.com'
+    assert normalize_for_dedup('i.van+news@example.com', gmail_canonical=True) == 'i.van+news@example.com'
+    emails = ['ivan@gmail.com', 'i.v.a.n+promo@gmail.com']
+    assert dedup_emails(emails) == emails
+    assert dedup_emails(emails, gmail_canonical=True) == ['ivan@gmail.com']
+
+
+def test_existing_contacts_are_counted_and_optionally_excluded():
+    existing = DigestSet()
+    existing.add('old@example.com')
+    contacts = [{'email': 'new@example.com', 'name': 'Новый'}, {'email': 'OLD@example.com'}, 'new@example.com']
+
+    counting = Deduplicator(existing=existing)
+    assert [c['email'] for c in counting.filter(contacts)] == ['new@example.com', 'OLD@example.com']
+    assert (counting.duplicates, counting.overlap) == (1, 1)
+
+    excluding = Deduplicator(existing=existing, exclude_existing=True)
+    assert list(excluding.filter(contacts)) == [{'email': 'new@example.com', 'name': 'Новый'}]
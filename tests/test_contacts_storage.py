@@ -0,0 +1,60 @@
+"""
+Тесты хранения контактов: таблица contacts и перенос из JSON колонки
+"""
+
+import json
+import sqlite3
+
+from email_bot_database import EmailBotDatabase
+
+
+def create_legacy_db(path: str, contacts: list) -> int:
+    """БД со схемой до таблицы contacts: контакты - JSON в contact_lists.contacts"""
+    with sqlite3.connect(path) as conn:
+        conn.execute('''
+            CREATE TABLE users (
+                telegram_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                subscription_until TIMESTAMP,
+                is_active BOOLEAN DEFAULT 1,
+                is_admin BOOLEAN DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE contact_lists (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_telegram_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                contacts TEXT NOT NULL,
+                total_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_telegram_id) REFERENCES users(telegram_id)
+            )
+        ''')
+        conn.execute('INSERT INTO users (telegram_id) VALUES (1)')
+        cursor = conn.execute(
+            'INSERT INTO contact_lists (user_telegram_id, name, contacts, total_count) VALUES (?, ?, ?, ?)',
+            (1, 'legacy', json.dumps(contacts), len(contacts))
+        )
+        return cursor.lastrowid
+
+
+def test_legacy_contact_blob_is_migrated(tmp_path):
+    path = str(tmp_path / 'email_bot.db')
+    emails = ['a@example.com', 'b@example.com', 'c@example.com']
+    list_id = create_legacy_db(path, emails)
+
+    db = EmailBotDatabase(path)
+    # Повторное открытие не переносит контакты второй раз
+    db = EmailBotDatabase(path)
+
+    assert db.get_contact_list(list_id)['total_count'] == 3
+    assert db.count_contacts(list_id) == 3
+    assert db.get_contact_emails(list_id) == emails
+    with sqlite3.connect(path) as conn:
+        blob = conn.execute('SELECT contacts FROM contact_lists WHERE id = ?', (list_id,)).fetchone()[0]
+    assert blob == '[]'
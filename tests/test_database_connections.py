@@ -0,0 +1,72 @@
+"""
+Тесты соединений EmailBotDatabase: WAL и долгоживущее соединение на поток
+"""
+
+import threading
+
+import pytest
+
+from email_bot_database import EmailBotDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    return EmailBotDatabase(str(tmp_path / 'email_bot.db'))
+
+
+def test_database_uses_wal(db):
+    with db._connect() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_connection_is_reused_within_thread(db):
+    with db._connect() as first:
+        pass
+    with db._connect() as second:
+        pass
+    other = []
+
+    def worker():
+        with db._connect() as conn:
+            other.append(conn)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert first is second
+    assert other[0] is not first
+
+
+def test_error_rolls_back_transaction(db):
+    with pytest.raises(RuntimeError):
+        with db._connect() as conn:
+            conn.execute('INSERT INTO users (telegram_id) VALUES (1)')
+            raise RuntimeError("handler failed")
+
+    assert db.get_user(1) is None
+
+
+def test_reads_are_not_blocked_by_open_write(db):
+    db.register_user(1)
+    writing = threading.Event()
+    done = threading.Event()
+
+    def writer():
+        with db._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute("UPDATE users SET username = 'new' WHERE telegram_id = 1")
+            writing.set()
+            done.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        assert writing.wait(5)
+        # Пока запись не завершена, читатель видит последнее сохраненное состояние
+        assert db.get_user(1)['username'] is None
+    finally:
+        done.set()
+        thread.join()
+
+    assert db.get_user(1)['username'] == 'new'
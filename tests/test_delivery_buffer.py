@@ -0,0 +1,90 @@
+"""
+Тесты буфера результатов доставки (write-behind в sent_emails)
+"""
+
+import time
+
+import pytest
+
+import email_bot_config as config
+from email_bot_database import EmailBotDatabase
+
+CAMPAIGN_ID = 'campaign'
+
+
+def wait_for(predicate, timeout: float = 2.0) -> bool:
+    """Дождаться условия, которое выполнит фоновый поток записи"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def journal(db: EmailBotDatabase):
+    with db._connect() as conn:
+        return [tuple(row) for row in conn.execute(
+            'SELECT recipient_email, status, error_message FROM sent_emails ORDER BY id'
+        )]
+
+
+@pytest.fixture
+def make_db(tmp_path, monkeypatch):
+    """БД с заданными порогами сброса буфера"""
+    def make(flush_rows: int, flush_interval_ms: int) -> EmailBotDatabase:
+        monkeypatch.setattr(config, 'DELIVERY_FLUSH_ROWS', flush_rows)
+        monkeypatch.setattr(config, 'DELIVERY_FLUSH_INTERVAL_MS', flush_interval_ms)
+        return EmailBotDatabase(str(tmp_path / 'email_bot.db'))
+    return make
+
+
+def test_rows_wait_in_buffer_until_flush(make_db):
+    db = make_db(flush_rows=100, flush_interval_ms=60000)
+    db.buffer_delivery_result(CAMPAIGN_ID, 'a@example.com', 'sent')
+    db.buffer_delivery_result(CAMPAIGN_ID, 'b@example.com', 'failed', '550 User unknown')
+
+    time.sleep(0.1)
+    assert journal(db) == []
+
+    db.flush_delivery_results()
+    assert journal(db) == [
+        ('a@example.com', 'sent', None),
+        ('b@example.com', 'failed', '550 User unknown'),
+    ]
+    assert db.get_delivery_counts(CAMPAIGN_ID) == {'sent': 1, 'failed': 1}
+
+
+def test_full_batch_is_written_in_background(make_db):
+    db = make_db(flush_rows=5, flush_interval_ms=60000)
+    for i in range(5):
+        db.buffer_delivery_result(CAMPAIGN_ID, f'to{i}@example.com', 'sent')
+
+    assert wait_for(lambda: len(journal(db)) == 5)
+
+
+def test_partial_batch_is_written_after_interval(make_db):
+    db = make_db(flush_rows=100, flush_interval_ms=50)
+    db.buffer_delivery_result(CAMPAIGN_ID, 'a@example.com', 'sent')
+
+    assert wait_for(lambda: journal(db) == [('a@example.com', 'sent', None)])
+
+
+def test_failed_write_keeps_rows_in_order(make_db, monkeypatch):
+    db = make_db(flush_rows=100, flush_interval_ms=60000)
+    insert = db._insert_delivery_rows
+
+    def locked(rows):
+        raise RuntimeError("database is locked")
+
+    db.buffer_delivery_result(CAMPAIGN_ID, 'a@example.com', 'sent')
+    monkeypatch.setattr(db, '_insert_delivery_rows', locked)
+    with pytest.raises(RuntimeError):
+        db.flush_delivery_results()
+
+    # Пока запись не удалась, приходят новые результаты
+    db.buffer_delivery_result(CAMPAIGN_ID, 'b@example.com', 'sent')
+    monkeypatch.setattr(db, '_insert_delivery_rows', insert)
+    db.flush_delivery_results()
+
+    assert [row[0] for row in journal(db)] == ['a@example.com', 'b@example.com']
@@ -0,0 +1,161 @@
+"""
+Тесты каркаса письма (MessageSkeleton) и вложений, передаваемых потоково
+"""
+
+import base64
+import email
+import os
+from email import policy
+
+import pytest
+
+from email_message import AttachmentFile, MessageSkeleton, message_bytes
+from email_sender import AsyncSMTPClient
+from smtp_stub import USER, StubSMTPServer, run_with_server
+
+
+def parse(data) -> email.message.EmailMessage:
+    return email.message_from_bytes(message_bytes(data), policy=policy.default)
+
+
+@pytest.fixture
+def attachment_path(tmp_path):
+    path = tmp_path / 'price.pdf'
+    # Больше одного блока кодирования и не кратно 57 байтам
+    path.write_bytes(os.urandom(200_000) + b'tail')
+    return str(path)
+
+
+def test_plain_message_is_personalized_per_recipient():
+    skeleton = MessageSkeleton('Магазин', 'shop@example.com', 'Скидка для {name}', 'Привет, {name}!')
+
+    first = parse(skeleton.render({'email': 'ivan@example.com', 'name': 'Иван'}))
+    second = parse(skeleton.render('anna@example.com'))
+
+    assert first['To'] == 'ivan@example.com'
+    assert first['From'] == 'Магазин <shop@example.com>'
+    assert first['Subject'] == 'Скидка для Иван'
+    assert first.get_content_type() == 'text/plain'
+    assert first.get_content() == 'Привет, Иван!'
+    assert second['Subject'] == 'Скидка для '
+    assert first['Message-ID'] != second['Message-ID']
+
+
+def test_static_parts_are_encoded_once():
+    skeleton = MessageSkeleton('Shop', 'shop@example.com', 'News', 'Same text for everyone')
+
+    first = skeleton.render('a@example.com')
+    second = skeleton.render('b@example.com')
+
+    # Тело без переменных - один и тот же готовый объект байтов
+    assert first[1:] == second[1:]
+    assert all(a is b for a, b in zip(first[1:], second[1:]))
+    assert parse(first).get_content() == 'Same text for everyone'
+
+
+def test_attribute_cannot_inject_headers():
+    skeleton = MessageSkeleton('Shop', 'shop@example.com', 'Hello {name}', 'Body')
+    message = parse(skeleton.render({'email': 'a@example.com', 'name': 'x\r\nBcc: victim@example.com'}))
+
+    assert message['Bcc'] is None
+    assert message['Subject'] == 'Hello x Bcc: victim@example.com'
+
+
+def test_attachment_is_encoded_once_and_streamed(attachment_path):
+    attachment = AttachmentFile(attachment_path, 'Прайс 2025.pdf')
+    skeleton = MessageSkeleton('Shop', 'shop@example.com', 'Price', 'See attachment', attachments=[attachment])
+
+    data = skeleton.render('a@example.com')
+    # Вложение в письме - ссылка на файл, а не байты в памяти
+    assert attachment in data
+    assert os.path.exists(attachment.encoded_path)
+
+    message = parse(data)
+    parts = list(message.iter_attachments())
+    assert message.get_content_type() == 'multipart/mixed'
+    assert len(parts) == 1
+    assert parts[0].get_filename() == 'Прайс 2025.pdf'
+    assert parts[0].get_content_type() == 'application/pdf'
+    with open(attachment_path, 'rb') as f:
+        content = f.read()
+    assert parts[0].get_content() == content
+    assert base64.b64decode(b''.join(attachment.iter_encoded(block_size=1000))) == content
+
+
+def test_attachment_is_reencoded_when_source_changes(attachment_path):
+    attachment = AttachmentFile(attachment_path)
+    encoded_path = attachment.ensure_encoded()
+    mtime = os.path.getmtime(encoded_path)
+
+    assert attachment.ensure_encoded() == encoded_path
+    assert os.path.getmtime(encoded_path) == mtime
+
+    with open(attachment_path, 'wb') as f:
+        f.write(b'new content')
+    os.utime(attachment_path, (mtime + 10, mtime + 10))
+
+    assert base64.b64decode(attachment.read_encoded()) == b'new content'
+
+
+def test_attachment_is_streamed_through_smtp(redirect_smtp, attachment_path):
+    server = StubSMTPServer()
+    attachment = AttachmentFile(attachment_path)
+    skeleton = MessageSkeleton('Shop', USER, 'Price', 'See attachment', attachments=[attachment])
+
+    async def scenario():
+        client = AsyncSMTPClient('localhost', 25, timeout=5)
+        await client.connect()
+        await client.sendmail(USER, ['to@example.com'], skeleton.render('to@example.com'))
+        await client.quit()
+
+    run_with_server(server, redirect_smtp, scenario)
+
+    received = email.message_from_bytes(server.messages[0][2], policy=policy.default)
+    with open(attachment_path, 'rb') as f:
+        assert next(received.iter_attachments()).get_content() == f.read()
+
+
+def test_html_is_sent_as_alternative_with_text_part():
+    skeleton = MessageSkeleton(
+        'Shop', 'shop@example.com', 'Sale',
+        '<p>Привет, {name}!</p><p><a href="https://example.com/sale">Распродажа</a></p>'
+    )
+    message = parse(skeleton.render({'email': 'a@example.com', 'name': 'Tom & Jerry'}))
+
+    assert message.get_content_type() == 'multipart/alternative'
+    text, html = message.get_payload()
+    assert text.get_content_type() == 'text/plain'
+    assert html.get_content_type() == 'text/html'
+    # В HTML значения экранируются, в текстовой версии - нет
+    assert 'Привет, Tom &amp; Jerry!' in html.get_content()
+    assert text.get_content() == 'Привет, Tom & Jerry!\n\nРаспродажа (https://example.com/sale)'
+
+
+def test_explicit_text_version_is_used():
+    skeleton = MessageSkeleton('Shop', 'shop@example.com', 'Sale', '<p>HTML</p>', body_text='Текст для {email}')
+    text, _ = parse(skeleton.render('a@example.com')).get_payload()
+
+    assert text.get_content() == 'Текст для a@example.com'
+
+
+def test_inline_images_and_attachments_structure(tmp_path):
+    logo = tmp_path / 'logo.png'
+    logo.write_bytes(b'\x89PNG fake')
+    price = tmp_path / 'price.txt'
+    price.write_bytes(b'prices')
+    skeleton = MessageSkeleton(
+        'Shop', 'shop@example.com', 'Sale', '<p><img src="cid:logo" alt="Logo"></p>',
+        attachments=[AttachmentFile(str(logo), content_id='logo'), AttachmentFile(str(price))]
+    )
+    message = parse(skeleton.render('a@example.com'))
+
+    # mixed [ related [ alternative [text, html], картинка ], вложение ]
+    related, attached = message.get_payload()
+    alternative, image = related.get_payload()
+    assert message.get_content_type() == 'multipart/mixed'
+    assert related.get_content_type() == 'multipart/related'
+    assert alternative.get_content_type() == 'multipart/alternative'
+    assert image['Content-ID'] == '<logo>'
+    assert image.get_content_disposition() == 'inline'
+    assert attached.get_filename() == 'price.txt'
+    assert attached.get_content() == 'prices'
@@ -0,0 +1,76 @@
+"""
+Тесты компилированных шаблонов писем и текстовой версии HTML
+"""
+
+from email_templates import CompiledTemplate, html_to_text, is_html_body
+
+
+def test_render_substitutes_contact_attributes():
+    template = CompiledTemplate("Привет, {name} из {company}! Ваш адрес: {email}. {name}, до встречи")
+    contact = {'email': 'ivan@example.com', 'name': 'Иван', 'company': 'Ромашка'}
+
+    assert template.variables == ('name', 'company', 'email')
+    assert template.render(contact) == (
+        "Привет, Иван из Ромашка! Ваш адрес: ivan@example.com. Иван, до встречи"
+    )
+
+
+def test_missing_attributes():
+    template = CompiledTemplate("Здравствуйте, {name}! Город: {city}. Компания: {company}.")
+
+    # Известные переменные без значения - пустая строка, неизвестные остаются как есть
+    assert template.render({'email': 'a@example.com'}) == "Здравствуйте, ! Город: {city}. Компания: ."
+    assert template.render({'email': 'a@example.com', 'name': '', 'city': None}) == (
+        "Здравствуйте, ! Город: {city}. Компания: ."
+    )
+    assert template.render({'email': 'a@example.com', 'city': 'Казань'}) == (
+        "Здравствуйте, ! Город: Казань. Компания: ."
+    )
+
+
+def test_contact_as_plain_email():
+    template = CompiledTemplate("Письмо для {email}, {name}")
+    assert template.render('a@example.com') == "Письмо для a@example.com, "
+
+
+def test_values_are_escaped_in_html():
+    contact = {'email': 'a@example.com', 'name': '<b>Tom & "Jerry"</b>', 'orders': 3}
+    html_template = CompiledTemplate("<p>{name}: {orders}</p>", html_escape=True)
+    text_template = CompiledTemplate("{name}: {orders}")
+
+    assert html_template.render(contact) == "<p>&lt;b&gt;Tom &amp; &quot;Jerry&quot;&lt;/b&gt;: 3</p>"
+    assert text_template.render(contact) == '<b>Tom & "Jerry"</b>: 3'
+
+
+def test_text_without_variables_is_returned_as_is():
+    source = "Без переменных: { name }, {1st}, {{name}"
+    template = CompiledTemplate(source)
+
+    assert template.variables == ('name',)
+    assert CompiledTemplate("Просто текст").render({'email': 'a@example.com'}) == "Просто текст"
+    assert template.render({'email': 'a@example.com', 'name': 'Иван'}) == "Без переменных: { name }, {1st}, {Иван"
+
+
+def test_html_detection():
+    assert is_html_body("<HTML><body>x</body></HTML>")
+    assert is_html_body("<p>Абзац</p>")
+    assert not is_html_body("Обычный текст с <угловыми> скобками")
+
+
+def test_html_to_text():
+    body = (
+        "<html><head><style>p {color: red}</style></head><body>"
+        "<h1>Привет, {name}!</h1><p>Первый   абзац<br>вторая строка</p>"
+        "<ul><li>один</li><li>два</li></ul>"
+        "<p><a href=\"https://example.com/sale\">Распродажа</a> и <a href=\"#top\">наверх</a></p>"
+        "<img src=\"cid:logo\" alt=\"Логотип\"><script>alert(1)</script>"
+        "</body></html>"
+    )
+
+    assert html_to_text(body) == (
+        "Привет, {name}!\n\n"
+        "Первый абзац\nвторая строка\n\n"
+        "• один\n• два\n\n"
+        "Распродажа (https://example.com/sale) и наверх\n\n"
+        "Логотип"
+    )
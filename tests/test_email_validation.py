@@ -0,0 +1,47 @@
+"""
+Тесты валидации и извлечения email адресов
+"""
+
+from email_validation import extract_emails, is_valid_email, normalize_email, validate_emails
+
+
+def test_normalize_email():
+    assert normalize_email('  Ivan.Petrov@Example.COM ') == 'ivan.petrov@example.com'
+    assert normalize_email('info@пример.рф') == 'info@xn--e1afmkfd.xn--p1ai'
+    assert normalize_email('user@xn--e1afmkfd.xn--p1ai') == 'user@xn--e1afmkfd.xn--p1ai'
+    assert normalize_email('no-at-sign.example.com') is None
+    assert normalize_email('user@localhost') is None
+    assert normalize_email('иван@example.com') is None
+
+
+def test_is_valid_email():
+    assert is_valid_email('a+tag@example.co.uk')
+    assert not is_valid_email('a@b.c')
+    assert not is_valid_email('two@@example.com')
+
+
+def test_validate_column_keeps_order_and_drops_invalid():
+    values = ['B@example.com', 'not an email', ' c@example.org ', '', 'a@example.com']
+    assert validate_emails(values) == ['b@example.com', 'c@example.org', 'a@example.com']
+
+
+def test_validate_column_fast_and_slow_paths_agree():
+    ascii_values = ['a@example.com', 'bad', 'b@example.com']
+    # Кириллица в колонке отключает быстрый путь (одно регулярное выражение на всю колонку)
+    mixed_values = ascii_values + ['info@пример.рф']
+
+    assert validate_emails(ascii_values) == ['a@example.com', 'b@example.com']
+    assert validate_emails(mixed_values) == ['a@example.com', 'b@example.com', 'info@xn--e1afmkfd.xn--p1ai']
+
+
+def test_value_with_line_break_is_not_split_into_addresses():
+    # Ячейка с переносом строки - одно значение, а не два адреса
+    assert validate_emails(['a@example.com\nb@example.com', 'c@example.com']) == ['c@example.com']
+    assert validate_emails([]) == []
+
+
+def test_extract_emails_from_text():
+    text = 'Пишите: Sales@Example.com, support@пример.рф; или admin@example.org.'
+    assert extract_emails(text) == ['sales@example.com', 'support@xn--e1afmkfd.xn--p1ai', 'admin@example.org']
+    assert extract_emails('contacts: a@example.com b@example.com') == ['a@example.com', 'b@example.com']
+    assert extract_emails('нет адресов') == []
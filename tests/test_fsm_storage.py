@@ -0,0 +1,42 @@
+"""
+Тесты FSM хранилища в SQLite: два процесса бота на одной БД
+"""
+
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from email_bot_database import AsyncEmailBotDatabase, EmailBotDatabase
+from fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+
+
+def test_half_write_does_not_keep_stale_other_half(tmp_path):
+    path = str(tmp_path / 'email_bot.db')
+
+    async def scenario():
+        # Два хранилища со своими кэшами - как в двух процессах бота
+        first = SQLiteStorage(AsyncEmailBotDatabase(EmailBotDatabase(path)))
+        second = SQLiteStorage(AsyncEmailBotDatabase(EmailBotDatabase(path)))
+
+        await first.set_state(KEY, 'Wizard:step1')
+        await first.set_data(KEY, {'step': 1})
+        assert await first.get_state(KEY) == 'Wizard:step1'
+
+        # Другой процесс меняет данные, затем этот - только состояние
+        await second.set_data(KEY, {'step': 2})
+        await first.set_state(KEY, 'Wizard:step2')
+        data_after_state = await first.get_data(KEY)
+
+        # И наоборот: другой процесс меняет состояние, этот - только данные
+        await second.set_state(KEY, 'Wizard:step3')
+        await first.set_data(KEY, {'step': 3})
+        state_after_data = await first.get_state(KEY)
+
+        return data_after_state, state_after_data
+
+    data_after_state, state_after_data = asyncio.run(scenario())
+
+    assert data_after_state == {'step': 2}
+    assert state_after_data == 'Wizard:step3'
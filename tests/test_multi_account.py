@@ -0,0 +1,98 @@
+"""
+Тесты рассылки с нескольких SMTP аккаунтов (MultiAccountSender)
+"""
+
+import pytest
+
+from email_sender import MultiAccountSender
+from smtp_stub import StubSMTPServer, run_with_server
+
+RECIPIENTS = [f'to{i}@example.com' for i in range(20)]
+
+
+def account(login: str, password: str = 'secret', **overrides) -> dict:
+    smtp_config = {
+        'name': login,
+        'smtp_host': 'localhost',
+        'smtp_port': 25,
+        'smtp_user': login,
+        'smtp_password': password,
+        'from_email': login,
+        'max_connections': 2,
+        'rate_limits': {'per_second': 1000},
+    }
+    smtp_config.update(overrides)
+    return smtp_config
+
+
+@pytest.fixture
+def server():
+    server = StubSMTPServer(data_delay=0.005)
+    server.passwords = {'first@example.com': 'secret', 'second@example.com': 'secret'}
+    return server
+
+
+def senders_of(server: StubSMTPServer) -> set:
+    return {mail_from for mail_from, _, _ in server.messages}
+
+
+def test_campaign_is_spread_across_accounts(server, redirect_smtp):
+    sender = MultiAccountSender([account('first@example.com'), account('second@example.com')])
+
+    result = run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+        RECIPIENTS, 'Subject', 'Body'
+    ))
+
+    assert result == (20, 0, [])
+    assert sorted(server.recipients()) == sorted(RECIPIENTS)
+    assert senders_of(server) == {'first@example.com', 'second@example.com'}
+    stats = {s['name']: s for s in sender.stats()}
+    assert stats['first@example.com']['sent'] + stats['second@example.com']['sent'] == 20
+
+
+def test_failed_account_hands_its_messages_to_others(server, redirect_smtp):
+    sender = MultiAccountSender([account('first@example.com'), account('second@example.com', 'wrong')])
+    results = []
+
+    result = run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+        RECIPIENTS, 'Subject', 'Body',
+        on_result=lambda email, success, error_msg: results.append(success)
+    ))
+
+    # Отказ аккаунта - не ошибка получателей: все письма ушли с рабочего аккаунта
+    assert result == (20, 0, [])
+    assert results == [True] * 20
+    assert senders_of(server) == {'first@example.com'}
+    stats = {s['name']: s for s in sender.stats()}
+    assert stats['second@example.com']['error']
+    assert stats['first@example.com']['error'] is None
+
+
+def test_all_accounts_failing_leaves_recipients_unsent(server, redirect_smtp):
+    sender = MultiAccountSender([account('first@example.com', 'wrong'), account('second@example.com', 'wrong')])
+    results = []
+
+    with pytest.raises(Exception, match='Все SMTP аккаунты недоступны'):
+        run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+            RECIPIENTS, 'Subject', 'Body',
+            on_result=lambda email, success, error_msg: results.append(email)
+        ))
+
+    assert results == []
+    assert server.messages == []
+
+
+def test_sessions_follow_daily_limits():
+    sender = MultiAccountSender([
+        account('first@example.com', max_connections=4, rate_limits={'per_second': 1000, 'per_day': 1000}),
+        account('second@example.com', max_connections=4, rate_limits={'per_second': 1000, 'per_day': 250}),
+    ])
+
+    # Вес - суточный лимит; у слабого аккаунта меньше сессий, но хотя бы одна
+    assert [a.weight for a in sender.accounts] == [1000, 250]
+    assert [a.sessions for a in sender.accounts] == [4, 1]
+
+
+def test_no_accounts_is_an_error():
+    with pytest.raises(Exception, match='Не выбран ни один SMTP аккаунт'):
+        MultiAccountSender([])
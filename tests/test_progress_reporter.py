@@ -0,0 +1,162 @@
+"""
+Тесты сообщения с прогрессом: редкие редактирования, последнее состояние
+при завершении, ошибки Telegram
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+import email_bot_config as config
+import progress_reporter
+from progress_reporter import ProgressReporter, wait_chat_slot
+
+CHAT_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def fresh_chat_slots(monkeypatch):
+    """Очередь запросов в чаты - своя у каждого теста, без пауз"""
+    monkeypatch.setattr(progress_reporter, '_chat_next_send', {})
+    monkeypatch.setattr(config, 'TELEGRAM_CHAT_MIN_INTERVAL', 0)
+
+
+class FakeBot:
+    """Бот без Telegram API: запоминает отправленные и отредактированные тексты"""
+
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+        # Ошибки, которые выбросит следующее редактирование (по одной на вызов)
+        self.edit_errors = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        if self.edit_errors:
+            raise self.edit_errors.pop(0)
+        self.edits.append((message_id, text))
+
+
+def test_updates_within_interval_collapse_into_one_edit():
+    bot = FakeBot()
+    state = [0]
+
+    async def scenario():
+        reporter = ProgressReporter(bot, CHAT_ID, lambda: f"Отправлено: {state[0]}", interval=10)
+        await reporter.start()
+        for _ in range(100):
+            state[0] += 1
+            reporter.update()
+            await asyncio.sleep(0)
+        await reporter.finish()
+
+    asyncio.run(scenario())
+
+    assert bot.sent == ["Отправлено: 0"]
+    # Первое изменение - сразу, остальные ждут интервала; на завершении - итог
+    assert len(bot.edits) == 2
+    assert bot.edits[-1] == (1, "Отправлено: 100")
+
+
+def test_edits_follow_interval():
+    bot = FakeBot()
+    state = [0]
+
+    async def scenario():
+        reporter = ProgressReporter(bot, CHAT_ID, lambda: f"Отправлено: {state[0]}", interval=0.05)
+        await reporter.start()
+        for _ in range(4):
+            state[0] += 1
+            reporter.update()
+            await asyncio.sleep(0.07)
+        await reporter.finish()
+
+    asyncio.run(scenario())
+
+    # Каждое изменение после интервала видно в чате, повторов итога нет
+    assert [text for _, text in bot.edits] == [f"Отправлено: {i}" for i in range(1, 5)] + ["Отправлено: 4"]
+
+
+def test_unchanged_text_is_not_edited():
+    bot = FakeBot()
+
+    async def scenario():
+        reporter = ProgressReporter(bot, CHAT_ID, lambda: "Отправлено: 0", interval=0.01)
+        await reporter.start()
+        reporter.update()
+        await asyncio.sleep(0.03)
+        assert bot.edits == []
+        await reporter.finish()
+
+    asyncio.run(scenario())
+
+    # Завершение показывает итог в любом случае (например, чтобы убрать кнопки)
+    assert bot.edits == [(1, "Отправлено: 0")]
+
+
+def test_deleted_message_is_sent_again():
+    bot = FakeBot()
+    bot.edit_errors = [TelegramBadRequest(None, "Bad Request: message to edit not found")]
+
+    async def scenario():
+        reporter = ProgressReporter(bot, CHAT_ID, lambda: "Готово")
+        await reporter.start()
+        await reporter.finish()
+        return reporter.message_id
+
+    message_id = asyncio.run(scenario())
+
+    assert bot.sent == ["Готово", "Готово"]
+    assert message_id == 2
+
+
+def test_flood_control_delays_and_retries():
+    bot = FakeBot()
+    bot.edit_errors = [TelegramRetryAfter(None, "Too Many Requests", retry_after=0)]
+
+    async def scenario():
+        reporter = ProgressReporter(bot, CHAT_ID, lambda: "Готово")
+        await reporter.start()
+        await reporter.finish()
+
+    asyncio.run(scenario())
+
+    assert bot.edits == [(1, "Готово")]
+
+
+def test_telegram_errors_do_not_stop_campaign():
+    bot = FakeBot()
+    bot.edit_errors = [TelegramBadRequest(None, "Bad Request: chat not found")]
+
+    async def scenario():
+        reporter = ProgressReporter(bot, CHAT_ID, lambda: "Готово")
+        await reporter.start()
+        await reporter.finish()
+
+    asyncio.run(scenario())
+
+    assert bot.edits == []
+
+
+def test_requests_to_one_chat_are_spaced(monkeypatch):
+    monkeypatch.setattr(config, 'TELEGRAM_CHAT_MIN_INTERVAL', 0.05)
+
+    async def scenario():
+        started = time.monotonic()
+        # Три запроса в один чат, затем один в другой
+        await asyncio.gather(wait_chat_slot(CHAT_ID), wait_chat_slot(CHAT_ID), wait_chat_slot(CHAT_ID))
+        same_chat = time.monotonic() - started
+        started = time.monotonic()
+        await wait_chat_slot(CHAT_ID + 1)
+        return same_chat, time.monotonic() - started
+
+    same_chat, other_chat = asyncio.run(scenario())
+
+    assert same_chat >= 0.1
+    assert other_chat < 0.05
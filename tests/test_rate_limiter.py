@@ -0,0 +1,76 @@
+"""
+Тесты лимитов скорости: суточный счетчик в БД и смена лимитов
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from email_bot_database import AsyncEmailBotDatabase, EmailBotDatabase
+from email_sender import EmailSender
+from rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def usage_db(tmp_path):
+    return AsyncEmailBotDatabase(EmailBotDatabase(str(tmp_path / 'email_bot.db')))
+
+
+def test_daily_limit_is_shared_between_processes(usage_db):
+    limits = {'per_second': 1000, 'per_day': 3}
+
+    async def scenario():
+        # Два лимитера одного аккаунта - как в двух процессах воркеров
+        first = RateLimiter(limits, 'smtp.example.com:user', usage_db)
+        second = RateLimiter(limits, 'smtp.example.com:user', usage_db)
+        granted = [
+            await first.acquire(max_wait=1),
+            await second.acquire(max_wait=1),
+            await first.acquire(max_wait=1),
+            await second.acquire(max_wait=1),
+        ]
+        # После перезапуска счетчик не начинается заново
+        restarted = RateLimiter(limits, 'smtp.example.com:user', usage_db)
+        return granted, await restarted.acquire(max_wait=1), restarted.wait_time()
+
+    granted, after_restart, wait = asyncio.run(scenario())
+
+    assert granted == [True, True, True, False]
+    assert after_restart is False
+    assert wait > 0
+
+
+def test_changed_limits_keep_spent_tokens():
+    async def scenario():
+        limiter = RateLimiter({'per_minute': 2})
+        await limiter.acquire()
+        await limiter.acquire()
+        limiter.update_limits({'per_minute': 3})
+        return limiter.wait_time()
+
+    # Новый лимит не выдает заново уже израсходованные письма
+    assert asyncio.run(scenario()) > 0
+
+
+def test_sender_counts_daily_limit_in_its_database(usage_db):
+    sender = EmailSender({
+        'smtp_host': 'smtp.example.com', 'smtp_port': 587, 'smtp_user': 'user',
+        'smtp_password': 'secret', 'from_email': 'user@example.com',
+        'rate_limits': {'per_second': 1000, 'per_day': 5},
+    }, usage_db)
+
+    async def scenario():
+        return await sender.get_rate_limiter().acquire(max_wait=1)
+
+    assert asyncio.run(scenario()) is True
+    day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    assert usage_db.db.get_daily_send_count('smtp.example.com:user', day) == 1
+
+
+def test_daily_limit_without_database_is_per_process():
+    async def scenario():
+        limiter = RateLimiter({'per_day': 1}, 'smtp.example.com:user')
+        return await limiter.acquire(max_wait=1), await limiter.acquire(max_wait=1)
+
+    assert asyncio.run(scenario()) == (True, False)
@@ -0,0 +1,131 @@
+"""
+Тесты отложенного запуска: разбор времени от пользователя и пробуждение
+воркера по куче времен запуска
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from email_bot_handlers import parse_schedule_time
+from job_dispatcher import JobDispatcher, parse_timestamp
+
+TZ = ZoneInfo('Europe/Moscow')
+
+
+def at(*args) -> datetime:
+    return datetime(*args, tzinfo=TZ)
+
+
+@pytest.mark.parametrize('text, now, expected', [
+    # Только время: сегодня или, если уже прошло, завтра
+    ('23:45', at(2026, 10, 16, 23, 30), at(2026, 10, 16, 23, 45)),
+    ('08:00', at(2026, 12, 31, 23, 30), at(2027, 1, 1, 8, 0)),
+    ('23:30', at(2026, 10, 16, 23, 30, 10), at(2026, 10, 17, 23, 30)),
+    # Дата без года: ближайшая такая дата
+    ('16.10 12:00', at(2026, 10, 16, 10, 0), at(2026, 10, 16, 12, 0)),
+    ('01.01 09:00', at(2026, 12, 31, 23, 30), at(2027, 1, 1, 9, 0)),
+    ('15.06 10:00', at(2026, 10, 16, 10, 0), at(2027, 6, 15, 10, 0)),
+    ('16.10 09:00', at(2026, 10, 16, 10, 0), at(2027, 10, 16, 9, 0)),
+    ('29.02 10:00', at(2026, 10, 16, 10, 0), at(2028, 2, 29, 10, 0)),
+    # Полная дата и лишние пробелы
+    ('01.03.2027 09:00', at(2026, 10, 16, 10, 0), at(2027, 3, 1, 9, 0)),
+    ('  01.01   09:00 ', at(2026, 12, 31, 23, 30), at(2027, 1, 1, 9, 0)),
+])
+def test_parse_schedule_time(text, now, expected):
+    value = parse_schedule_time(text, now)
+
+    assert value == expected
+    assert value.tzinfo is TZ
+
+
+@pytest.mark.parametrize('text', ['31.02 10:00', '25:00', '16.10', 'завтра', '32.01.2027 09:00'])
+def test_parse_schedule_time_rejects_invalid_input(text):
+    with pytest.raises(ValueError):
+        parse_schedule_time(text, at(2026, 10, 16, 10, 0))
+
+
+def test_parse_timestamp_is_utc():
+    assert parse_timestamp('2026-10-16 09:00:00') == datetime(2026, 10, 16, 9, tzinfo=timezone.utc).timestamp()
+
+
+def test_wait_returns_when_scheduled_job_is_due():
+    dispatcher = JobDispatcher()
+    dispatcher.add(1, time.time() + 0.05)
+
+    async def scenario():
+        started = time.monotonic()
+        # Первое ожидание - до времени задачи, второе - сразу: задача наступила
+        await dispatcher.wait(timeout=5)
+        await dispatcher.wait(timeout=5)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+
+    assert 0.04 <= elapsed < 1
+    assert dispatcher._heap == []
+
+
+def test_due_jobs_are_taken_in_run_order():
+    dispatcher = JobDispatcher()
+    now = time.time()
+    dispatcher.add(2, now - 10)
+    dispatcher.add(1, now + 60)
+    dispatcher.add(3, now - 20)
+    # Повторная загрузка той же задачи не дублирует ее в куче
+    dispatcher.add(3, now - 20)
+
+    asyncio.run(dispatcher.wait(timeout=5))
+
+    assert dispatcher._heap == [(now + 60, 1)]
+
+
+def test_wait_ends_at_timeout_without_jobs():
+    dispatcher = JobDispatcher()
+
+    async def scenario():
+        started = time.monotonic()
+        await dispatcher.wait(timeout=0.05)
+        return time.monotonic() - started
+
+    assert 0.04 <= asyncio.run(scenario()) < 1
+
+
+def test_notify_wakes_waiting_worker():
+    dispatcher = JobDispatcher()
+
+    async def scenario():
+        waiter = asyncio.create_task(dispatcher.wait(timeout=5))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        dispatcher.notify()
+        await waiter
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 1
+
+
+def test_notify_schedules_delayed_job():
+    dispatcher = JobDispatcher()
+    run_at = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    dispatcher.notify(7, run_at)
+    # Время без часового пояса - UTC, как в БД
+    dispatcher.notify(8, run_at.replace(tzinfo=None))
+
+    assert sorted(dispatcher._heap) == [(run_at.timestamp(), 7), (run_at.timestamp(), 8)]
+
+
+def test_load_scheduled_jobs_from_database_rows():
+    dispatcher = JobDispatcher()
+
+    dispatcher.load([
+        {'id': 1, 'run_at': '2030-01-01 09:00:00'},
+        {'id': 2, 'run_at': '2030-01-01 09:00:15'},
+    ])
+
+    assert dispatcher._heap[0] == (parse_timestamp('2030-01-01 09:00:00'), 1)
+    assert len(dispatcher._heap) == 2
@@ -0,0 +1,294 @@
+"""
+Тесты AsyncSMTPClient и массовой отправки против SMTP сервера-заглушки
+(asyncio, без внешних зависимостей)
+"""
+
+import smtplib
+from datetime import datetime, timezone
+
+import pytest
+
+import email_bot_config as config
+import email_sender
+from campaign_control import CANCEL, CampaignCancelled, CampaignControl
+from email_bot_database import AsyncEmailBotDatabase, EmailBotDatabase
+from email_sender import AsyncSMTPClient, AsyncSMTPSession, EmailSender
+from smtp_stub import PASSWORD, USER, StubSMTPServer, run_with_server
+
+def make_sender(**overrides) -> EmailSender:
+    """Отправитель без лимитов скорости"""
+    smtp_config = {
+        'smtp_host': 'localhost',
+        'smtp_port': 25,
+        'smtp_user': USER,
+        'smtp_password': PASSWORD,
+        'from_email': USER,
+        'rate_limits': {'per_second': 1000},
+    }
+    smtp_config.update(overrides)
+    return EmailSender(smtp_config)
+
+
+def test_starttls_and_auth_plain(redirect_smtp, tls_contexts, monkeypatch):
+    server_context, client_context = tls_contexts
+    monkeypatch.setattr(email_sender.ssl, 'create_default_context', lambda: client_context)
+    server = StubSMTPServer(tls_context=server_context)
+
+    async def scenario():
+        client = AsyncSMTPClient('localhost', 587, timeout=5)
+        await client.connect()
+        assert 'starttls' not in client.esmtp_features
+        await client.login(USER, PASSWORD)
+        await client.sendmail(USER, ['to@example.com'], b'Subject: hi\r\n\r\nbody\r\n')
+        await client.quit()
+
+    run_with_server(server, redirect_smtp, scenario)
+
+    assert server.tls_used
+    assert server.logins == [('PLAIN', USER)]
+    assert server.recipients() == ['to@example.com']
+
+
+def test_auth_login_when_plain_not_offered(redirect_smtp):
+    server = StubSMTPServer(auth_methods='LOGIN')
+
+    async def scenario():
+        client = AsyncSMTPClient('localhost', 25, timeout=5)
+        await client.connect()
+        await client.login(USER, PASSWORD)
+        await client.quit()
+
+    run_with_server(server, redirect_smtp, scenario)
+
+    assert server.logins == [('LOGIN', USER)]
+
+
+def test_auth_failure(redirect_smtp):
+    server = StubSMTPServer()
+
+    async def scenario():
+        client = AsyncSMTPClient('localhost', 25, timeout=5)
+        await client.connect()
+        try:
+            await client.login(USER, 'wrong')
+        finally:
+            await client.quit()
+
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        run_with_server(server, redirect_smtp, scenario)
+
+
+def test_dot_stuffing_and_line_endings(redirect_smtp):
+    server = StubSMTPServer()
+    body = b'Subject: dots\n\nfirst\n.single\n..double\r.\rlast'
+
+    async def scenario():
+        client = AsyncSMTPClient('localhost', 25, timeout=5)
+        await client.connect()
+        await client.sendmail(USER, ['to@example.com'], body)
+        await client.quit()
+
+    run_with_server(server, redirect_smtp, scenario)
+
+    assert server.messages[0][2] == (
+        b'Subject: dots\r\n\r\nfirst\r\n.single\r\n..double\r\n.\r\nlast\r\n'
+    )
+
+
+def test_session_reconnects_after_server_disconnect(redirect_smtp):
+    server = StubSMTPServer(disconnect_after=1)
+
+    async def scenario():
+        session = AsyncSMTPSession('localhost', 25, USER, PASSWORD, timeout=5)
+        try:
+            for i in range(3):
+                await session.sendmail(USER, [f'to{i}@example.com'], b'Subject: x\r\n\r\nbody\r\n')
+        finally:
+            await session.close()
+
+    run_with_server(server, redirect_smtp, scenario)
+
+    assert server.recipients() == ['to0@example.com', 'to1@example.com', 'to2@example.com']
+    assert server.connections == 3
+
+
+def test_transient_error_is_retried(redirect_smtp, monkeypatch):
+    monkeypatch.setattr(config, 'SEND_RETRY_BASE_DELAY', 0.01)
+    server = StubSMTPServer()
+    server.rcpt_replies['grey@example.com'] = ['451 4.7.1 Greylisted, try again later']
+    recipients = ['a@example.com', 'grey@example.com', 'b@example.com']
+    sender = make_sender()
+
+    result = run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+        recipients, 'Subject', 'Body', concurrency=1
+    ))
+
+    assert result == (3, 0, [])
+    assert sorted(server.recipients()) == sorted(recipients)
+
+
+def test_permanent_error_is_not_retried(redirect_smtp, monkeypatch):
+    monkeypatch.setattr(config, 'SEND_RETRY_BASE_DELAY', 0.01)
+    server = StubSMTPServer()
+    server.rcpt_replies['nobody@example.com'] = ['550 5.1.1 User unknown']
+    bounced = []
+    sender = make_sender()
+
+    sent, failed, errors = run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+        ['a@example.com', 'nobody@example.com'], 'Subject', 'Body', concurrency=1,
+        on_hard_bounce=lambda email, error_msg: bounced.append(email)
+    ))
+
+    assert (sent, failed) == (1, 1)
+    assert bounced == ['nobody@example.com']
+    assert server.rcpt_replies['nobody@example.com'] == []
+
+
+def test_cancel_stops_before_next_message(redirect_smtp):
+    server = StubSMTPServer()
+    recipients = [f'to{i}@example.com' for i in range(20)]
+    control = CampaignControl('test')
+    results = []
+    sender = make_sender()
+
+    async def callback(current, total, email, success):
+        if current == 3:
+            control.apply(CANCEL)
+
+    with pytest.raises(CampaignCancelled):
+        run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+            recipients, 'Subject', 'Body', concurrency=1, callback=callback,
+            on_result=lambda email, success, error_msg: results.append(email),
+            control=control
+        ))
+
+    # Начатые письма учтены, новых после отмены не было
+    assert server.recipients() == results == recipients[:3]
+
+
+def test_recipients_are_read_lazily(redirect_smtp, monkeypatch):
+    monkeypatch.setattr(config, 'CAMPAIGN_FETCH_BATCH', 5)
+    server = StubSMTPServer()
+    recipients = [f'to{i}@example.com' for i in range(30)]
+    ahead = []
+    sender = make_sender()
+    results = []
+
+    async def source():
+        for email in recipients:
+            # Сколько писем прочитано из источника сверх уже отправленных
+            ahead.append(recipients.index(email) - len(results))
+            yield email
+
+    result = run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+        source(), 'Subject', 'Body', concurrency=2,
+        on_result=lambda email, success, error_msg: results.append(email)
+    ))
+
+    assert result == (30, 0, [])
+    assert sorted(server.recipients()) == sorted(recipients)
+    # В очереди не больше CAMPAIGN_FETCH_BATCH писем плюс письма в работе у сессий
+    assert max(ahead) <= 5 + 2
+
+
+def test_recipients_source_error_is_raised(redirect_smtp):
+    server = StubSMTPServer()
+    sender = make_sender()
+
+    async def source():
+        yield 'a@example.com'
+        raise RuntimeError("database is locked")
+
+    with pytest.raises(RuntimeError):
+        run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+            source(), 'Subject', 'Body', concurrency=1
+        ))
+
+
+@pytest.mark.parametrize('error, transient', [
+    (smtplib.SMTPNotSupportedError('STARTTLS: 502 not implemented'), False),
+    (smtplib.SMTPConnectError(554, 'No SMTP service here'), False),
+    (smtplib.SMTPConnectError(421, 'Too many connections'), True),
+    (smtplib.SMTPConnectError(-1, 'Connection refused'), True),
+    (smtplib.SMTPAuthenticationError(535, 'Authentication failed'), False),
+    (smtplib.SMTPServerDisconnected('Соединение закрыто сервером'), True),
+    (ConnectionResetError(), True),
+])
+def test_transient_error_classification(error, transient):
+    assert EmailSender.is_transient_error(error) is transient
+
+
+def test_quota_error_aborts_single_account_run(redirect_smtp):
+    server = StubSMTPServer()
+    server.rcpt_replies['b@example.com'] = ['550 5.4.5 Daily sending quota exceeded']
+    recipients = ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com']
+    results = []
+    sender = make_sender()
+
+    with pytest.raises(Exception, match='SMTP аккаунт недоступен'):
+        run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+            recipients, 'Subject', 'Body', concurrency=1,
+            on_result=lambda email, success, error_msg: results.append((email, success))
+        ))
+
+    # Получатели после отказа не записаны ошибками - рассылку можно продолжить
+    assert results == [('a@example.com', True)]
+    assert server.recipients() == ['a@example.com']
+
+
+def test_unsent_messages_do_not_use_daily_quota(redirect_smtp, tmp_path):
+    server = StubSMTPServer()
+    server.rcpt_replies['quota@example.com'] = ['550 5.4.5 Daily sending quota exceeded']
+    recipients = [f'to{i}@example.com' for i in range(10)]
+    usage_db = AsyncEmailBotDatabase(EmailBotDatabase(str(tmp_path / 'email_bot.db')))
+    control = CampaignControl('test')
+    sender = make_sender(rate_limits={'per_second': 1000, 'per_day': 100})
+    sender.db = usage_db
+    account_key = sender.get_rate_limiter().account_key
+
+    async def callback(current, total, email, success):
+        if current == 2:
+            control.apply(CANCEL)
+
+    async def scenario():
+        # Отмена сразу после получения разрешения на третье письмо
+        with pytest.raises(CampaignCancelled):
+            await sender.send_bulk_emails(
+                recipients, 'Subject', 'Body', concurrency=1, callback=callback, control=control
+            )
+        # Отказ аккаунта: письмо не принято сервером
+        with pytest.raises(Exception, match='SMTP аккаунт недоступен'):
+            await sender.send_bulk_emails(['quota@example.com'], 'Subject', 'Body', concurrency=1)
+
+    run_with_server(server, redirect_smtp, scenario)
+
+    day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    assert server.recipients() == recipients[:2]
+    assert usage_db.db.get_daily_send_count(account_key, day) == 2
+
+
+def test_sessions_are_limited_by_provider_connections(redirect_smtp):
+    server = StubSMTPServer(data_delay=0.01)
+    recipients = [f'to{i}@example.com' for i in range(30)]
+    sender = make_sender(max_connections=3)
+
+    result = run_with_server(server, redirect_smtp, lambda: sender.send_bulk_emails(
+        recipients, 'Subject', 'Body', concurrency=10
+    ))
+
+    assert result == (30, 0, [])
+    assert sorted(server.recipients()) == sorted(recipients)
+    # Запрошено 10 сессий, но провайдер разрешает не больше 3
+    assert server.max_active == 3
+
+
+def test_provider_connection_limits():
+    assert email_sender.get_max_connections('smtp.gmail.com') == 3
+    assert email_sender.get_max_connections('SMTP.Yandex.ru') == 3
+    assert email_sender.get_max_connections('mail.example.com') == email_sender.SMTP_PRESETS['custom']['max_connections']
+
+
+def test_rate_limiter_is_shared_by_senders_of_one_account():
+    # Параллельные рассылки с одного аккаунта делят его лимиты
+    assert make_sender().get_rate_limiter() is make_sender().get_rate_limiter()
+    assert make_sender().get_rate_limiter() is not make_sender(smtp_user='other@example.com').get_rate_limiter()
@@ -0,0 +1,63 @@
+"""
+Тесты стоп-листа: фильтр рассылки по индексу в памяти
+"""
+
+import pytest
+
+from email_bot_database import EmailBotDatabase
+
+USER_ID = 1
+OTHER_USER_ID = 2
+
+
+@pytest.fixture
+def db(tmp_path):
+    return EmailBotDatabase(str(tmp_path / 'email_bot.db'))
+
+
+def allowed_emails(db: EmailBotDatabase, contacts) -> list:
+    allowed, _ = db.filter_suppressed(USER_ID, contacts)
+    return [c if isinstance(c, str) else c['email'] for c in allowed]
+
+
+def test_user_and_global_suppressions_are_filtered(db):
+    db.add_suppressions(USER_ID, ['Unsub@Example.com'], reason='unsubscribe')
+    db.add_suppressions(0, ['spamtrap@example.com'])
+    db.add_suppressions(OTHER_USER_ID, ['kept@example.com'])
+    contacts = ['a@example.com', {'email': 'UNSUB@example.com', 'name': 'x'},
+                'spamtrap@example.com', 'kept@example.com']
+
+    allowed, suppressed = db.filter_suppressed(USER_ID, contacts)
+
+    assert allowed == ['a@example.com', 'kept@example.com']
+    assert suppressed == 2
+    assert db.count_suppressions(USER_ID) == 1
+
+
+def test_index_picks_up_new_and_removed_addresses(db):
+    contacts = ['a@example.com', 'b@example.com', 'c@example.com']
+    assert allowed_emails(db, contacts) == contacts
+
+    # Добавление другим процессом (своим соединением) - догружается по id
+    EmailBotDatabase(db.db_path).add_suppressions(USER_ID, ['b@example.com'])
+    assert allowed_emails(db, contacts) == ['a@example.com', 'c@example.com']
+
+    # Удаление - индекс строится заново
+    assert db.remove_suppressions(USER_ID, ['B@example.com']) == 1
+    assert allowed_emails(db, contacts) == contacts
+
+
+def test_remove_and_add_with_same_count_rebuilds_index(db):
+    contacts = ['a@example.com', 'b@example.com']
+    db.add_suppressions(USER_ID, ['a@example.com'])
+    assert allowed_emails(db, contacts) == ['b@example.com']
+
+    # Число адресов не изменилось, но адрес другой
+    db.remove_suppressions(USER_ID, ['a@example.com'])
+    db.add_suppressions(USER_ID, ['b@example.com'])
+    assert allowed_emails(db, contacts) == ['a@example.com']
+
+
+def test_duplicate_suppressions_are_ignored(db):
+    assert db.add_suppressions(USER_ID, ['a@example.com', 'A@example.com ']) == 1
+    assert db.add_suppressions(USER_ID, ['a@example.com'], reason='bounce') == 0